@@ -2,12 +2,23 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import io, csv
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
-from docx import Document
-from docx.shared import Pt
+from caat.cache import ParseCache, ResultCache, content_hash, cache_key, MB
+from caat.readers import (read_csv_fast, describe_read, CSV_READER_VERSION, iter_chunks, read_preview,
+                          excel_sheets, read_excel_columns, PREVIEW_ROWS)
+from caat.compact import compact_frame, describe_compaction
+from caat.columnas import SINONIMOS_ID, SINONIMOS_MONTO, SINONIMOS_FECHA, SINONIMOS_PROVEEDOR, SINONIMOS_EMISOR, normalize_headers, col_auto, col_exacta, sugerir_monto, es_columna_monto
+from caat.montos import detectar_montos, detectar_montos_streaming, montos_sheets, montos_sections, METODOS, MIN_GRUPO
+from caat.benford import analizar_benford, benford_sheets, benford_sections, benford_expected, PERIODOS
+from caat.conciliacion import conciliar, conciliacion_sheets, conciliacion_sections, POLITICAS
+from caat.duplicados import detectar_duplicados, duplicados_sheets, duplicados_sections, DIAS, VENTANA
+from caat.secuencias import analizar_secuencias, secuencias_sheets, secuencias_sections
+from caat.multiarchivo import leer_archivos, alinear_encabezados, describir_alineacion, consolidar, trazar, COL_ARCHIVO, COL_FILA
+from caat.incremental import IndiceConciliacion, conciliar_incremental, incremental_sheets, incremental_sections
+from caat.export import export_bytes, export_name, docx_from_sections, FORMATOS
+from caat.perf import Medicion, etapa, LOG_RENDIMIENTO
 
 # ------------------- Apariencia global -------------------
 st.set_page_config(page_title="CAAT – Auditoría Automatizada", layout="wide")
@@ -41,95 +52,303 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 st.title("🧪 Herramienta CAAT – Auditoría Automatizada")
-st.caption("Soporta **CSV/XLSX/XLS/TXT**. Resultados en **XLSX** y reportes en **DOCX**.")
+st.caption("Soporta **CSV/XLSX/XLS/TXT**, uno o varios archivos por prueba. Resultados en **XLSX** y reportes en **DOCX**.")
 
-# ------------------- Utilidades comunes -------------------
-SINONIMOS_ID = ["idfactura","id_factura","numero","número","numerofactura","numero_factura",
-    "serie","serie_comprobante","clave_acceso","idtransaccion","id_transaccion","referencia","doc","documento","id","idcliente","idproveedor"]
-SINONIMOS_MONTO = ["total","monto","importe","valor","monto_total","total_ingresado",
-    "importe_total","importe neto","subtotal+iva","total factura","totalfactura","amount","total_amount"]
-SINONIMOS_FECHA = ["fecha","fecha_emision","fecha emisión","f_emision","fecha documento",
-    "fecha_doc","fechadoc","fecha fact","fecha factura","emision","date","fecha_registro"]
-
-def sniff_delimiter(sample_bytes: bytes):
-    try:
-        sample = sample_bytes.decode('utf-8', errors='ignore')
-        dialect = csv.Sniffer().sniff(sample, delimiters=";,|\t")
-        return dialect.delimiter
-    except Exception:
-        return None
+# ------------------- Lectura de archivos (con caché) -------------------
+TIPOS = ["csv","xlsx","xls","txt"]
 
-def try_read_csv(file_obj):
-    data = file_obj.read()
-    if isinstance(data, bytes):
-        delim = sniff_delimiter(data[:4096])
-        bio = io.BytesIO(data)
-        if delim:
-            try: return pd.read_csv(bio, sep=delim, engine="python")
-            except Exception: pass
-        bio.seek(0)
-        try: return pd.read_csv(bio, sep=None, engine="python")
-        except Exception:
-            bio.seek(0); return pd.read_csv(bio, sep=None, engine="python", encoding="latin-1")
-    else:
-        return pd.read_csv(io.StringIO(data))
+class Lote:
+    """Varios archivos subidos en un mismo control; se leen y consolidan como una sola tabla."""
+    def __init__(self, files):
+        self.files = list(files)
+        nombres = [f.name for f in self.files]
+        self.name = f"{len(nombres)} archivos ({', '.join(nombres[:3])}{'…' if len(nombres) > 3 else ''})"
+
+def subir(label, key):
+    """Uno o varios archivos: ``None``, el archivo suelto o un ``Lote``."""
+    files = st.file_uploader(label, type=TIPOS, key=key, accept_multiple_files=True)
+    if not files: return None
+    return files[0] if len(files) == 1 else Lote(files)
 
-def try_read_excel(file_obj, widget_key="sheet"):
-    xls = pd.ExcelFile(file_obj)
-    sheet = st.selectbox("📄 Hoja de Excel", xls.sheet_names, key=widget_key)
-    return pd.read_excel(xls, sheet_name=sheet)
+def try_read_csv(file_obj):
+    file_obj.seek(0)
+    return read_csv_fast(file_obj)
+
+@st.cache_resource
+def parse_cache() -> ParseCache: return ParseCache()
+
+def upload_digest(file) -> str:
+    # El hash se calcula una vez por archivo subido y sesión; los reruns reutilizan el valor.
+    memo = st.session_state.setdefault("_upload_digests", {})
+    fid = (getattr(file, "file_id", None) or file.name, getattr(file, "size", None))
+    if fid not in memo: memo[fid] = content_hash(file)
+    return memo[fid]
+
+def pick_sheet(file_obj, widget_key="sheet", label="📄 Hoja de Excel"):
+    if not file_obj.name.lower().endswith((".xlsx",".xls")): return None
+    digest = upload_digest(file_obj)
+    memo = st.session_state.setdefault("_sheet_names", {})
+    if digest not in memo: memo[digest] = excel_sheets(file_obj)
+    return st.selectbox(label, memo[digest], key=widget_key)
+
+def es_excel(file) -> bool:
+    if isinstance(file, Lote): return any(es_excel(f) for f in file.files)
+    return file.name.lower().endswith((".xlsx",".xls"))
+
+def clave_lectura(file, sheet=None, usecols=None, nrows=None) -> str:
+    """Entrada de la caché de una lectura: la misma para un archivo suelto y para el mismo archivo dentro de un lote."""
+    if not es_excel(file): return cache_key(upload_digest(file), reader="csv", version=CSV_READER_VERSION, compacta=True)
+    return cache_key(upload_digest(file), sheet, reader="excel", usecols=None if usecols is None else tuple(usecols), nrows=nrows, compacta=True)
+
+def try_read_excel(file_obj, sheet, usecols=None, nrows=None):
+    # Vista previa (nrows) o solo las columnas de la prueba (usecols); cada combinación tiene su entrada en caché.
+    cols = None if usecols is None else tuple(usecols)
+    return parse_cache().get_or_load(clave_lectura(file_obj, sheet, cols, nrows),
+                                     lambda: compact_frame(read_excel_columns(file_obj, sheet=sheet, usecols=cols, nrows=nrows)))
 
 def load_any(file, widget_key="sheet"):
     name = file.name.lower()
     if name.endswith(".csv") or name.endswith(".txt"):
-        return try_read_csv(file)
+        with etapa(f"carga {file.name}") as e:
+            # Se compacta antes de entrar a la caché: lo que queda en memoria es la versión reducida.
+            df = parse_cache().get_or_load(clave_lectura(file),
+                                           lambda: compact_frame(normalize_headers(try_read_csv(file))))
+            e.filas = len(df)
+        st.caption(" · ".join(x for x in (describe_read(df), describe_compaction(df)) if x))
+        return df
     if name.endswith((".xlsx",".xls")):
-        return try_read_excel(file, widget_key=widget_key)
+        # Excel: solo una vista previa para elegir columnas; los datos se leen al ejecutar (leer_columnas).
+        sheet = pick_sheet(file, widget_key)
+        with etapa(f"carga {file.name} (vista previa)") as e: df = try_read_excel(file, sheet, nrows=PREVIEW_ROWS); e.filas = len(df)
+        st.caption(describe_read(df))
+        return df
     raise ValueError("Formato no soportado")
 
-def normalize_headers(df): df.columns = [str(c).strip() for c in df.columns]; return df
-def col_auto(df, candidatos):
-    cols_norm = {c.lower().strip(): c for c in df.columns}
-    for alias in candidatos:
-        if alias in cols_norm: return cols_norm[alias]
-    for c in df.columns:
-        if any(alias in c.lower() for alias in candidatos): return c
-    return None
-def coerce_amount(series):
-    s = series.astype(str).str.replace(r"\.", "", regex=True).str.replace(",", ".", regex=False)
-    return pd.to_numeric(s, errors="coerce")
-def coerce_date(series): return pd.to_datetime(series, errors="coerce", dayfirst=True)
-
-def to_xlsx_bytes(df, sheet_name="Hoja1"):
-    buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as w: df.to_excel(w, index=False, sheet_name=sheet_name[:31])
-    return buf.getvalue()
-
-def to_multi_xlsx_bytes(sheets: dict):
-    buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as w:
-        for name, df in sheets.items():
-            nm = str(name)[:31]
-            if isinstance(df, pd.DataFrame): df.to_excel(w, index=False, sheet_name=nm)
-            else: pd.DataFrame({"valor":[df]}).to_excel(w, index=False, sheet_name=nm)
-    return buf.getvalue()
-
-def docx_from_sections(title: str, sections: list[tuple[str, list[str]]]) -> bytes:
-    d = Document(); d.add_heading(title, level=1)
-    for heading, bullets in sections:
-        d.add_heading(heading, level=2)
-        for item in bullets:
-            p = d.add_paragraph(item, style="List Bullet"); p.style.font.size = Pt(11)
-    bio = io.BytesIO(); d.save(bio); return bio.getvalue()
-
-# ============================ MÓDULO 1: Montos Inusuales ============================
+def hojas_lote(lote, widget_key) -> list:
+    """Una hoja por cada libro de Excel del lote (``None`` para CSV/TXT)."""
+    if not es_excel(lote): return [None] * len(lote.files)
+    with st.expander("📄 Hojas por archivo", expanded=False):
+        return [pick_sheet(f, f"{widget_key}_{i}", label=f"📄 {f.name}") for i, f in enumerate(lote.files)]
+
+def leer_lote(lote, hojas, usecols=None, nrows=None):
+    """Tablas de cada archivo desde la caché; las que faltan se parsean juntas en el pool de procesos."""
+    usecols = usecols or [None] * len(lote.files)
+    claves = [clave_lectura(f, h, u, nrows) for f, h, u in zip(lote.files, hojas, usecols)]
+    frames = [parse_cache().get(k) for k in claves]
+    faltan = [i for i, df in enumerate(frames) if df is None]
+    if faltan:
+        tareas = [dict(nombre=lote.files[i].name, datos=lote.files[i].getvalue(), hoja=hojas[i],
+                       usecols=usecols[i], nrows=nrows if es_excel(lote.files[i]) else None) for i in faltan]
+        for i, df in zip(faltan, leer_archivos(tareas)): parse_cache().put(claves[i], df); frames[i] = df
+    return claves, frames
+
+def cargar_lote(lote, widget_key="sheet", columnas=None):
+    """Tabla consolidada del lote: encabezados alineados, ``_ARCHIVO_`` y ``_FILA_ARCHIVO_``.
+
+    Sin ``columnas``, los libros de Excel aportan su vista previa; con ``columnas`` (nombres consolidados),
+    de cada libro se leen solo las suyas, con el encabezado que tienen en ese archivo.
+    """
+    hojas = [st.session_state.get(f"{widget_key}_{i}") for i in range(len(lote.files))] if columnas else hojas_lote(lote, widget_key)
+    nombres = [f.name for f in lote.files]
+    with etapa(f"carga {lote.name}" + (f" ({len(columnas)} columnas)" if columnas else "")) as e:
+        _, vistas = leer_lote(lote, hojas, nrows=PREVIEW_ROWS)
+        mapeos = alinear_encabezados([v.columns for v in vistas])
+        usecols = None
+        if columnas:
+            usecols = [[o for o, d in m.items() if d in columnas] or list(m)[:1] if es_excel(f) else None for f, m in zip(lote.files, mapeos)]
+        claves, frames = leer_lote(lote, hojas, usecols=usecols, nrows=None if columnas else PREVIEW_ROWS)
+        df = parse_cache().get_or_load(cache_key(" + ".join(claves), None, reader="lote"), lambda: consolidar(frames, nombres, mapeos))
+        e.filas = len(df)
+    if not columnas:
+        notas = describir_alineacion(mapeos, nombres)
+        if notas:
+            with st.expander(f"🔗 Alineación de encabezados ({len(notas)})", expanded=False): st.markdown("\n".join(f"- {n}" for n in notas))
+        st.caption(" · ".join(f"{n}: {k:,} filas" for n, k in df.attrs.get("archivos", {}).items()))
+    st.caption(describe_compaction(df))
+    return df
+
+def cargar(file, widget_key="sheet"):
+    df = cargar_lote(file, widget_key) if isinstance(file, Lote) else load_any(file, widget_key=widget_key)
+    with etapa("normalización de encabezados", len(df)): return normalize_headers(df)
+
+def leer_columnas(file, df, columnas, widget_key="sheet"):
+    """Datos para ejecutar la prueba: CSV/TXT ya está completo; de Excel se leen solo ``columnas``."""
+    if not es_excel(file): return df
+    cols = [c for c in dict.fromkeys(columnas) if c is not None]
+    if isinstance(file, Lote): return normalize_headers(cargar_lote(file, widget_key, cols))
+    with etapa(f"carga {file.name} ({len(cols)} columnas)") as e:
+        out = try_read_excel(file, st.session_state.get(widget_key), usecols=cols); e.filas = len(out)
+    st.caption(describe_compaction(out))
+    return normalize_headers(out)
+
+def columnas_extra(file, df, usadas, key) -> list:
+    """En Excel, columnas además de las de la prueba que se quieren ver en los hallazgos."""
+    if not es_excel(file): return []
+    return st.multiselect("➕ Columnas adicionales en los hallazgos (Excel: solo se leen las columnas elegidas)",
+                          [c for c in df.columns if c not in usadas and c not in (COL_ARCHIVO, COL_FILA)], key=key)
+
+def filas_txt(file, df) -> str:
+    if not es_excel(file): return f"Filas: {len(df)}"
+    if isinstance(file, Lote): return f"Vista previa de {len(df)} filas de {len(file.files)} archivos"
+    total = df.attrs.get("lectura", {}).get("filas_hoja")
+    return f"Vista previa de {len(df)} filas" + (f" (hoja: ~{total:,} filas)" if total else "")
+
+# ------------------- Resultados por sesión -------------------
+def results() -> ResultCache:
+    # Por sesión: las corridas de un auditor sobreviven a reruns, cambios de pestaña y descargas.
+    return st.session_state.setdefault("_resultados", ResultCache())
+
+def input_id(file, widget_key="sheet") -> str:
+    """Identidad de una entrada: hash del contenido + hoja elegida (Excel); en un lote, la de cada archivo."""
+    if isinstance(file, Lote): return " + ".join(input_id(f, f"{widget_key}_{i}") for i, f in enumerate(file.files))
+    sheet = st.session_state.get(widget_key) if file.name.lower().endswith((".xlsx",".xls")) else None
+    return cache_key(upload_digest(file), sheet)
+
+def run_key(prueba: str, *entradas, **params) -> str:
+    return cache_key(" + ".join(entradas), None, prueba=prueba, **params)
+
+def ui_sidebar_cache():
+    s = parse_cache().stats()
+    with st.sidebar:
+        st.subheader("⚡ Caché de lectura")
+        c1, c2 = st.columns(2)
+        c1.metric("Aciertos", s["hits"] + s["disk_hits"]); c2.metric("Fallos", s["misses"])
+        c1.metric("En memoria", f"{s['mem_bytes']/MB:,.2f} MB"); c2.metric("En disco", f"{s['disk_bytes']/MB:,.2f} MB")
+        st.caption(f"Tasa de acierto {s['hit_rate']*100:.0f}% · {s['mem_entries']} tablas en memoria, "
+                   f"{s['disk_entries']} en disco · {s['spills']} volcados a Parquet")
+        r = results().stats()
+        st.caption(f"Resultados en sesión: {r['runs']} corridas, {r['files']} entregables generados, "
+                   f"{r['bytes']/MB:,.1f} MB · {r['evictions']} desalojadas")
+        if st.button("🧹 Vaciar caché", key="cache_clear"): parse_cache().clear(); results().clear()
+
+def ui_sidebar_rendimiento():
+    with st.sidebar:
+        st.subheader("⏱️ Rendimiento")
+        st.toggle("Mostrar panel por pestaña (mide también memoria)", key="perf_panel")
+        st.caption(f"Los tiempos de cada corrida se agregan a `{LOG_RENDIMIENTO}`.")
+
+def medicion(origen: str) -> Medicion:
+    # Con el panel oculto solo se toman tiempos: tracemalloc queda apagado.
+    return Medicion(origen, memoria=bool(st.session_state.get("perf_panel")))
+
+def panel_rendimiento(med: Medicion):
+    if not st.session_state.get("perf_panel") or not med.etapas: return
+    with st.expander("⏱️ Rendimiento", expanded=False):
+        st.dataframe(med.tabla().rename(columns={"etapa": "Etapa", "segundos": "Pared (s)", "cpu_s": "CPU (s)",
+                                                 "pico_mb": "Pico memoria (MB)", "filas": "Filas",
+                                                 "filas_por_s": "Filas/s", "error": "Error"}),
+                     hide_index=True)
+        st.caption(f"Total {med.total():,.3f} s · corrida `{med.id}` · memoria según tracemalloc "
+                   "(asignaciones de Python/NumPy; no incluye búferes de Arrow).")
+
+# ------------------- Utilidades comunes -------------------
+def lazy_bytes(run: str, name: str, build, filas=None):
+    """Callable para ``st.download_button``: el entregable se arma al pulsar (en otro hilo, fuera de la
+    medición de la pestaña) y queda guardado con su corrida para las descargas siguientes."""
+    store = results()
+    def data():
+        with Medicion(f"descarga {name}"), etapa(f"exportación {name}", filas): return store.deliverable(run, name, build)
+    return data
+
+def download_tables(label: str, sheets: dict, base: str, key: str, run: str):
+    """Botón de descarga con selector de formato (XLSX en streaming, Parquet o CSV.gz)."""
+    fmt = st.radio(f"Formato – {label}", list(FORMATOS), format_func=lambda f: FORMATOS[f][0], horizontal=True,
+                   key=f"{key}_fmt", label_visibility="collapsed")
+    name, mime = export_name(base, fmt, len(sheets))
+    filas = sum(len(v) for v in sheets.values() if isinstance(v, pd.DataFrame))
+    st.download_button(f"{label} ({FORMATOS[fmt][0]})", lazy_bytes(run, name, lambda: export_bytes(sheets, fmt), filas),
+                       name, mime, key=key, on_click="ignore")
+
+def download_docx(title: str, sections, file_name: str, run: str):
+    """``sections`` es un callable: las secciones también se arman solo si se pide el reporte."""
+    st.download_button("⬇️ Descargar reporte (DOCX)", lazy_bytes(run, file_name, lambda: docx_from_sections(title, sections())),
+                       file_name, "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                       key=f"{file_name}_dl", on_click="ignore")
+
+# ============================ MÓDULO 1: Facturas Duplicadas ============================
+def ui_duplicados():
+    st.markdown("""
+<div class="section-card">
+  <div class="section-title">1️⃣ Detección de Facturas Duplicadas</div>
+  <div class="section-desc">
+    Busca <strong>duplicados exactos</strong> (mismo número, monto y fecha) y <strong>duplicados cercanos</strong>:
+    mismo proveedor y monto a pocos días, <strong>dígitos transpuestos</strong> en el número o
+    <strong>número repetido</strong> con otro monto. Es el hallazgo más frecuente de <em>pago doble</em>.
+  </div>
+</div>
+""", unsafe_allow_html=True)
+
+    with st.expander("🧭 ¿Qué puede descubrir esta prueba?", expanded=True):
+        st.markdown("""
+- **Facturas registradas o pagadas dos veces** (reprocesos de interfaz, carga manual repetida).  
+- **Errores de digitación** del número (dígitos intercambiados) que burlan el control de unicidad del ERP.  
+- **Refacturación** del mismo monto al mismo proveedor en pocos días.  
+
+**Entregables:**  
+- **XLSX**: Resumen, Duplicados exactos (por grupo), Pares cercanos (con motivo y días entre fechas) y monto por proveedor.  
+- **DOCX**: Resumen, principales casos y **recomendaciones** para recuperar pagos dobles.
+""")
+
+    file_dup = subir("📁 Subir archivo(s) (CSV/XLSX/XLS/TXT)", key="duplicados")
+    if not file_dup: return
+
+    dfd = cargar(file_dup, widget_key="sheet_dup")
+    st.success(f"✅ Archivo cargado. {filas_txt(file_dup, dfd)}")
+    with st.expander("Vista previa (primeras filas)", expanded=False): st.dataframe(dfd.head())
+
+    cols = dfd.columns.tolist()
+    num_sug, monto_sug, fecha_sug = col_auto(dfd, SINONIMOS_ID), sugerir_monto(dfd), col_auto(dfd, SINONIMOS_FECHA)
+    col_num = st.selectbox("🧾 Número de factura", cols, index=cols.index(num_sug) if num_sug in cols else 0, key="dup_num")
+    prov_sug = col_auto(dfd.drop(columns=col_num), SINONIMOS_PROVEEDOR)
+    col_monto = st.selectbox("💰 Columna de monto", cols, index=cols.index(monto_sug) if monto_sug in cols else 0, key="dup_monto")
+    col_fecha = st.selectbox("📅 Columna de fecha (opcional)", ["(ninguna)"] + cols,
+                             index=(["(ninguna)"] + cols).index(fecha_sug) if fecha_sug in cols else 0, key="dup_fecha")
+    col_prov = st.selectbox("🏢 Proveedor (opcional)", ["(ninguna)"] + cols,
+                            index=(["(ninguna)"] + cols).index(prov_sug) if prov_sug in cols else 0, key="dup_prov")
+    c1, c2 = st.columns(2)
+    dias = c1.number_input("Mismo monto a ≤ N días", min_value=0, value=DIAS, disabled=col_fecha == "(ninguna)", key="dup_dias")
+    ventana = c2.number_input("Vecinas comparadas por fila", min_value=1, max_value=100, value=VENTANA, key="dup_ventana",
+                              help="Tras ordenar por la clave de bloqueo, cada fila se compara con las N siguientes.")
+    params = dict(col_numero=col_num, col_monto=col_monto, col_fecha=None if col_fecha == "(ninguna)" else col_fecha,
+                  col_proveedor=None if col_prov == "(ninguna)" else col_prov, dias=int(dias), ventana=int(ventana))
+    extra = columnas_extra(file_dup, dfd, (col_num, col_monto, col_fecha, col_prov), key="dup_extra")
+
+    run = run_key("duplicados", input_id(file_dup, "sheet_dup"), extra=extra, **params)
+    if st.button("🔍 Buscar duplicados"):
+        dfd = leer_columnas(file_dup, dfd, [col_num, col_monto, params["col_fecha"], params["col_proveedor"], *extra], "sheet_dup")
+        with etapa("detección de duplicados", len(dfd)): results().put(run, trazar(detectar_duplicados(dfd, **params), dfd))
+    res = results().get(run)
+    if res is None: return
+
+    st.subheader("📊 Resultados")
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Analizadas", res["n"]); c2.metric("Grupos exactos", res["grupos_exactos"])
+    c3.metric("Pares cercanos", len(res["cercanos"])); c4.metric("Monto de las copias", f"{res['monto_copias']:,.2f}")
+    st.caption(" · ".join(f"{m}: {v:,}" for m, v in res["por_motivo"].items())
+               + (f" · ⚠️ {res['sin_monto']:,} filas sin monto válido" if res["sin_monto"] else ""))
+    if not res["filas_exactas"] and res["cercanos"].empty:
+        st.success("✅ No se encontraron facturas duplicadas.")
+        return
+
+    with etapa("armado de reportes"): sheets = duplicados_sheets(res)
+    download_tables("⬇️ Descargar hallazgos", sheets, "facturas_duplicadas", key="dup_dl", run=run)
+    with st.expander("Ver tablas", expanded=False):
+        st.write("🟥 Duplicados exactos"); st.dataframe(res["exactos"].head(1000))
+        st.write("🟧 Pares cercanos (a validar)"); st.dataframe(res["cercanos"].head(1000))
+        if not res["por_proveedor"].empty: st.write("🏢 Por proveedor"); st.dataframe(res["por_proveedor"].head(1000))
+
+    download_docx("Facturas Duplicadas – Reporte de Auditoría", lambda: duplicados_sections(res, file_dup.name),
+                  "reporte_duplicados.docx", run)
+
+# ============================ MÓDULO 2: Montos Inusuales ============================
 def ui_montos_inusuales():
     st.markdown("""
 <div class="section-card">
   <div class="section-title">2️⃣ Detección de Montos Inusuales</div>
   <div class="section-desc">
-    Identifica transacciones que se apartan de los patrones normales por <strong>umbral fijo</strong> o por
-    <strong>análisis estadístico (media + k·σ)</strong>. Ayuda a detectar <em>errores de registro</em>, 
+    Identifica transacciones que se apartan de los patrones normales por <strong>umbral fijo</strong>, por
+    <strong>análisis estadístico (media + k·σ)</strong> o por <strong>umbrales robustos (mediana/MAD, cuartiles)</strong>,
+    globales o por ID/periodo. Ayuda a detectar <em>errores de registro</em>, 
     <em>pagos extraordinarios</em> y posibles <em>fraudes</em>.
   </div>
 </div>
@@ -140,118 +359,109 @@ def ui_montos_inusuales():
 - **Pagos/egresos atípicos** por monto o z-score elevado.  
 - **Sobrefacturación** o **errores de digitación** (ceros extra, separadores).  
 - **Operaciones fuera de política** que requieren justificación o aprobación adicional.  
+- **Montos atípicos para su propio proveedor/cliente o periodo**, que un umbral global no distingue.  
 
 **Entregables:**  
-- **XLSX**: Hallazgos, Resumen Estadístico, Top por monto, Top por z-score (y agrupación por ID si la seleccionas).  
+- **XLSX**: Hallazgos (con las estadísticas del grupo de cada fila si el umbral es por grupo), Resumen Estadístico, Top por monto, Top por z-score (y agrupación por ID si la seleccionas).  
 - **DOCX**: Resumen, análisis y **recomendaciones accionables** para el auditor.
 """)
 
-    file_unusual = st.file_uploader("📁 Subir archivo (CSV/XLSX/XLS/TXT)", type=["csv","xlsx","xls","txt"], key="unusual")
+    file_unusual = subir("📁 Subir archivo(s) (CSV/XLSX/XLS/TXT)", key="unusual")
     if not file_unusual: return
-
-    dfm = load_any(file_unusual, widget_key="sheet_unusual"); dfm = normalize_headers(dfm)
-    st.success(f"✅ Archivo cargado. Filas: {len(dfm)}")
+    streaming = st.toggle("🌊 Modo streaming (archivos grandes: lectura por bloques con memoria acotada)", key="unusual_stream",
+                          disabled=isinstance(file_unusual, Lote), help="Un solo archivo por vez.")
+    streaming = streaming and not isinstance(file_unusual, Lote)
+
+    if streaming:
+        sheet = pick_sheet(file_unusual, widget_key="sheet_unusual")
+        with etapa("carga (vista previa)"): dfm = read_preview(file_unusual, sheet=sheet)
+        with etapa("normalización de encabezados", len(dfm)): dfm = normalize_headers(dfm)
+        st.success(f"✅ Modo streaming: columnas tomadas de las primeras {len(dfm)} filas; el archivo se recorre por bloques.")
+    else:
+        dfm = cargar(file_unusual, widget_key="sheet_unusual")
+        st.success(f"✅ Archivo cargado. {filas_txt(file_unusual, dfm)}")
     with st.expander("Vista previa (primeras filas)", expanded=False): st.dataframe(dfm.head())
 
-    sug_monto = col_auto(dfm, SINONIMOS_MONTO) or (dfm.select_dtypes(include="number").columns.tolist()[:1] or [None])[0]
+    sug_monto = sugerir_monto(dfm)
     col_monto = st.selectbox("💰 Columna de monto", dfm.columns.tolist(),
                              index=(dfm.columns.tolist().index(sug_monto) if sug_monto in dfm.columns else 0))
     col_id = st.selectbox("🔑 Columna identificadora (opcional)", ["(ninguna)"] + dfm.columns.tolist(), index=0)
     col_fecha_opt = st.selectbox("📅 Columna de fecha (opcional)", ["(ninguna)"] + dfm.columns.tolist(), index=0)
+    extra = [] if streaming else columnas_extra(file_unusual, dfm, (col_monto, col_id, col_fecha_opt), key="unusual_extra")
 
-    metodo = st.radio("Método de detección", ["Umbral fijo", "Umbral estadístico (media + k·σ)"], horizontal=True)
-    if metodo.startswith("Umbral fijo"):
+    opciones = {"Umbral fijo": "fijo", "Umbral estadístico (media + k·σ)": "estadistico"}
+    if not streaming: opciones.update({"Mediana + k·MAD (robusto)": "mediana_mad", "Cuartiles (Q3 + k·IQR)": "iqr"})
+    metodo = opciones[st.radio("Método de detección", list(opciones), horizontal=True)]
+    umbral, k, grupo = 10000.0, 2, {}
+    if metodo == "fijo":
         umbral = st.number_input("💵 Umbral fijo ($):", min_value=0.0, value=10000.0)
         ejecutar = st.button("🔍 Ejecutar (fijo)")
     else:
-        k = st.slider("🔬 k (media + k·σ)", min_value=1, max_value=5, value=2)
-        ejecutar = st.button("🔍 Ejecutar (estadístico)")
-
-    if not ejecutar: return
-
-    serie_monto = dfm[col_monto]
-    if serie_monto.dtype == object: serie_monto = coerce_amount(serie_monto)
-    dfm["_MONTO_"] = pd.to_numeric(serie_monto, errors="coerce")
-    base = dfm.dropna(subset=["_MONTO_"]).copy()
-
-    if col_fecha_opt != "(ninguna)": base["_FECHA_"] = coerce_date(base[col_fecha_opt])
-
-    if metodo.startswith("Umbral fijo"):
-        limite = umbral; criterio_txt = f"Umbral fijo = {umbral:,.2f}"
-    else:
-        media = base["_MONTO_"].mean(); std = base["_MONTO_"].std(ddof=0); limite = media + k*std
-        criterio_txt = f"Umbral estadístico = media {media:,.2f} + {k}·σ {std:,.2f} → {limite:,.2f}"
-
-    hall = base[base["_MONTO_"] > limite].copy()
-    total_tx, total_h = len(base), len(hall)
-    prop_h = (total_h/total_tx) if total_tx else 0.0
-    suma_total, suma_h = base["_MONTO_"].sum(), hall["_MONTO_"].sum()
+        if metodo == "estadistico": k = st.slider("🔬 k (media + k·σ)", min_value=1, max_value=5, value=2)
+        else: k = st.slider(f"🔬 k ({METODOS[metodo]})", min_value=0.5, max_value=6.0, value=3.0 if metodo == "mediana_mad" else 1.5, step=0.5)
+        if not streaming:
+            with st.expander("👥 Umbral por grupo (ID y/o periodo)", expanded=metodo != "estadistico"):
+                por_id = st.checkbox("Calcular el umbral por ID", disabled=col_id == "(ninguna)",
+                                     help="Cada ID se compara con su propia distribución de montos.")
+                periodo = st.selectbox("Calcular el umbral por periodo", ["(ninguno)", *PERIODOS],
+                                       format_func=lambda p: PERIODOS.get(p, p), disabled=col_fecha_opt == "(ninguna)")
+                ventana = st.number_input("Ventana móvil (periodos)", min_value=1, max_value=12, value=1,
+                                          disabled=periodo == "(ninguno)", help="1 = cada periodo por separado.")
+                min_grupo = st.number_input("Mínimo de filas por grupo (los menores usan el umbral global)", min_value=2, value=MIN_GRUPO)
+            grupo = dict(por_id=bool(por_id and col_id != "(ninguna)"),
+                         periodo=None if periodo == "(ninguno)" or col_fecha_opt == "(ninguna)" else periodo,
+                         ventana=int(ventana), min_grupo=int(min_grupo))
+        ejecutar = st.button("🔍 Ejecutar (estadístico)" if metodo == "estadistico" else "🔍 Ejecutar (robusto)")
+
+    params = dict(col_monto=col_monto, metodo=metodo,
+                  umbral=umbral, k=k, col_id=None if col_id == "(ninguna)" else col_id,
+                  col_fecha=None if col_fecha_opt == "(ninguna)" else col_fecha_opt)
+    run = run_key("montos", input_id(file_unusual, "sheet_unusual"), streaming=streaming, extra=extra, **params, **grupo)
+    if ejecutar:
+        if streaming:
+            with st.spinner("Recorriendo el archivo por bloques…"), etapa("detección (streaming: lectura + coerción)") as e:
+                res = detectar_montos_streaming(
+                    lambda usecols=None: (normalize_headers(c) for c in iter_chunks(file_unusual, sheet=sheet, usecols=usecols)),
+                    **params)
+                e.filas = res["total_tx"]
+        else:
+            dfm = leer_columnas(file_unusual, dfm, [col_monto, params["col_id"], params["col_fecha"], *extra], "sheet_unusual")
+            try:
+                with etapa("detección", len(dfm)): res = detectar_montos(dfm, **params, **grupo)
+            except ValueError as e: st.error(str(e)); return
+            res = trazar(res, dfm)
+        results().put(run, res)
+    res = results().get(run)
+    if res is None: return
+    hall, criterio_txt = res["hall"], res["criterio_txt"]
+    total_tx, total_h, prop_h = res["total_tx"], res["total_h"], res["prop_h"]
+    suma_h = res["suma_h"]
 
     st.subheader("📊 Resultados")
     c1,c2,c3,c4 = st.columns(4)
     c1.metric("Analizadas", total_tx); c2.metric("Hallazgos", total_h)
     c3.metric("% hallazgos", f"{prop_h*100:.2f}%"); c4.metric("Suma hallazgos", f"{suma_h:,.2f}")
     st.caption(f"**Criterio aplicado:** {criterio_txt}")
+    if res.get("fecha_no_convertible"):
+        st.caption(f"⚠️ {res['fecha_no_convertible']:,} fechas no convertibles "
+                   f"({res['prop_fecha_no_convertible']*100:.2f}% de las fechas informadas); quedan sin fecha.")
+    if res.get("lineas_omitidas"):
+        st.caption(f"⚠️ {res['lineas_omitidas']:,} líneas mal formadas omitidas en la lectura por bloques "
+                   f"(líneas {', '.join(map(str, res['lineas_omitidas_detalle']))}); no pueden figurar como hallazgos. "
+                   "Sin modo streaming se recuperan las que se pueden reparar.")
 
     if total_h == 0:
         st.success("✅ No se encontraron montos inusuales.")
         return
 
-    mu = base["_MONTO_"].mean(); sd = base["_MONTO_"].std(ddof=0) or 1.0
-    hall["_zscore_"] = (hall["_MONTO_"] - mu) / sd
-    top_monto = hall.sort_values("_MONTO_", ascending=False).head(20)
-    top_z = hall.sort_values("_zscore_", ascending=False).head(20)
-
-    grp = pd.DataFrame()
-    if col_id != "(ninguna)" and col_id in hall.columns:
-        grp = (hall.groupby(col_id, dropna=False).agg(N=("_MONTO_","count"), Suma=("_MONTO_","sum"), Max=("_MONTO_","max"))
-                     .sort_values("Suma", ascending=False).head(20))
-
-    sheets = {"Hallazgos": hall,
-              "ResumenEstadistico": pd.DataFrame({
-                  "Métrica":["Transacciones","Hallazgos","% hallazgos","Suma total","Suma hallazgos","Criterio"],
-                  "Valor":[total_tx, total_h, f"{prop_h*100:.2f}%", f"{suma_total:,.2f}", f"{suma_h:,.2f}", criterio_txt]
-              }),
-              "TopPorMonto": top_monto, "TopPorZscore": top_z}
-    if not grp.empty: sheets["GrupoPorID"] = grp.reset_index()
-
-    st.download_button("⬇️ Descargar hallazgos (XLSX)",
-                       to_multi_xlsx_bytes(sheets), "montos_inusuales.xlsx",
-                       "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    with etapa("armado de reportes"): sheets = montos_sheets(res)
+    download_tables("⬇️ Descargar hallazgos", sheets, "montos_inusuales", key="unusual_dl", run=run)
     with st.expander("Ver tabla de hallazgos", expanded=False): st.dataframe(hall.head(1000))
 
-    fecha_rango = "Sin fecha" if "_FECHA_" not in base.columns else f"{base['_FECHA_'].min()} → {base['_FECHA_'].max()}"
-    bullets_resumen = [
-        f"Archivo: {file_unusual.name}", f"Válidas: {total_tx}",
-        f"Hallazgos: {total_h} ({prop_h*100:.2f}%)", f"Suma hallazgos: {suma_h:,.2f} (vs total {suma_total:,.2f})",
-        f"Criterio: {criterio_txt}", f"Rango de fechas: {fecha_rango}"
-    ]
-    detalle = []
-    if total_h>0:
-        detalle += [f"Mayor hallazgo: {hall['_MONTO_'].max():,.2f}",
-                    f"Promedio hallazgos: {hall['_MONTO_'].mean():,.2f}"]
-        if col_id != "(ninguna)" and col_id in hall.columns:
-            top_id = hall.groupby(col_id)["_MONTO_"].sum().sort_values(ascending=False).head(5)
-            detalle.append("Top 5 por suma (ID): " + ", ".join([f"{i}: {v:,.2f}" for i,v in top_id.items()]))
-
-    recomendaciones = [
-        "Solicitar respaldo (OC, contratos, aprobaciones) y verificar trazabilidad en el ERP.",
-        "Revisar los 20 mayores importes y los 20 mayores z-scores (muestreo dirigido).",
-        "Validar límites de aprobación/segregación vs. flujo real de autorizaciones.",
-        "Analizar concentración por ID/centro/periodo; buscar patrones a fin de mes/cierre.",
-        "Cruzar con políticas de precios/ descuentos, impuestos y redondeos.",
-        "Si el % supera materialidad, ampliar muestra y aplicar pruebas sustantivas adicionales."
-    ]
-    sections = [("RESUMEN", [f"• {x}" for x in bullets_resumen]),
-                ("DETALLE PRINCIPAL", [f"• {x}" for x in detalle] if detalle else ["• Sin detalles adicionales."]),
-                ("RECOMENDACIONES", [f"• {x}" for x in recomendaciones]),
-                ("REFERENCIA XLSX", ["• 'montos_inusuales.xlsx' (Hallazgos, ResumenEstadistico, TopPorMonto, TopPorZscore, GrupoPorID si aplica)."])]
-    st.download_button("⬇️ Descargar reporte (DOCX)",
-                       docx_from_sections("Montos Inusuales – Reporte de Auditoría", sections),
-                       "reporte_montos_inusuales.docx",
-                       "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-
-# ============================ MÓDULO 2: Conciliación ============================
+    download_docx("Montos Inusuales – Reporte de Auditoría", lambda: montos_sections(res, file_unusual.name),
+                  "reporte_montos_inusuales.docx", run)
+
+# ============================ MÓDULO 3: Conciliación ============================
 def ui_conciliacion():
     st.markdown("""
 <div class="section-card">
@@ -271,18 +481,18 @@ def ui_conciliacion():
 - **Desalineaciones de fecha** (corte/cierre, reprocesos, integraciones).  
 
 **Entregables:**  
-- **XLSX**: Resumen, Solo en A, Solo en B, Diferencias de Monto, Diferencias de Fecha.  
+- **XLSX**: Resumen, Solo en A, Solo en B, Diferencias de Monto, Diferencias de Fecha, Coincidencias Aproximadas.  
 - **DOCX**: Impacto, top diferencias y **recomendaciones** (controles, conciliaciones automáticas, tolerancias).
 """)
 
     colA, colB = st.columns(2)
-    with colA: file_A = st.file_uploader("📁 Archivo A", type=["csv","xlsx","xls","txt"], key="conc_a")
-    with colB: file_B = st.file_uploader("📁 Archivo B", type=["csv","xlsx","xls","txt"], key="conc_b")
+    with colA: file_A = subir("📁 Archivo(s) A", key="conc_a")
+    with colB: file_B = subir("📁 Archivo(s) B", key="conc_b")
     if not (file_A and file_B): return
 
-    A = load_any(file_A, widget_key="sheet_A"); A = normalize_headers(A)
-    B = load_any(file_B, widget_key="sheet_B"); B = normalize_headers(B)
-    st.success(f"✅ Cargados A={len(A)} filas, B={len(B)} filas")
+    A = cargar(file_A, widget_key="sheet_A")
+    B = cargar(file_B, widget_key="sheet_B")
+    st.success(f"✅ Cargados A: {filas_txt(file_A, A)} · B: {filas_txt(file_B, B)}")
     with st.expander("Vista previa", expanded=False):
         st.write("A"); st.dataframe(A.head()); st.write("B"); st.dataframe(B.head())
 
@@ -290,8 +500,7 @@ def ui_conciliacion():
     if not comunes: st.error("No hay columnas en común."); return
 
     clave_sug = col_auto(A, SINONIMOS_ID) if col_auto(A, SINONIMOS_ID) in comunes else comunes[0]
-    montoA_sug = col_auto(A, SINONIMOS_MONTO) or (A.select_dtypes(include="number").columns.tolist()[:1] or [None])[0]
-    montoB_sug = col_auto(B, SINONIMOS_MONTO) or (B.select_dtypes(include="number").columns.tolist()[:1] or [None])[0]
+    montoA_sug, montoB_sug = sugerir_monto(A), sugerir_monto(B)
     fechaA_sug = col_auto(A, SINONIMOS_FECHA); fechaB_sug = col_auto(B, SINONIMOS_FECHA)
 
     st.subheader("🔧 Configuración")
@@ -303,93 +512,113 @@ def ui_conciliacion():
     fecha_B_opt = st.selectbox("📅 Fecha en B (opcional)", ["(ninguna)"] + B.columns.tolist(),
                                index=(["(ninguna)"] + B.columns.tolist()).index(fechaB_sug) if (fechaB_sug in B.columns) else 0)
     tolerancia = st.number_input("🎯 Tolerancia de monto", min_value=0.0, value=0.0)
-
-    if not st.button("🔍 Ejecutar conciliación"): return
-
-    A["_CLAVE_"] = A[clave].astype(str).str.strip().str.upper()
-    B["_CLAVE_"] = B[clave].astype(str).str.strip().str.upper()
-    A["_MONTO_"] = coerce_amount(A[monto_A]) if A[monto_A].dtype == object else pd.to_numeric(A[monto_A], errors="coerce")
-    B["_MONTO_"] = coerce_amount(B[monto_B]) if B[monto_B].dtype == object else pd.to_numeric(B[monto_B], errors="coerce")
-    if fecha_A_opt != "(ninguna)": A["_FECHA_"] = coerce_date(A[fecha_A_opt])
-    if fecha_B_opt != "(ninguna)": B["_FECHA_"] = coerce_date(B[fecha_B_opt])
-
-    merged = A.merge(B, on="_CLAVE_", how="outer", suffixes=("_A","_B"), indicator=True)
-    solo_A = merged[merged["_merge"]=="left_only"].copy()
-    solo_B = merged[merged["_merge"]=="right_only"].copy()
-    coinc   = merged[merged["_merge"]=="both"].copy()
-    coinc["_diff_monto"] = (coinc["_MONTO__A"] - coinc["_MONTO__B"])
-    coinc["_diff_monto_abs"] = coinc["_diff_monto"].abs()
-    diff_monto = coinc[coinc["_diff_monto_abs"] > tolerancia].copy()
-
-    diff_fecha = pd.DataFrame()
-    if "_FECHA__A" in coinc.columns and "_FECHA__B" in coinc.columns:
-        diff_fecha = coinc[(~coinc["_FECHA__A"].isna()) & (~coinc["_FECHA__B"].isna()) & (coinc["_FECHA__A"] != coinc["_FECHA__B"])][["_CLAVE_","_FECHA__A","_FECHA__B"]].copy()
-
-    total_A, total_B = A["_MONTO_"].sum(skipna=True), B["_MONTO_"].sum(skipna=True)
-    delta_total = total_A - total_B
-    c1,c2,c3,c4 = st.columns(4)
+    incremental = st.toggle("🗂️ Modo incremental (índice persistente de claves ya conciliadas)", key="conc_incremental",
+                            help="Cada carga trae solo las filas nuevas o modificadas del día; el índice local recuerda el resto.")
+    if incremental:
+        usadas = (clave, monto_A, monto_B, fecha_A_opt, fecha_B_opt)
+        extra_A = columnas_extra(file_A, A, usadas, key="conc_extra_a")
+        extra_B = columnas_extra(file_B, B, usadas, key="conc_extra_b")
+        ui_conciliacion_incremental(file_A, file_B, A, B, clave, monto_A, monto_B, tolerancia, extra_A, extra_B,
+                                    fecha_A=None if fecha_A_opt == "(ninguna)" else fecha_A_opt,
+                                    fecha_B=None if fecha_B_opt == "(ninguna)" else fecha_B_opt)
+        return
+    politica = st.selectbox("👥 Claves duplicadas", list(POLITICAS), format_func=POLITICAS.get, key="conc_politica")
+    aprox = st.checkbox("🔎 Proponer coincidencias aproximadas entre no conciliados", value=True, key="conc_aprox")
+    if aprox:
+        ca1, ca2 = st.columns(2)
+        ventana = ca1.number_input("Ventana de fecha (días)", min_value=0, value=5, key="conc_ventana")
+        score_min = ca2.slider("Puntaje mínimo", 0.5, 1.0, 0.8, 0.05, key="conc_score")
+    usadas = (clave, monto_A, monto_B, fecha_A_opt, fecha_B_opt)
+    extra_A = columnas_extra(file_A, A, usadas, key="conc_extra_a")
+    extra_B = columnas_extra(file_B, B, usadas, key="conc_extra_b")
+
+    params = dict(fecha_A=None if fecha_A_opt == "(ninguna)" else fecha_A_opt,
+                  fecha_B=None if fecha_B_opt == "(ninguna)" else fecha_B_opt,
+                  tolerancia=tolerancia, politica=politica,
+                  aproximado={"ventana_dias": ventana, "score_min": score_min} if aprox else None)
+    run = run_key("conciliacion", input_id(file_A, "sheet_A"), input_id(file_B, "sheet_B"),
+                  clave=clave, monto_A=monto_A, monto_B=monto_B, extra_A=extra_A, extra_B=extra_B, **params)
+    if st.button("🔍 Ejecutar conciliación"):
+        A = leer_columnas(file_A, A, [clave, monto_A, params["fecha_A"], *extra_A], "sheet_A")
+        B = leer_columnas(file_B, B, [clave, monto_B, params["fecha_B"], *extra_B], "sheet_B")
+        with etapa("conciliación (merge)", len(A) + len(B)): res = conciliar(A, B, clave, monto_A, monto_B, **params)
+        results().put(run, trazar(res, A, B))
+    res = results().get(run)
+    if res is None: return
+
+    solo_A, solo_B, diff_monto, diff_fecha = res["solo_A"], res["solo_B"], res["diff_monto"], res["diff_fecha"]
+    delta_total = res["delta_total"]
+    c1,c2,c3,c4,c5 = st.columns(5)
     c1.metric("Solo en A", len(solo_A)); c2.metric("Solo en B", len(solo_B))
     c3.metric("Dif. monto", len(diff_monto)); c4.metric("Δ A-B", f"{delta_total:,.2f}")
+    c5.metric("Claves duplicadas", len(res["duplicados"]))
+    if aprox: st.metric("Coincidencias aproximadas propuestas", len(res["aprox"]))
+    nc = {k: v for k, v in res.get("fechas_no_convertibles", {}).items() if v[0]}
+    if nc: st.caption("⚠️ Fechas no convertibles (no se comparan): "
+                      + " · ".join(f"{k}: {n:,} ({p*100:.2f}%)" for k, (n, p) in nc.items()))
 
-    sheets = {
-        "Resumen": pd.DataFrame({
-            "Métrica":["Total A","Total B","Δ A-B","Solo en A (n)","Solo en B (n)","Dif. monto (n)","Dif. fecha (n)","Tolerancia"],
-            "Valor":[f"{total_A:,.2f}", f"{total_B:,.2f}", f"{delta_total:,.2f}", len(solo_A), len(solo_B), len(diff_monto), len(diff_fecha), f"{tolerancia:,.2f}"]
-        }),
-        "Solo_en_A": solo_A, "Solo_en_B": solo_B,
-        "Diferencias_Monto": diff_monto[["_CLAVE_","_MONTO__A","_MONTO__B","_diff_monto","_diff_monto_abs"]],
-        "Diferencias_Fecha": diff_fecha if not diff_fecha.empty else pd.DataFrame(columns=["_CLAVE_","_FECHA__A","_FECHA__B"])
-    }
-    st.download_button("⬇️ Descargar hallazgos (XLSX)",
-                       to_multi_xlsx_bytes(sheets), "hallazgos_conciliacion.xlsx",
-                       "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    with etapa("armado de reportes"): sheets = conciliacion_sheets(res)
+    download_tables("⬇️ Descargar hallazgos", sheets, "hallazgos_conciliacion", key="conc_dl", run=run)
 
     with st.expander("Ver tablas resumidas", expanded=False):
         st.write("🟦 Solo en A"); st.dataframe(solo_A.head(1000))
         st.write("🟧 Solo en B"); st.dataframe(solo_B.head(1000))
         st.write("🟥 Diferencias de monto"); st.dataframe(diff_monto[["_CLAVE_","_MONTO__A","_MONTO__B","_diff_monto","_diff_monto_abs"]].head(1000))
         if not diff_fecha.empty: st.write("🟨 Diferencias de fecha"); st.dataframe(diff_fecha.head(1000))
-
-    top_dif = diff_monto.sort_values("_diff_monto_abs", ascending=False).head(10)
-    pos = diff_monto[diff_monto["_diff_monto"] > 0]["_diff_monto"].sum()
-    neg = diff_monto[diff_monto["_diff_monto"] < 0]["_diff_monto"].sum()
-    bullets = [
-        f"Archivo A: {file_A.name} | Archivo B: {file_B.name}",
-        f"Total A: {total_A:,.2f} | Total B: {total_B:,.2f} | Δ A-B: {delta_total:,.2f}",
-        f"Solo en A: {len(solo_A)} | Solo en B: {len(solo_B)}",
-        f"Dif. monto (> tol.): {len(diff_monto)} | Suma Δ+ {pos:,.2f} | Δ- {neg:,.2f}",
-        f"Dif. fecha: {len(diff_fecha)}", f"Tolerancia aplicada: {tolerancia:,.2f}"
-    ]
-    det = [f"{r.get('_CLAVE_','s/clave')}: A={r.get('_MONTO__A',np.nan):,.2f} | B={r.get('_MONTO__B',np.nan):,.2f} | Δ={r.get('_diff_monto',np.nan):,.2f} (|Δ|={r.get('_diff_monto_abs',np.nan):,.2f})"
-           for _,r in top_dif.iterrows()] or ["No hay diferencias de monto sobre la tolerancia."]
-    rec = [
-        "Revisar interfaz/logs, horarios de corte y reprocesos entre A y B.",
-        "En diferencias de monto: confirmar TC, descuentos, impuestos, NC y redondeos.",
-        "Descartar asientos manuales fuera del flujo; revisar bitácoras y perfiles.",
-        "Conciliaciones automáticas periódicas con umbrales por tipo de transacción.",
-        "Investigar Solo en A/B: reprocesar interfaz y validar dependencia temporal (cierres)."
-    ]
-    sections = [("RESUMEN", [f"• {x}" for x in bullets]),
-                ("TOP 10 DIFERENCIAS", [f"• {x}" for x in det]),
-                ("RECOMENDACIONES", [f"• {x}" for x in rec]),
-                ("REFERENCIA XLSX", ["• 'hallazgos_conciliacion.xlsx' (Resumen, Solo_en_A, Solo_en_B, Diferencias_Monto, Diferencias_Fecha)."])]
-    st.download_button("⬇️ Descargar reporte (DOCX)",
-                       docx_from_sections("Conciliación A vs. B – Reporte de Auditoría", sections),
-                       "reporte_conciliacion.docx",
-                       "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-
-# ============================ MÓDULO 3: Benford ============================
-def first_digit_series(series: pd.Series) -> pd.Series:
-    if series.dtype == object: x = coerce_amount(series)
-    else: x = pd.to_numeric(series, errors="coerce")
-    x = x.abs(); x = x[x > 0].dropna()
-    s = x.apply(lambda v: f"{v:.15g}").str.replace(".", "", regex=False).str.lstrip("0")
-    first = s.str[0].dropna(); first = first[first.str.contains(r"[1-9]", regex=True)]
-    return first.astype(int)
-
-def benford_expected() -> pd.Series:
-    d = np.arange(1, 10); return pd.Series(np.log10(1 + 1/d), index=d)
-
+        if not res["duplicados"].empty: st.write("🟪 Claves duplicadas"); st.dataframe(res["duplicados"].head(1000))
+        if aprox and not res["aprox"].empty: st.write("🟩 Coincidencias aproximadas (a validar)"); st.dataframe(res["aprox"].head(1000))
+
+    download_docx("Conciliación A vs. B – Reporte de Auditoría", lambda: conciliacion_sections(res, file_A.name, file_B.name),
+                  "reporte_conciliacion.docx", run)
+
+def ui_conciliacion_incremental(file_A, file_B, A, B, clave, monto_A, monto_B, tolerancia, extra_A, extra_B, fecha_A, fecha_B):
+    """Carga del día contra el índice persistente: resueltas, abiertas nuevas y abiertas de corridas anteriores."""
+    nombre = st.text_input("Nombre del índice (uno por pareja de sistemas A/B)", value="conciliacion", key="conc_indice")
+    with IndiceConciliacion(nombre) as ix: info = ix.resumen()
+    if info["corridas"]:
+        st.caption(f"Índice `{ix.ruta}` · {info['claves']:,} claves · {info['abiertas']:,} abiertas · "
+                   f"{info['corridas']} corridas (última: {info['ultima']}) · tolerancia {float(info['tolerancia']):,.2f}")
+        with st.expander("⚠️ Reiniciar índice", expanded=False):
+            if st.checkbox("Confirmo que quiero borrar el historial de este índice", key="conc_reiniciar_ok") and \
+                    st.button("🗑️ Reiniciar índice"):
+                with IndiceConciliacion(nombre) as ix: ix.reiniciar()
+                st.success("Índice reiniciado."); st.rerun()
+    else: st.caption(f"Índice nuevo: la primera carga forma la base (`{ix.ruta}`).")
+
+    run = run_key("conciliacion_incremental", input_id(file_A, "sheet_A"), input_id(file_B, "sheet_B"), indice=ix.nombre,
+                  clave=clave, monto_A=monto_A, monto_B=monto_B, fecha_A=fecha_A, fecha_B=fecha_B, tolerancia=tolerancia,
+                  extra_A=extra_A, extra_B=extra_B)
+    if st.button("🔍 Ejecutar conciliación incremental"):
+        A = leer_columnas(file_A, A, [clave, monto_A, fecha_A, *extra_A], "sheet_A")
+        B = leer_columnas(file_B, B, [clave, monto_B, fecha_B, *extra_B], "sheet_B")
+        try:
+            with IndiceConciliacion(nombre) as ix, etapa("conciliación incremental", len(A) + len(B)):
+                res = conciliar_incremental(ix, A, B, clave, monto_A, monto_B, fecha_A=fecha_A, fecha_B=fecha_B, tolerancia=tolerancia)
+        except ValueError as e: st.error(str(e)); return
+        results().put(run, res)
+    res = results().get(run)
+    if res is None: return
+
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("Resueltas", len(res["resueltas"])); c2.metric("Abiertas nuevas", len(res["abiertas_nuevas"]))
+    c3.metric("Reabiertas", res["reabiertas"]); c4.metric("Abiertas anteriores", len(res["abiertas_anteriores"]))
+    c5.metric("Abiertas en total", res["abiertas"])
+    st.caption(f"Corrida n.º {res['corrida']} · {res['claves_tocadas']:,} claves tocadas de {res['claves_indice']:,} en el índice "
+               f"· {res['conciliadas_nuevas']:,} conciliadas nuevas · {res['segundos']:.2f} s")
+    sin_clave = {k: n for k, n in res["sin_clave"].items() if n}
+    if sin_clave: st.caption("⚠️ Filas sin clave (quedan fuera del índice): " + " · ".join(f"{k}: {n:,}" for k, n in sin_clave.items()))
+
+    with etapa("armado de reportes"): sheets = incremental_sheets(res)
+    download_tables("⬇️ Descargar hallazgos", sheets, "conciliacion_incremental", key="conc_inc_dl", run=run)
+    with st.expander("Ver tablas", expanded=False):
+        st.write("🟩 Resueltas en esta corrida"); st.dataframe(res["resueltas"].head(1000))
+        st.write("🟧 Abiertas nuevas"); st.dataframe(res["abiertas_nuevas"].head(1000))
+        st.write("🟥 Abiertas de corridas anteriores"); st.dataframe(res["abiertas_anteriores"].head(1000))
+        st.write("🕘 Historial de corridas"); st.dataframe(res["historial"])
+    download_docx("Conciliación incremental A vs. B – Reporte de Auditoría",
+                  lambda: incremental_sections(res, file_A.name, file_B.name), "reporte_conciliacion_incremental.docx", run)
+
+# ============================ MÓDULO 4: Benford ============================
 def ui_benford():
     st.markdown("""
 <div class="section-card">
@@ -420,18 +649,14 @@ def ui_benford():
 </div></div>
 """, unsafe_allow_html=True)
 
-    file_ben = st.file_uploader("📁 Subir archivo (CSV/XLSX/XLS/TXT)", type=["csv","xlsx","xls","txt"], key="benford")
+    file_ben = subir("📁 Subir archivo(s) (CSV/XLSX/XLS/TXT)", key="benford")
     if not file_ben: return
 
-    dfb = load_any(file_ben, widget_key="sheet_benford"); dfb = normalize_headers(dfb)
-    st.success(f"✅ Archivo cargado. Filas: {len(dfb)}")
+    dfb = cargar(file_ben, widget_key="sheet_benford")
+    st.success(f"✅ Archivo cargado. {filas_txt(file_ben, dfb)}")
     with st.expander("Vista previa", expanded=False): st.dataframe(dfb.head())
 
-    def is_amount_candidate(s: pd.Series) -> bool:
-        if pd.api.types.is_numeric_dtype(s): return True
-        if s.dtype == object: return coerce_amount(s).notna().mean() >= 0.30
-        return False
-    candidatas = [c for c in dfb.columns if is_amount_candidate(dfb[c])]
+    with etapa("detección de columnas de monto", len(dfb)): candidatas = [c for c in dfb.columns if es_columna_monto(dfb[c])]
     if not candidatas: st.error("No hay columnas de monto válidas."); return
 
     sug = col_auto(dfb[candidatas], SINONIMOS_MONTO) or candidatas[0]
@@ -439,106 +664,164 @@ def ui_benford():
     min_val = st.number_input("🔻 Ignorar montos menores a", min_value=0.0, value=0.0)
     min_count = st.number_input("🔔 Mínimo sugerido de observaciones", min_value=0, value=100)
     desvio_min = st.number_input("🎚 Umbral de desviación por dígito (pp)", min_value=0.0, value=2.0, step=0.5)
-
-    if not st.button("🔍 Ejecutar Benford"): return
-
-    serie_orig = dfb[col_m]
-    if serie_orig.dtype == object:
-        conv = coerce_amount(serie_orig)
-        if conv.notna().mean() < 0.30: st.error("La columna elegida no se convierte a número (≥30%)."); return
-        serie_num = conv
-    else:
-        serie_num = pd.to_numeric(serie_orig, errors="coerce")
-
-    serie_num = serie_num.dropna()
-    if min_val>0: serie_num = serie_num[serie_num.abs() >= min_val]
-
-    n_total = len(serie_num)
-    fd = first_digit_series(serie_num)     # Series, no ndarray
-    n = len(fd)
+    col_seg = st.selectbox("🧩 Segmentar por (opcional)", ["(ninguna)"] + [c for c in dfb.columns if c != col_m], index=0)
+    periodo = st.selectbox("🗓 Segmentar por periodo", ["(ninguno)", *PERIODOS], index=0,
+                           format_func=lambda p: PERIODOS.get(p, p))
+    col_fecha = None
+    if periodo != "(ninguno)":
+        fecha_sug = col_auto(dfb, SINONIMOS_FECHA)
+        col_fecha = st.selectbox("📅 Columna de fecha", dfb.columns.tolist(),
+                                 index=dfb.columns.get_loc(fecha_sug) if fecha_sug in dfb.columns else 0)
+    segmento = dict(col_grupo=None if col_seg == "(ninguna)" else col_seg, col_fecha=col_fecha,
+                    periodo=None if periodo == "(ninguno)" else periodo)
+    usadas = [c for c in (col_m, segmento["col_grupo"], col_fecha) if c is not None]
+    extra = columnas_extra(file_ben, dfb, usadas, key="benford_extra")
+
+    run = run_key("benford", input_id(file_ben, "sheet_benford"), col_m=col_m, min_val=min_val, desvio_min=desvio_min,
+                  min_n=int(min_count), extra=extra, **segmento)
+    if st.button("🔍 Ejecutar Benford"):
+        dfb = leer_columnas(file_ben, dfb, list(dict.fromkeys([*usadas, *extra])), "sheet_benford")
+        try:
+            with etapa("Benford", len(dfb)):
+                results().put(run, trazar(analizar_benford(dfb, col_m, min_val=min_val, desvio_min=desvio_min, min_n=int(min_count), **segmento), dfb))
+        except ValueError as e: st.error(str(e)); return
+    r = results().get(run)
+    if r is None: return
+    bat, n = r["bat"], r["n"]
     if n==0: st.error("No hay datos suficientes tras filtros."); return
 
-    obs_counts = fd.value_counts().reindex(range(1,10), fill_value=0).sort_index()
-    obs_prop   = obs_counts / n
-    exp_prop   = benford_expected()
-    exp_counts = exp_prop * n
-    chi2 = (((obs_counts - exp_counts) ** 2) / exp_counts.replace(0, np.nan)).sum()
-    chi2_crit = 15.507
-    cumple = chi2 <= chi2_crit
+    tabla, chi2 = bat["primer"]["tabla"], bat["primer"]["chi2"]
+    cumple = bat["primer"]["cumple"]
+    obs_prop = tabla["Frecuencia Observada"].to_numpy() / n
+    exp_prop = benford_expected().to_numpy()
 
     st.subheader("📊 Resumen Benford")
     c1,c2,c3 = st.columns(3)
     c1.metric("Observaciones válidas", n); c2.metric("Chi-cuadrado", f"{chi2:,.3f}"); c3.metric("¿Cumple (α=0.05)?", "Sí ✅" if cumple else "No ⚠️")
     if n < min_count: st.info(f"ℹ️ Nota: {n} obs.; sugerido ≥ {min_count}.")
 
-    tabla = pd.DataFrame({
-        "Dígito": list(range(1,10)),
-        "Frecuencia Observada": obs_counts.values,
-        "Proporción Observada (%)": (obs_prop.values*100).round(2),
-        "Proporción Esperada (%)": (exp_prop.values*100).round(2),
-        "Desviación (pp)": ((obs_prop-exp_prop).values*100).round(2)
-    })
     st.dataframe(tabla)
 
     fig, ax = plt.subplots()
     idx = np.arange(1,10)
-    ax.bar(idx-0.15, obs_prop.values, width=0.3, label="Observado")
-    ax.bar(idx+0.15, exp_prop.values, width=0.3, label="Esperado (Benford)")
+    ax.bar(idx-0.15, obs_prop, width=0.3, label="Observado")
+    ax.bar(idx+0.15, exp_prop, width=0.3, label="Esperado (Benford)")
     ax.set_xticks(idx); ax.set_xlabel("Primer dígito"); ax.set_ylabel("Proporción"); ax.set_title("Benford: Observado vs Esperado"); ax.legend()
-    st.pyplot(fig)
-
-    sospechosos_dig = tabla.loc[tabla["Desviación (pp)"] >= desvio_min, "Dígito"].tolist()
+    st.pyplot(fig); plt.close(fig)
+
+    st.subheader("🧮 Batería forense (segundo, primeros dos, últimos dos dígitos y sumatoria)")
+    st.dataframe(bat["resumen"])
+    t2, t12, tsum, tu2 = st.tabs(["Segundo dígito", "Primeros dos dígitos", "Sumatoria", "Últimos dos dígitos"])
+    with t2: st.dataframe(bat["segundo"]["tabla"])
+    with t12:
+        t = bat["primeros_dos"]["tabla"]
+        fig2, ax2 = plt.subplots(figsize=(9, 3.2))
+        ax2.bar(t["Primeros dos dígitos"], t["Proporción Observada (%)"], width=0.8, label="Observado")
+        ax2.plot(t["Primeros dos dígitos"], t["Proporción Esperada (%)"], color="#c2410c", label="Esperado (Benford)")
+        ax2.set_xlabel("Primeros dos dígitos"); ax2.set_ylabel("%"); ax2.legend()
+        st.pyplot(fig2); plt.close(fig2); st.dataframe(t)
+    with tsum: st.dataframe(bat["sumatoria"])
+    with tu2: st.dataframe(bat["ultimos_dos"]["tabla"])
+
+    seg = r["segmentos"]
+    if seg is not None:
+        st.subheader("🧩 Ranking de segmentos por desviación (MAD del primer dígito)")
+        st.caption(f"{len(seg):,} segmentos · {int(seg['Suficiente'].sum()):,} con ≥ {r['min_n']} observaciones "
+                   "(los de menos van al final: su MAD es poco confiable).")
+        st.dataframe(seg.head(1000))
+
+    sospechosos_dig, sospe_rows = r["sospechosos_dig"], r["sospechosas"]
     st.write(f"**Dígitos marcados (≥ {desvio_min:.1f} pp):** {sospechosos_dig if sospechosos_dig else 'Ninguno'}")
 
-    fd_full = first_digit_series(serie_num)
-    sospe_idx = fd_full[fd_full.isin(sospechosos_dig)].index
-    sospe_rows = dfb.loc[sospe_idx].copy()
-    sospe_rows["_monto_convertido_"] = serie_num.loc[sospe_idx]
-    sospe_rows["_1er_dig"] = fd_full.loc[sospe_idx]
-
     with st.expander("Ver sospechosas", expanded=False):
         if len(sospe_rows):
             st.dataframe(sospe_rows.head(1000))
-            st.download_button("⬇️ Descargar sospechosas (XLSX)",
-                               to_xlsx_bytes(sospe_rows, "Sospechosas_Benford"),
-                               "benford_sospechosas.xlsx",
-                               "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            download_tables("⬇️ Descargar sospechosas", {"Sospechosas_Benford": sospe_rows}, "benford_sospechosas",
+                            key="benford_sospe_dl", run=run)
         else:
             st.info("No hay transacciones sospechosas con el umbral dado.")
 
-    st.download_button("⬇️ Descargar resumen (XLSX)",
-                       to_xlsx_bytes(tabla, "Resumen_Benford"),
-                       "benford_resumen.xlsx",
-                       "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-
-    recomendaciones = [
-        "Verificar que el conjunto sea adecuado (no pre-condicionado; suficiente volumen; diversidad).",
-        "Para dígitos con mayor desviación, revisar muestra dirigida (comprobantes, aprobaciones).",
-        "Analizar por segmentos (proveedor/cliente/centro/periodo) para localizar focos.",
-        "Revisar reglas de redondeo, precios fijos, topes/mínimos que expliquen patrones.",
-        "Si persisten desviaciones materiales sin causa, elevar como indicio y aplicar pruebas forenses."
-    ]
-    resumen = [
-        f"Archivo: {file_ben.name}",
-        f"Observaciones válidas: {n} (de {n_total} tras filtros)",
-        f"Chi²: {chi2:,.3f} – {'Cumple' if cumple else 'No cumple'} (α=0.05, gl=8)",
-        f"Dígitos con mayor desviación: {', '.join(map(str,sospechosos_dig)) if sospechosos_dig else 'Ninguno'}",
-        f"Umbral de desviación: {desvio_min:.1f} pp | Ignorar menores a: {min_val:,.2f}"
-    ]
-    sections = [("RESUMEN", [f"• {x}" for x in resumen]),
-                ("DESVIACIONES POR DÍGITO", [f"• {r.Dígito}: Obs {r['Proporción Observada (%)']}% vs Exp {r['Proporción Esperada (%)']}% (Δ {r['Desviación (pp)']} pp)" for _,r in tabla.iterrows()]),
-                ("RECOMENDACIONES", [f"• {x}" for x in recomendaciones]),
-                ("REFERENCIA XLSX", ["• 'benford_resumen.xlsx' (tabla) y 'benford_sospechosas.xlsx' (transacciones marcadas)."])]
-    st.download_button("⬇️ Descargar reporte (DOCX)",
-                       docx_from_sections("Ley de Benford – Reporte de Auditoría", sections),
-                       "reporte_benford.docx",
-                       "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+    with etapa("armado de reportes"): sheets = benford_sheets(r)
+    download_tables("⬇️ Descargar resumen", sheets, "benford_resumen", key="benford_resumen_dl", run=run)
+    download_docx("Ley de Benford – Reporte de Auditoría", lambda: benford_sections(r, file_ben.name), "reporte_benford.docx", run)
+
+# ============================ MÓDULO 5: Correlatividad ============================
+def ui_secuencias():
+    st.markdown("""
+<div class="section-card">
+  <div class="section-title">5️⃣ Correlatividad de la Numeración</div>
+  <div class="section-desc">
+    Separa <strong>serie</strong> y <strong>correlativo</strong> de cada comprobante y verifica por serie que la numeración
+    no tenga <strong>faltantes</strong>, <strong>números repetidos</strong> ni <strong>fechas fuera de orden</strong>.
+    Reemplaza la revisión manual en Excel.
+  </div>
+</div>
+""", unsafe_allow_html=True)
+
+    with st.expander("🧭 ¿Qué puede descubrir esta prueba?", expanded=True):
+        st.markdown("""
+- **Comprobantes faltantes** (anulados sin respaldo, ventas no registradas), informados como **rangos**.  
+- **Números repetidos** dentro de una misma serie (reemisión, doble registro).  
+- **Fechas que retroceden** entre números consecutivos (emisión retroactiva, cambios manuales).  
+
+**Entregables:**  
+- **XLSX**: Resumen, detalle por serie, rangos faltantes, repetidos, fechas invertidas e IDs no interpretables.  
+- **DOCX**: Resumen, series con más faltantes y **recomendaciones**.
+""")
+
+    file_sec = subir("📁 Subir archivo(s) (CSV/XLSX/XLS/TXT)", key="secuencias")
+    if not file_sec: return
+
+    dfs = cargar(file_sec, widget_key="sheet_sec")
+    st.success(f"✅ Archivo cargado. {filas_txt(file_sec, dfs)}")
+    with st.expander("Vista previa (primeras filas)", expanded=False): st.dataframe(dfs.head())
+
+    cols = dfs.columns.tolist()
+    id_sug, fecha_sug = col_auto(dfs, SINONIMOS_ID), col_auto(dfs, SINONIMOS_FECHA)
+    col_id = st.selectbox("🔢 Número del comprobante (serie + correlativo o clave de acceso)", cols,
+                          index=cols.index(id_sug) if id_sug in cols else 0, key="sec_id")
+    serie_sug = col_exacta(dfs.drop(columns=col_id), SINONIMOS_EMISOR)
+    col_serie = st.selectbox("🏷️ Serie en otra columna (opcional, p. ej. RUC del emisor)", ["(ninguna)"] + cols,
+                             index=(["(ninguna)"] + cols).index(serie_sug) if serie_sug in cols else 0, key="sec_serie")
+    col_fecha = st.selectbox("📅 Columna de fecha (opcional)", ["(ninguna)"] + cols,
+                             index=(["(ninguna)"] + cols).index(fecha_sug) if fecha_sug in cols else 0, key="sec_fecha")
+    params = dict(col_id=col_id, col_serie=None if col_serie == "(ninguna)" else col_serie,
+                  col_fecha=None if col_fecha == "(ninguna)" else col_fecha)
+    extra = columnas_extra(file_sec, dfs, (col_id, col_serie, col_fecha), key="sec_extra")
+
+    run = run_key("secuencias", input_id(file_sec, "sheet_sec"), extra=extra, **params)
+    if st.button("🔍 Analizar numeración"):
+        dfs = leer_columnas(file_sec, dfs, [col_id, params["col_serie"], params["col_fecha"], *extra], "sheet_sec")
+        with etapa("correlatividad", len(dfs)): results().put(run, trazar(analizar_secuencias(dfs, **params), dfs))
+    res = results().get(run)
+    if res is None: return
+
+    st.subheader("📊 Resultados")
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Series", len(res["por_serie"])); c2.metric("Números faltantes", f"{res['faltantes']:,}")
+    c3.metric("Repetidos", len(res["repetidos"])); c4.metric("Fechas invertidas", len(res["invertidas"]) if res["col_fecha"] else "—")
+    st.caption(f"{res['validos']:,} de {res['n']:,} comprobantes interpretados · faltantes en {len(res['huecos']):,} rangos"
+               + (f" · ⚠️ {len(res['no_interpretables']):,} sin correlativo numérico" if len(res["no_interpretables"]) else ""))
+    st.dataframe(res["por_serie"].head(1000), hide_index=True)
+
+    with etapa("armado de reportes"): sheets = secuencias_sheets(res)
+    download_tables("⬇️ Descargar hallazgos", sheets, "secuencias_facturas", key="sec_dl", run=run)
+    with st.expander("Ver tablas", expanded=False):
+        st.write("🟥 Rangos faltantes"); st.dataframe(res["huecos"].head(1000))
+        if not res["repetidos"].empty: st.write("🟧 Números repetidos"); st.dataframe(res["repetidos"].head(1000))
+        if not res["invertidas"].empty: st.write("🟨 Fechas invertidas"); st.dataframe(res["invertidas"].head(1000))
+
+    download_docx("Correlatividad de la Numeración – Reporte de Auditoría", lambda: secuencias_sections(res, file_sec.name),
+                  "reporte_secuencias.docx", run)
 
 # ============================ Navegación en pestañas ============================
-tabs = st.tabs(["💥 Montos inusuales", "🔁 Conciliación A vs. B", "📈 Ley de Benford"])
-with tabs[0]:
-    ui_montos_inusuales()
-with tabs[1]:
-    ui_conciliacion()
-with tabs[2]:
-    ui_benford()
+tabs = st.tabs(["🧾 Facturas duplicadas", "💥 Montos inusuales", "🔁 Conciliación A vs. B", "📈 Ley de Benford",
+               "🔢 Correlatividad"])
+for tab, (origen, ui) in zip(tabs, [("Duplicados", ui_duplicados), ("Montos inusuales", ui_montos_inusuales),
+                                   ("Conciliación", ui_conciliacion), ("Benford", ui_benford),
+                                   ("Correlatividad", ui_secuencias)]):
+    with tab:
+        with medicion(origen) as med: ui()
+        panel_rendimiento(med)
+ui_sidebar_cache()
+ui_sidebar_rendimiento()
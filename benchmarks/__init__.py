@@ -0,0 +1 @@
+"""Suite de rendimiento: datos sintéticos tipo FACTURAS y medición por etapa (``python -m benchmarks``)."""
@@ -0,0 +1,88 @@
+"""Generador de facturas sintéticas con la forma de FACTURAS.xlsx.
+
+Produce el mismo juego de columnas que el reporte de facturación (Número ``001-001-000028642``,
+R.U.C., Fecha, Subtotal/IVA/Total…) a cualquier escala, con controles para lo que cambia el
+costo de cada etapa: proporción de montos como texto local ``"1.234,56"``, de fechas como texto,
+de claves duplicadas, de atípicos y si los montos siguen o no la Ley de Benford.
+"""
+import numpy as np
+import pandas as pd
+
+IVA = 0.15
+ESTADOS = np.array(["Abierto/a", "Pagado"])
+EMPRESAS = np.array(["SFOGLIA S.A.S.", "ECUAFIBRA S.A.", "COLEMUN S.A.", "DISTRIBUIDORA ANDINA CIA. LTDA.",
+                     "COMERCIAL PACIFICO S.A.", "FARMACIAS DEL SUR S.A.", "IMPORTADORA QUITO S.A.", "AGRICOLA EL ROSAL"])
+
+def _monto_local(x: np.ndarray) -> np.ndarray:
+    """Formato local con punto de miles y coma decimal: 1234.5 → "1.234,50"."""
+    return pd.Series(x).map("{:,.2f}".format).str.translate(str.maketrans(",.", ".,")).to_numpy(object)
+
+def _mezclar(x: np.ndarray, texto: np.ndarray, frac: float, rng) -> np.ndarray:
+    """Columna ``object`` con una fracción ``frac`` de valores como texto (lo que deja un Excel mal tipado)."""
+    if frac <= 0: return x
+    out = x.astype(object)
+    idx = np.flatnonzero(rng.random(len(x)) < frac)
+    out[idx] = texto(x[idx]) if callable(texto) else texto[idx]
+    return out
+
+def montos(n: int, benford=True, outliers=0.001, rng=None) -> np.ndarray:
+    """Montos con dos decimales: log-uniformes entre 10 y 100.000 (cumplen Benford) o
+    uniformes entre 100 y 999 (dígito inicial plano, no cumplen). Los atípicos se multiplican ×50–×200."""
+    rng = rng or np.random.default_rng(0)
+    x = 10 ** rng.uniform(1, 5, n) if benford else rng.uniform(100, 1000, n)
+    atip = rng.random(n) < outliers
+    x[atip] *= rng.uniform(50, 200, int(atip.sum()))
+    return np.round(x, 2)
+
+def facturas(n: int, duplicados=0.01, outliers=0.001, benford=True, texto_monto=0.5, texto_fecha=0.3,
+             desde="2025-01-01", dias=365, seed=0) -> pd.DataFrame:
+    """``n`` facturas sintéticas. ``duplicados`` es la fracción de filas que repite un Número ya emitido;
+    ``texto_monto``/``texto_fecha`` la fracción de Total/Fecha guardada como texto local."""
+    rng = np.random.default_rng(seed)
+    serie = rng.choice(np.array(["001-001-", "001-002-", "001-500-"]), n, p=[0.7, 0.2, 0.1])
+    numero = pd.Series(serie) + pd.Series(rng.permutation(n) + 10_000).astype(str).str.zfill(9)
+    dup = np.flatnonzero(rng.random(n) < duplicados)
+    numero = numero.to_numpy(object)
+    if len(dup): numero[dup] = numero[rng.integers(0, n, len(dup))]
+
+    fecha = pd.Timestamp(desde) + pd.to_timedelta(np.sort(rng.integers(0, dias, n)), unit="D")
+    ruc = rng.integers(10**8, 10**9, max(1, n // 50))[rng.integers(0, max(1, n // 50), n)] * 1000 + 1
+    total = montos(n, benford, outliers, rng)
+    base = np.round(total / (1 + IVA), 2); iva = np.round(total - base, 2)
+    pagado = rng.random(n) < 0.1
+
+    return pd.DataFrame({
+        "Tipo": "Factura", "Año": fecha.year, "Mes": fecha.month, "Día": fecha.day,
+        "Número": numero,
+        "Fecha": _mezclar(fecha.to_numpy(), fecha.strftime("%d/%m/%Y").to_numpy(object), texto_fecha, rng),
+        "R.U.C.": ruc.astype(np.float64),
+        "Nombres": EMPRESAS[ruc % len(EMPRESAS)],
+        "Subtotal": base, "Descuento": 0.0, "Base IVA": base, "Base IVA 0": 0.0, "IVA": iva,
+        "Total": _mezclar(total, _monto_local, texto_monto, rng),
+        "Total Retenido": np.where(rng.random(n) < 0.3, np.round(base * 0.0175, 2), np.nan),
+        "Saldo": np.where(pagado, 0.0, total),
+        "Estado": ESTADOS[pagado.astype(int)],
+    })
+
+def valor_total(s: pd.Series) -> pd.Series:
+    """Valor exacto de una columna generada con ``_mezclar``: el texto siempre lleva coma decimal."""
+    num = pd.to_numeric(s, errors="coerce")
+    txt = num.isna() & s.notna()
+    num[txt] = pd.to_numeric(s[txt].astype(str).str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    return num.astype(np.float64)
+
+def contraparte(A: pd.DataFrame, faltantes=0.01, sobrantes=0.01, difieren=0.005, seed=1) -> pd.DataFrame:
+    """Registro contable de B para conciliar con ``A``: quita, agrega y altera montos en las proporciones dadas."""
+    rng = np.random.default_rng(seed)
+    n = len(A)
+    B = A.loc[rng.random(n) >= faltantes, ["Número", "Fecha", "R.U.C.", "Total"]].reset_index(drop=True)
+    B["Total"] = valor_total(B["Total"])
+    alt = rng.random(len(B)) < difieren
+    B.loc[alt, "Total"] = np.round(B.loc[alt, "Total"].to_numpy() * rng.uniform(0.9, 1.1, int(alt.sum())), 2)
+    extra = int(n * sobrantes)
+    if extra:
+        B = pd.concat([B, pd.DataFrame({"Número": [f"002-001-{i:09d}" for i in range(extra)],
+                                        "Fecha": A["Fecha"].iloc[rng.integers(0, n, extra)].to_numpy(),
+                                        "R.U.C.": A["R.U.C."].iloc[rng.integers(0, n, extra)].to_numpy(),
+                                        "Total": montos(extra, rng=rng)})], ignore_index=True)
+    return B
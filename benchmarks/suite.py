@@ -0,0 +1,175 @@
+"""Mide cada etapa del flujo CAAT por separado sobre facturas sintéticas y deja el resultado en JSON.
+
+Ejemplo::
+
+    python -m benchmarks -n 10000 100000 1000000 --salida bench.json
+    python -m benchmarks --comparar base.json bench.json --tolerancia 0.25
+
+Etapas: lectura CSV/XLSX (el camino de ``load_any`` sin caché), ``coerce_amount``, ``coerce_date``,
+detección de montos (global y por ID·mes con mediana/MAD), conciliación (merge), duplicados, correlatividad,
+``first_digit_series`` y la batería Benford, y los entregables XLSX/DOCX. Cada etapa se cronometra sin trazas (mejor de ``-r`` repeticiones, tiempo
+de pared y de CPU) y luego se repite una vez bajo ``tracemalloc`` para el pico de memoria.
+"""
+import argparse, gc, json, os, platform, subprocess, sys, tempfile, time, tracemalloc
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from caat.readers import read_table
+from caat.coerce import coerce_amount, coerce_date
+from caat.montos import detectar_montos, montos_sheets, montos_sections
+from caat.benford import first_digit_series, bateria_benford, analizar_benford, benford_sections
+from caat.conciliacion import conciliar, conciliacion_sheets
+from caat.duplicados import detectar_duplicados
+from caat.secuencias import analizar_secuencias
+from caat.export import write_xlsx, export_bytes, docx_from_sections, MAX_FILAS_XLSX
+from .sintetico import facturas, contraparte, valor_total
+
+MB = 1024 * 1024
+XLSX_MAX = 100_000       # sobre esto la lectura XLSX (openpyxl) domina la corrida; se omite
+
+def medir(fn, repeticiones=3, memoria=True) -> dict:
+    """Mejor tiempo de pared (y su CPU) de ``repeticiones`` corridas y pico de ``tracemalloc`` de una más."""
+    mejor, cpu, out = float("inf"), 0.0, None
+    for _ in range(max(1, repeticiones)):
+        out = None; gc.collect()
+        t0, c0 = time.perf_counter(), time.process_time()
+        out = fn()
+        t, c = time.perf_counter() - t0, time.process_time() - c0
+        if t < mejor: mejor, cpu = t, c
+    pico = None
+    if memoria:
+        out = None; gc.collect()
+        tracemalloc.start()
+        try: out = fn(); pico = tracemalloc.get_traced_memory()[1] / MB
+        finally: tracemalloc.stop()
+    return {"segundos": round(mejor, 4), "segundos_cpu": round(cpu, 4),
+            "pico_mb": None if pico is None else round(pico, 1), "salida": out}
+
+def _filas(x):
+    if isinstance(x, (pd.DataFrame, pd.Series, np.ndarray)): return len(x)
+    if isinstance(x, bytes): return None
+    if isinstance(x, dict):
+        for k in ("total_tx", "n"):
+            if k in x: return int(x[k])
+        if "conciliados" in x: return len(x["conciliados"])
+    return None
+
+def etapas(A, B, ruta_csv, ruta_xlsx, aproximado=False):
+    """Lista ``(nombre, filas de entrada, fn)``; las etapas que dependen de una anterior leen su salida de ``estado``."""
+    estado = {}
+    def guardar(clave, fn):
+        def run(): estado[clave] = fn(); return estado[clave]
+        return run
+    total = A["Total"]
+    out = [("load_any_csv", len(A), lambda: read_table(ruta_csv))]
+    if ruta_xlsx is not None: out.append(("load_any_xlsx", len(A), lambda: read_table(ruta_xlsx)))
+    out += [
+        ("coerce_amount", len(A), lambda: coerce_amount(total)),
+        ("coerce_date", len(A), lambda: coerce_date(A["Fecha"])),
+        ("detectar_montos", len(A), guardar("montos", lambda: detectar_montos(
+            A, "Total", metodo="estadistico", k=3, col_id="R.U.C.", col_fecha="Fecha"))),
+        ("detectar_montos_grupo", len(A), lambda: detectar_montos(
+            A, "Total", metodo="mediana_mad", k=3, col_id="R.U.C.", col_fecha="Fecha", por_id=True, periodo="M")),
+        ("conciliar", len(A) + len(B), guardar("conc", lambda: conciliar(
+            A, B, "Número", "Total", "Total", fecha_A="Fecha", fecha_B="Fecha", tolerancia=0.01,
+            aproximado={"ventana_dias": 5, "score_min": 0.8} if aproximado else None))),
+        ("detectar_duplicados", len(A), lambda: detectar_duplicados(A, "Número", "Total", "Fecha", "R.U.C.")),
+        ("analizar_secuencias", len(A), lambda: analizar_secuencias(A, "Número", col_fecha="Fecha")),
+        ("first_digit_series", len(A), lambda: first_digit_series(total)),
+        ("bateria_benford", len(A), guardar("benford", lambda: analizar_benford(A, "Total"))),
+        ("export_xlsx", len(A), lambda: export_bytes({"Facturas": A.iloc[:MAX_FILAS_XLSX],
+                                                      **montos_sheets(estado["montos"]),
+                                                      **conciliacion_sheets(estado["conc"])}, "xlsx")),
+        ("export_docx", len(A), lambda: docx_from_sections("Benchmark", montos_sections(estado["montos"], "sintetico") +
+                                                            benford_sections(estado["benford"], "sintetico"))),
+    ]
+    return out
+
+def correr(n, repeticiones=3, memoria=True, aproximado=False, carpeta=None, **gen) -> list:
+    """Genera ``n`` facturas (y su contraparte), las escribe a CSV/XLSX y mide cada etapa."""
+    A = facturas(n, **gen); B = contraparte(A, seed=gen.get("seed", 0) + 1)
+    # ";" como el reporte exportado; la mezcla de formatos de Total llega tal cual al CSV.
+    ruta_csv = Path(carpeta) / f"facturas_{n}.csv"
+    A.to_csv(ruta_csv, sep=";", index=False)
+    ruta_xlsx = None
+    if n <= XLSX_MAX:
+        ruta_xlsx = Path(carpeta) / f"facturas_{n}.xlsx"; write_xlsx({"Sheet1": A}, ruta_xlsx)
+    filas = []
+    for nombre, entrada, fn in etapas(A, B, ruta_csv, ruta_xlsx, aproximado):
+        m = medir(fn, repeticiones, memoria)
+        salida = m.pop("salida")
+        filas.append({"n": n, "etapa": nombre, "filas_entrada": entrada, "filas_salida": _filas(salida),
+                      "bytes_salida": len(salida) if isinstance(salida, bytes) else None, **m,
+                      "filas_por_segundo": round(entrada / m["segundos"]) if m["segundos"] else None})
+        print(f"  {n:>10,} {nombre:<22} {m['segundos']:>9.3f} s  cpu {m['segundos_cpu']:>8.3f} s"
+              + (f"  pico {m['pico_mb']:>9,.1f} MB" if m["pico_mb"] is not None else ""), file=sys.stderr)
+    chi2 = bateria_benford(valor_total(A["Total"]).to_numpy())["primer"]["chi2"]
+    filas.append({"n": n, "etapa": "_datos", "chi2_benford": round(chi2, 3),
+                  "claves_duplicadas": int(A["Número"].duplicated().sum()),
+                  "csv_mb": round(ruta_csv.stat().st_size / MB, 1)})
+    return filas
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+                              cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError): return None
+
+def entorno() -> dict:
+    versiones = {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__}
+    try:
+        import pyarrow; versiones["pyarrow"] = pyarrow.__version__
+    except ImportError: versiones["pyarrow"] = None
+    return {"fecha": datetime.now().isoformat(timespec="seconds"), "commit": _commit(),
+            "plataforma": platform.platform(), "cpus": os.cpu_count(), **versiones}
+
+def comparar(base: dict, nuevo: dict, tolerancia=0.25) -> int:
+    """Imprime la razón nuevo/base por (n, etapa); devuelve 1 si alguna etapa empeora más que ``tolerancia``."""
+    def indice(d): return {(r["n"], r["etapa"]): r for r in d["resultados"] if not r["etapa"].startswith("_")}
+    b, nv = indice(base), indice(nuevo)
+    peores = 0
+    print(f"{'n':>10} {'etapa':<22} {'base s':>9} {'nuevo s':>9} {'razón':>7} {'pico base':>10} {'pico nuevo':>10}")
+    for k in sorted(b.keys() & nv.keys()):
+        rb, rn = b[k], nv[k]
+        razon = rn["segundos"] / rb["segundos"] if rb["segundos"] else float("nan")
+        marca = " ▲" if razon > 1 + tolerancia else ""
+        peores += bool(marca)
+        print(f"{k[0]:>10,} {k[1]:<22} {rb['segundos']:>9.3f} {rn['segundos']:>9.3f} {razon:>7.2f} "
+              f"{rb.get('pico_mb') or 0:>10,.1f} {rn.get('pico_mb') or 0:>10,.1f}{marca}")
+    return 1 if peores else 0
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark por etapa del flujo CAAT.")
+    ap.add_argument("-n", "--filas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                    help="Tamaños a medir (10.000 – 10.000.000).")
+    ap.add_argument("-r", "--repeticiones", type=int, default=3)
+    ap.add_argument("--duplicados", type=float, default=0.01, help="Fracción de Números repetidos.")
+    ap.add_argument("--outliers", type=float, default=0.001, help="Fracción de montos atípicos.")
+    ap.add_argument("--no-benford", action="store_true", help="Montos uniformes que no cumplen Benford.")
+    ap.add_argument("--texto-monto", type=float, default=0.5, help="Fracción de Total como texto \"1.234,56\".")
+    ap.add_argument("--texto-fecha", type=float, default=0.3, help="Fracción de Fecha como texto dd/mm/aaaa.")
+    ap.add_argument("--aproximado", action="store_true", help="Incluye el emparejamiento aproximado en la conciliación.")
+    ap.add_argument("--sin-memoria", action="store_true", help="Omite la pasada con tracemalloc.")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("-o", "--salida", default="bench.json")
+    ap.add_argument("--comparar", nargs=2, metavar=("BASE", "NUEVO"), help="Compara dos JSON en vez de medir.")
+    ap.add_argument("--tolerancia", type=float, default=0.25, help="Empeoramiento tolerado al comparar (0.25 = 25%%).")
+    args = ap.parse_args(argv)
+
+    if args.comparar:
+        base, nuevo = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.comparar)
+        return comparar(base, nuevo, args.tolerancia)
+
+    params = {"duplicados": args.duplicados, "outliers": args.outliers, "benford": not args.no_benford,
+              "texto_monto": args.texto_monto, "texto_fecha": args.texto_fecha, "seed": args.seed}
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="caat_bench_") as carpeta:
+        for n in args.filas:
+            print(f"n = {n:,}", file=sys.stderr)
+            resultados += correr(n, args.repeticiones, not args.sin_memoria, args.aproximado, carpeta, **params)
+    doc = {"entorno": entorno(), "parametros": {**params, "repeticiones": args.repeticiones, "aproximado": args.aproximado},
+           "resultados": resultados}
+    Path(args.salida).write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"→ {args.salida}", file=sys.stderr)
+    return 0
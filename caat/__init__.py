@@ -0,0 +1 @@
+"""Motor CAAT: lógica de lectura, análisis y exportación independiente de la interfaz Streamlit."""
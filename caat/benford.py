@@ -0,0 +1,268 @@
+"""Ley de Benford: extracción vectorizada de dígitos y batería de pruebas forenses.
+
+Los dígitos se obtienen con log10 y aritmética entera sobre todo el arreglo (sin formatear
+cada valor como texto). Umbrales MAD según Nigrini (2012), *Forensic Analytics*.
+"""
+import numpy as np
+import pandas as pd
+from .coerce import as_amount, convertir_fechas
+from .perf import etapa
+
+# Valores críticos chi² para α = 0.05 por grados de libertad.
+CHI2_CRIT = {8: 15.507, 9: 16.919, 89: 112.022, 99: 123.225}
+# Límites MAD: (conformidad cercana, aceptable, marginal); por encima → no conformidad.
+MAD_LIMITES = {"primer": (0.006, 0.012, 0.015), "segundo": (0.008, 0.010, 0.012),
+               "primeros_dos": (0.0012, 0.0018, 0.0022)}
+
+_POW10 = 10.0 ** np.arange(-323, 309)   # tabla de potencias: más rápida que 10.0**e elemento a elemento
+_EPS = 1 + 1e-12                        # absorbe errores de representación (0.29·100 = 28.999…)
+
+def digitos(x) -> dict:
+    """Primer, segundo, primeros dos y últimos dos dígitos de cada valor.
+
+    Devuelve arreglos del mismo largo que ``x``; ``valido`` marca los valores finitos ≠ 0.
+    ``u2`` (últimos dos dígitos de la parte entera) vale -1 para montos < 100.
+    """
+    x = np.abs(np.asarray(x, dtype=float))
+    valido = np.isfinite(x) & (x > 0)
+    v = np.where(valido, x, 1.0)
+    e = np.floor(np.log10(v)).astype(np.int64)
+    escala = v * _POW10[np.clip(1 - e, -323, 308) + 323]
+    d12 = np.floor(escala * _EPS)
+    # log10 puede quedar una unidad corto/largo en las fronteras de potencia de 10.
+    d12 = np.where(d12 >= 100, np.floor(escala / 10 * _EPS), np.where(d12 < 10, np.floor(escala * 10 * _EPS), d12))
+    d12 = np.where(valido, d12, 0).astype(np.int16)
+    entero = valido & (x >= 100) & (x < 1e18)
+    u2 = np.where(entero, np.floor(np.where(entero, v, 0) * _EPS).astype(np.int64) % 100, -1).astype(np.int16)
+    return {"valido": valido, "d1": (d12 // 10).astype(np.int8), "d2": (d12 % 10).astype(np.int8),
+            "d12": d12, "u2": u2}
+
+def first_digit_series(series: pd.Series) -> pd.Series:
+    x = as_amount(series)
+    d = digitos(x.to_numpy(dtype=float, na_value=np.nan))
+    return pd.Series(d["d1"][d["valido"]].astype(int), index=x.index[d["valido"]])
+
+def benford_expected() -> pd.Series:
+    d = np.arange(1, 10); return pd.Series(np.log10(1 + 1/d), index=d)
+
+def esperado_segundo() -> pd.Series:
+    d1 = np.arange(1, 10)[:, None]; d2 = np.arange(10)[None, :]
+    return pd.Series(np.log10(1 + 1/(10*d1 + d2)).sum(axis=0), index=range(10))
+
+def esperado_primeros_dos() -> pd.Series:
+    d = np.arange(10, 100); return pd.Series(np.log10(1 + 1/d), index=d)
+
+def mad(obs_prop, exp_prop) -> float: return float(np.mean(np.abs(np.asarray(obs_prop) - np.asarray(exp_prop))))
+
+def conformidad(valor_mad: float, prueba: str) -> str:
+    cercana, aceptable, marginal = MAD_LIMITES[prueba]
+    if valor_mad <= cercana: return "Conformidad cercana"
+    if valor_mad <= aceptable: return "Conformidad aceptable"
+    if valor_mad <= marginal: return "Conformidad marginal"
+    return "No conformidad"
+
+def _tabla(codes, digitos_idx, esperado: pd.Series, etiqueta: str):
+    obs = np.bincount(codes, minlength=digitos_idx[-1] + 1)[digitos_idx[0]:digitos_idx[-1] + 1]
+    n = int(obs.sum())
+    obs_prop = obs / n if n else np.zeros(len(obs))
+    exp_prop = esperado.to_numpy()
+    exp_cnt = exp_prop * n
+    chi2 = float(np.sum((obs - exp_cnt) ** 2 / np.where(exp_cnt > 0, exp_cnt, np.nan))) if n else np.nan
+    tabla = pd.DataFrame({
+        etiqueta: list(digitos_idx),
+        "Frecuencia Observada": obs,
+        "Proporción Observada (%)": (obs_prop*100).round(2),
+        "Proporción Esperada (%)": (exp_prop*100).round(2),
+        "Desviación (pp)": ((obs_prop-exp_prop)*100).round(2),
+    })
+    return tabla, n, chi2, mad(obs_prop, exp_prop)
+
+def prueba_primer_digito(d):
+    return _tabla(d["d1"][d["valido"]], range(1, 10), benford_expected(), "Dígito")
+
+def prueba_segundo_digito(d):
+    return _tabla(d["d2"][d["valido"]], range(0, 10), esperado_segundo(), "Segundo dígito")
+
+def prueba_primeros_dos(d):
+    return _tabla(d["d12"][d["valido"]], range(10, 100), esperado_primeros_dos(), "Primeros dos dígitos")
+
+def prueba_ultimos_dos(d):
+    codes = d["u2"][d["u2"] >= 0]
+    return _tabla(codes, range(0, 100), pd.Series(np.full(100, 0.01), index=range(100)), "Últimos dos dígitos")
+
+def prueba_sumatoria(d, x) -> pd.DataFrame:
+    """Suma de montos por primeros dos dígitos: bajo Benford cada grupo aporta 1/90 del total."""
+    x = np.abs(np.asarray(x, dtype=float))
+    sumas = np.bincount(d["d12"][d["valido"]], weights=x[d["valido"]], minlength=100)[10:100]
+    total = sumas.sum()
+    prop = sumas / total if total else np.zeros(90)
+    return pd.DataFrame({
+        "Primeros dos dígitos": range(10, 100),
+        "Suma": sumas.round(2),
+        "Proporción de la suma (%)": (prop*100).round(3),
+        "Proporción Esperada (%)": round(100/90, 3),
+        "Desviación (pp)": ((prop - 1/90)*100).round(3),
+    })
+
+def bateria_benford(x) -> dict:
+    """Todas las pruebas sobre un arreglo de montos, con una sola extracción de dígitos."""
+    x = np.asarray(x, dtype=float)
+    d = digitos(x)
+    out, filas = {"digitos": d}, []
+    for clave, nombre, fn, gl, mad_key in [
+        ("primer", "Primer dígito", prueba_primer_digito, 8, "primer"),
+        ("segundo", "Segundo dígito", prueba_segundo_digito, 9, "segundo"),
+        ("primeros_dos", "Primeros dos dígitos", prueba_primeros_dos, 89, "primeros_dos"),
+        ("ultimos_dos", "Últimos dos dígitos", prueba_ultimos_dos, 99, None),
+    ]:
+        tabla, n, chi2, valor_mad = fn(d)
+        crit = CHI2_CRIT[gl]
+        out[clave] = {"tabla": tabla, "n": n, "chi2": chi2, "mad": valor_mad, "cumple": bool(chi2 <= crit)}
+        filas.append({"Prueba": nombre, "N": n, "Chi²": round(chi2, 3), "gl": gl, "Chi² crítico (α=0.05)": crit,
+                      "¿Cumple chi²?": "Sí" if chi2 <= crit else "No", "MAD": round(valor_mad, 5),
+                      "Conformidad (MAD)": conformidad(valor_mad, mad_key) if mad_key else "n/a (uniforme)"})
+    out["sumatoria"] = prueba_sumatoria(d, x)
+    out["resumen"] = pd.DataFrame(filas)
+    return out
+
+# ------------------- Benford por segmentos -------------------
+PERIODOS = {"M": "Mes", "Q": "Trimestre"}
+MIN_N_SEGMENTO = 100
+
+def _conformidad_vec(valor_mad: np.ndarray, prueba: str) -> np.ndarray:
+    cercana, aceptable, marginal = MAD_LIMITES[prueba]
+    return np.select([valor_mad <= cercana, valor_mad <= aceptable, valor_mad <= marginal],
+                     ["Conformidad cercana", "Conformidad aceptable", "Conformidad marginal"], "No conformidad")
+
+def _conteos(seg, codes, n_seg, ancho) -> np.ndarray:
+    """Matriz segmentos × dígitos con un solo ``bincount`` sobre el código combinado."""
+    return np.bincount(seg.astype(np.int64) * ancho + codes, minlength=n_seg * ancho).reshape(n_seg, ancho)
+
+def _chi2_mad(obs: np.ndarray, esperado: np.ndarray):
+    n = obs.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        esp = n[:, None] * esperado[None, :]
+        chi2 = np.where(n > 0, ((obs - esp) ** 2 / esp).sum(axis=1), np.nan)
+        prop = obs / n[:, None]
+    return n, chi2, np.abs(prop - esperado[None, :]).mean(axis=1), prop - esperado[None, :]
+
+def segmentos_benford(x, dig, grupo=None, periodo=None, min_n=MIN_N_SEGMENTO) -> pd.DataFrame:
+    """Primer dígito (conteos, χ², MAD, conformidad) y MAD de los dos primeros por segmento.
+
+    ``grupo`` y ``periodo`` son series alineadas con ``x`` (el periodo, ``dt.to_period``); el segmento es su
+    combinación. Todos los segmentos salen de una pasada: un ``factorize`` de la combinación y un
+    ``bincount`` por prueba, sin recorrer los segmentos en Python. El ranking ordena por MAD del
+    primer dígito (no depende de N); los segmentos con menos de ``min_n`` observaciones van al final.
+    """
+    x = np.abs(np.asarray(x, dtype=float))
+    v = dig["valido"]
+    claves = {k: (c, vacio) for k, c, vacio in (("Segmento", grupo, "(vacío)"), ("Periodo", periodo, "(sin fecha)")) if c is not None}
+    if not claves: raise ValueError("Indique una columna de segmento y/o un periodo.")
+    codigos, etiquetas = [], {}
+    for k, (c, vacio) in claves.items():
+        # factorize sobre la serie tal cual (categórica/periodo usan sus códigos); solo los únicos pasan a texto
+        cod, uni = pd.factorize(c)
+        codigos.append(np.where(cod < 0, len(uni), cod).astype(np.int64)[v])
+        uni = pd.Index(uni)
+        if uni.dtype.kind == "f" and (uni == np.round(uni)).all(): uni = uni.astype(np.int64)   # RUC leído como número
+        etiquetas[k] = np.append(np.asarray(uni.astype(str), dtype=object), vacio)
+    comb = codigos[0] if len(codigos) == 1 else codigos[0] * len(etiquetas["Periodo"]) + codigos[1]
+    seg, uni = pd.factorize(comb)
+    n_seg = len(uni)
+    d1, d12 = dig["d1"][v].astype(np.int64) - 1, dig["d12"][v].astype(np.int64) - 10
+    obs1 = _conteos(seg, d1, n_seg, 9)
+    n, chi2, mad1, desv = _chi2_mad(obs1, benford_expected().to_numpy())
+    _, _, mad12, _ = _chi2_mad(_conteos(seg, d12, n_seg, 90), esperado_primeros_dos().to_numpy())
+    suma = np.bincount(seg, weights=x[v], minlength=n_seg)
+    peor = np.abs(desv).argmax(axis=1)
+    out = {}
+    if len(codigos) == 1: out[next(iter(claves))] = etiquetas[next(iter(claves))][uni]
+    else:
+        p = len(etiquetas["Periodo"])
+        out["Segmento"], out["Periodo"] = etiquetas["Segmento"][uni // p], etiquetas["Periodo"][uni % p]
+    out.update({"N": n, "Suma": suma.round(2), "Chi²": chi2.round(3), "¿Cumple chi²?": np.where(chi2 <= CHI2_CRIT[8], "Sí", "No"),
+                "MAD": mad1.round(5), "Conformidad (MAD)": _conformidad_vec(mad1, "primer"),
+                "MAD primeros dos": mad12.round(5), "Conformidad primeros dos": _conformidad_vec(mad12, "primeros_dos"),
+                "Dígito más desviado": peor + 1, "Desviación (pp)": (desv[np.arange(n_seg), peor] * 100).round(2),
+                "Suficiente": n >= min_n})
+    tabla = pd.DataFrame(out)
+    tabla = pd.concat([tabla, pd.DataFrame(obs1, columns=[f"Obs {d}" for d in range(1, 10)])], axis=1)
+    tabla = tabla.sort_values(["Suficiente", "MAD"], ascending=[False, False], kind="stable").reset_index(drop=True)
+    tabla.insert(0, "Rango", np.arange(1, len(tabla) + 1))
+    return tabla
+
+def analizar_benford(df, col_monto, min_val=0.0, desvio_min=2.0, col_grupo=None, col_fecha=None, periodo=None,
+                     min_n=MIN_N_SEGMENTO) -> dict:
+    """Batería completa sobre una columna de ``df`` y filas con primer dígito desviado ≥ ``desvio_min`` pp.
+
+    Con ``col_grupo`` y/o ``col_fecha`` + ``periodo`` (``"M"``/``"Q"``) agrega el ranking por segmento."""
+    s = df[col_monto]
+    with etapa("coerción de monto", len(s)): serie = as_amount(s)
+    if not pd.api.types.is_numeric_dtype(s) and serie.notna().mean() < 0.30:
+        raise ValueError("La columna elegida no se convierte a número (≥30%).")
+    keep = serie.notna().to_numpy()
+    if min_val > 0: keep &= (serie.abs() >= min_val).to_numpy()
+    filas = np.flatnonzero(keep)            # posiciones en ``df`` de los montos analizados
+    serie = serie.iloc[filas]
+    with etapa("batería de dígitos", len(serie)): bat = bateria_benford(serie.to_numpy(dtype=float))
+    segmentos = None
+    if col_grupo is not None or (col_fecha is not None and periodo):
+        with etapa("segmentos", len(serie)):
+            grupo = df[col_grupo].iloc[filas] if col_grupo is not None else None
+            per = None
+            if col_fecha is not None and periodo:
+                per = convertir_fechas(df[col_fecha].iloc[filas])["fechas"].dt.to_period(periodo)   # "2025-07", "2025Q3"
+            segmentos = segmentos_benford(serie.to_numpy(dtype=float), bat["digitos"], grupo, per, min_n)
+    tabla, dig = bat["primer"]["tabla"], bat["digitos"]
+    sospechosos = tabla.loc[tabla["Desviación (pp)"] >= desvio_min, "Dígito"].tolist()
+    marca = dig["valido"] & np.isin(dig["d1"], sospechosos)
+    sospe = df.loc[serie.index[marca]].copy(deep=False)
+    sospe["_monto_convertido_"] = serie.to_numpy()[marca]
+    sospe["_1er_dig"] = dig["d1"][marca].astype(int)
+    return {"bat": bat, "n": bat["primer"]["n"], "n_total": len(serie), "sospechosos_dig": sospechosos,
+            "sospechosas": sospe, "min_val": min_val, "desvio_min": desvio_min,
+            "segmentos": segmentos, "col_grupo": col_grupo, "periodo": periodo, "min_n": min_n}
+
+def benford_sheets(r: dict) -> dict:
+    bat = r["bat"]
+    return {"Resumen_Benford": bat["primer"]["tabla"], "Conformidad": bat["resumen"],
+            "Segundo_Digito": bat["segundo"]["tabla"], "Primeros_Dos_Digitos": bat["primeros_dos"]["tabla"],
+            "Sumatoria": bat["sumatoria"], "Ultimos_Dos_Digitos": bat["ultimos_dos"]["tabla"],
+            **({"Ranking_Segmentos": r["segmentos"]} if r.get("segmentos") is not None else {})}
+
+def benford_sections(r: dict, nombre: str) -> list:
+    bat, sospechosos = r["bat"], r["sospechosos_dig"]
+    chi2, cumple = bat["primer"]["chi2"], bat["primer"]["cumple"]
+    recomendaciones = [
+        "Verificar que el conjunto sea adecuado (no pre-condicionado; suficiente volumen; diversidad).",
+        "Para dígitos con mayor desviación, revisar muestra dirigida (comprobantes, aprobaciones).",
+        "Analizar por segmentos (proveedor/cliente/centro/periodo) para localizar focos.",
+        "Revisar reglas de redondeo, precios fijos, topes/mínimos que expliquen patrones.",
+        "Si persisten desviaciones materiales sin causa, elevar como indicio y aplicar pruebas forenses."
+    ]
+    resumen = [
+        f"Archivo: {nombre}",
+        f"Observaciones válidas: {r['n']} (de {r['n_total']} tras filtros)",
+        f"Chi²: {chi2:,.3f} – {'Cumple' if cumple else 'No cumple'} (α=0.05, gl=8)",
+        f"Dígitos con mayor desviación: {', '.join(map(str, sospechosos)) if sospechosos else 'Ninguno'}",
+        f"Umbral de desviación: {r['desvio_min']:.1f} pp | Ignorar menores a: {r['min_val']:,.2f}"
+    ]
+    secciones = [("RESUMEN", [f"• {x}" for x in resumen])]
+    seg = r.get("segmentos")
+    if seg is not None:
+        por = " y ".join(x for x in (r["col_grupo"], PERIODOS.get(r["periodo"])) if x)
+        suf = seg[seg["Suficiente"]]
+        no_conf = int((suf["Conformidad (MAD)"] == "No conformidad").sum())
+        lineas = [f"• Segmentos por {por}: {len(seg)} ({len(suf)} con ≥ {r['min_n']} obs.; {no_conf} en no conformidad)"]
+        etiqueta = lambda t: " · ".join(str(t[c]) for c in ("Segmento", "Periodo") if c in seg.columns)
+        lineas += [f"• {t['Rango']}. {etiqueta(t)}: N {t['N']} | MAD {t['MAD']:.5f} – {t['Conformidad (MAD)']} | "
+                   f"dígito {t['Dígito más desviado']} ({t['Desviación (pp)']:+.2f} pp)" for _, t in suf.head(10).iterrows()]
+        secciones.append(("SEGMENTOS CON MAYOR DESVIACIÓN", lineas))
+    return secciones + [
+            ("DESVIACIONES POR DÍGITO", [f"• {t.Dígito}: Obs {t['Proporción Observada (%)']}% vs Exp {t['Proporción Esperada (%)']}% (Δ {t['Desviación (pp)']} pp)"
+                                         for _, t in bat["primer"]["tabla"].iterrows()]),
+            ("BATERÍA FORENSE", [f"• {t['Prueba']}: χ² {t['Chi²']:,.3f} (crítico {t['Chi² crítico (α=0.05)']}) – "
+                                 f"{'Cumple' if t['¿Cumple chi²?'] == 'Sí' else 'No cumple'} | MAD {t['MAD']:.5f} – {t['Conformidad (MAD)']}"
+                                 for _, t in bat["resumen"].iterrows()]),
+            ("RECOMENDACIONES", [f"• {x}" for x in recomendaciones]),
+            ("REFERENCIA XLSX", ["• 'benford_resumen.xlsx' (Resumen_Benford, Conformidad, Segundo_Digito, Primeros_Dos_Digitos, Sumatoria, Ultimos_Dos_Digitos, Ranking_Segmentos si aplica) y 'benford_sospechosas.xlsx' (transacciones marcadas)."])]
@@ -0,0 +1,232 @@
+"""Cachés: lecturas parseadas y resultados de análisis.
+
+``ParseCache`` guarda DataFrames parseados indexados por hash de contenido + hoja + opciones.
+Mantiene un LRU en memoria acotado por bytes; lo que se desaloja se vuelca a disco
+(Parquet, o pickle si Arrow no puede representar la tabla) y se recupera desde ahí
+en lugar de volver a parsear el archivo original.
+
+``ResultCache`` guarda, por sesión, el resultado de cada corrida (entrada + parámetros) y los
+entregables que se van pidiendo, para que reruns y descargas no repitan el análisis.
+"""
+import hashlib, os, tempfile, threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+MB = 1024 * 1024
+DEFAULT_MEM_BYTES = int(os.environ.get("CAAT_CACHE_MB", "1024")) * MB
+DEFAULT_DISK_BYTES = int(os.environ.get("CAAT_CACHE_DISK_MB", "4096")) * MB
+DEFAULT_DIR = os.environ.get("CAAT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "caat_cache")
+DEFAULT_RESULT_RUNS = int(os.environ.get("CAAT_RESULTADOS_N", "8"))
+DEFAULT_RESULT_BYTES = int(os.environ.get("CAAT_RESULTADOS_MB", "512")) * MB
+
+def content_hash(data) -> str:
+    """Hash del contenido: acepta bytes o un objeto archivo (no altera su posición)."""
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        h.update(data); return h.hexdigest()
+    if hasattr(data, "getbuffer"):
+        with data.getbuffer() as view: h.update(view)
+        return h.hexdigest()
+    pos = data.tell(); data.seek(0)
+    for chunk in iter(lambda: data.read(8 * MB), b""): h.update(chunk)
+    data.seek(pos); return h.hexdigest()
+
+def cache_key(digest: str, sheet=None, **opts) -> str:
+    extra = ",".join(f"{k}={opts[k]!r}" for k in sorted(opts))
+    return f"{digest}|{'' if sheet is None else sheet}|{extra}"
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    try: return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception: return 0
+
+class ParseCache:
+    def __init__(self, max_bytes=DEFAULT_MEM_BYTES, spill_dir=DEFAULT_DIR, max_disk_bytes=DEFAULT_DISK_BYTES):
+        self.max_bytes, self.max_disk_bytes, self.spill_dir = max_bytes, max_disk_bytes, spill_dir
+        self._mem: OrderedDict[str, tuple[pd.DataFrame, int]] = OrderedDict()
+        self._disk: OrderedDict[str, tuple[str, int]] = OrderedDict()   # ruta base -> (archivo, bytes)
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = self.spills = 0
+        self.mem_bytes = self.disk_bytes = 0
+        self._scan_disk()
+
+    # ---------- API pública ----------
+    def get(self, key: str):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key); self.hits += 1
+                return self._mem[key][0].copy(deep=False)
+            entry = self._disk.pop(self._path(key), None)
+        if entry is not None:
+            df = self._read_spill(entry[0])
+            with self._lock: self.disk_bytes -= entry[1]
+            if df is not None:
+                with self._lock: self.disk_hits += 1
+                self.put(key, df)
+                return df.copy(deep=False)
+        with self._lock: self.misses += 1
+        return None
+
+    def put(self, key: str, df: pd.DataFrame):
+        nbytes = frame_nbytes(df)
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None: self.mem_bytes -= old[1]
+            if nbytes > self.max_bytes:
+                victims = [(key, df, nbytes)]
+            else:
+                self._mem[key] = (df, nbytes); self.mem_bytes += nbytes
+                victims = []
+                while self.mem_bytes > self.max_bytes and len(self._mem) > 1:
+                    k, (v, nb) = self._mem.popitem(last=False); self.mem_bytes -= nb
+                    victims.append((k, v, nb))
+        for k, v, nb in victims: self._spill(k, v)
+
+    def get_or_load(self, key: str, loader):
+        df = self.get(key)
+        if df is not None: return df
+        df = loader()
+        if isinstance(df, pd.DataFrame): self.put(key, df); return df.copy(deep=False)
+        return df
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "spills": self.spills, "hit_rate": ((self.hits + self.disk_hits) / total) if total else 0.0,
+                    "mem_entries": len(self._mem), "mem_bytes": self.mem_bytes,
+                    "disk_entries": len(self._disk), "disk_bytes": self.disk_bytes}
+
+    def clear(self):
+        with self._lock:
+            paths = [p for p, _ in self._disk.values()]
+            self._mem.clear(); self._disk.clear(); self.mem_bytes = self.disk_bytes = 0
+        for p in paths: self._remove(p)
+
+    # ---------- volcado a disco ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+
+    def _scan_disk(self):
+        # Reutiliza volcados de ejecuciones anteriores (el nombre de archivo deriva de la clave).
+        try: names = os.listdir(self.spill_dir)
+        except OSError: return
+        files = []
+        for nm in names:
+            p = os.path.join(self.spill_dir, nm)
+            if not os.path.isfile(p): continue
+            if nm.endswith(".parquet"): files.append((os.path.getmtime(p), p))
+            elif nm.endswith(".pkl"): self._remove(p)   # nunca se deserializa un pickle de otro proceso
+        for _, p in sorted(files):
+            nb = os.path.getsize(p); self._disk[os.path.splitext(p)[0]] = (p, nb); self.disk_bytes += nb
+        self._trim_disk()
+
+    def _spill(self, key: str, df: pd.DataFrame):
+        if self.max_disk_bytes <= 0: return
+        base = self._path(key)
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            try:
+                path = base + ".parquet"; df.to_parquet(path, index=True)
+            except Exception:
+                # Columnas mixtas (p. ej. int+str en Excel) no son representables en Arrow.
+                self._remove(base + ".parquet"); path = base + ".pkl"; df.to_pickle(path)
+        except Exception:
+            return
+        nb = os.path.getsize(path)
+        with self._lock:
+            old = self._disk.pop(base, None)
+            if old is not None: self.disk_bytes -= old[1]
+            self._disk[base] = (path, nb); self.disk_bytes += nb; self.spills += 1
+        self._trim_disk()
+
+    def _trim_disk(self):
+        doomed = []
+        with self._lock:
+            while self.disk_bytes > self.max_disk_bytes and self._disk:
+                _, (p, nb) = self._disk.popitem(last=False); self.disk_bytes -= nb; doomed.append(p)
+        for p in doomed: self._remove(p)
+
+    def _read_spill(self, path: str):
+        try:
+            return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
+        except Exception:
+            return None
+        finally:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try: os.remove(path)
+        except OSError: pass
+
+# ------------------- Resultados de análisis -------------------
+def result_nbytes(obj) -> int:
+    """Tamaño aproximado de un resultado: suma de tablas y arreglos, recorriendo dicts y listas."""
+    if isinstance(obj, pd.DataFrame): return frame_nbytes(obj)
+    if isinstance(obj, pd.Series): return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray): return obj.nbytes
+    if isinstance(obj, (bytes, bytearray)): return len(obj)
+    if isinstance(obj, dict): return sum(result_nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)): return sum(result_nbytes(v) for v in obj)
+    return 0
+
+class ResultCache:
+    """LRU de corridas acotado por cantidad y por bytes (resultado + entregables ya generados).
+
+    Los entregables se construyen recién cuando se piden (``deliverable``) y quedan con su corrida;
+    los callables de descarga de Streamlit corren en otro hilo, de ahí el candado.
+    """
+    def __init__(self, max_runs=DEFAULT_RESULT_RUNS, max_bytes=DEFAULT_RESULT_BYTES):
+        self.max_runs, self.max_bytes = max_runs, max_bytes
+        self._runs: OrderedDict[str, dict] = OrderedDict()   # clave -> {"res", "files", "nbytes"}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.builds = self.evictions = 0
+        self.nbytes = 0
+
+    def get(self, key: str):
+        with self._lock:
+            run = self._runs.get(key)
+            if run is None: self.misses += 1; return None
+            self._runs.move_to_end(key); self.hits += 1
+            return run["res"]
+
+    def put(self, key: str, res):
+        nbytes = result_nbytes(res)
+        with self._lock:
+            self._drop(key)
+            self._runs[key] = {"res": res, "files": {}, "nbytes": nbytes}; self.nbytes += nbytes
+            self._trim(keep=key)
+
+    def deliverable(self, key: str, name: str, build) -> bytes:
+        """Bytes de ``name`` para la corrida ``key``; se construyen una vez con ``build()``."""
+        with self._lock:
+            run = self._runs.get(key)
+            if run is not None and name in run["files"]: return run["files"][name]
+        data = build()
+        with self._lock:
+            self.builds += 1
+            run = self._runs.get(key)
+            if run is not None and name not in run["files"]:   # la corrida pudo desalojarse mientras tanto
+                run["files"][name] = data; run["nbytes"] += len(data); self.nbytes += len(data)
+                self._trim(keep=key)
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"runs": len(self._runs), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses,
+                    "builds": self.builds, "evictions": self.evictions,
+                    "files": sum(len(r["files"]) for r in self._runs.values())}
+
+    def clear(self):
+        with self._lock: self._runs.clear(); self.nbytes = 0
+
+    def _drop(self, key):
+        run = self._runs.pop(key, None)
+        if run is not None: self.nbytes -= run["nbytes"]
+
+    def _trim(self, keep):
+        # La corrida en uso nunca se desaloja, aunque sola supere el límite.
+        while (len(self._runs) > self.max_runs or self.nbytes > self.max_bytes) and len(self._runs) > 1:
+            victim = next(k for k in self._runs if k != keep)
+            self._drop(victim); self.evictions += 1
@@ -0,0 +1,121 @@
+"""Línea de comandos: corre las pruebas CAAT sobre muchos archivos en paralelo.
+
+Ejemplo::
+
+    python -m caat "cierre_2024_12/*.xlsx" --config caat.toml --salida resultados -p 8
+
+La configuración (TOML o JSON) lleva una sección por prueba a ejecutar; las columnas
+omitidas se detectan por sinónimos, igual que en la interfaz::
+
+    formato = "xlsx"            # xlsx | parquet | csv.gz
+    hoja = "Sheet1"             # opcional, para Excel
+
+    [duplicados]
+    col_proveedor = "R.U.C."    # opcional: exactos y cercanos dentro del mismo proveedor
+    dias = 7                    # mismo monto a ≤ dias días
+    ventana = 10                # filas vecinas comparadas en cada pasada
+
+    [montos]
+    metodo = "estadistico"      # fijo | estadistico | mediana_mad | iqr
+    k = 2
+    col_id = "R.U.C."
+    por_id = true               # opcional: umbral por ID y/o por periodo ("M" | "Q", con col_fecha)
+    ventana = 1                 # periodos de la ventana móvil
+
+    [benford]
+    desvio_min = 2.0
+    col_grupo = "R.U.C."        # opcional: ranking por segmento
+    col_fecha = "Fecha"         # opcional, con periodo = "M" | "Q"
+    periodo = "M"
+
+    [secuencias]
+    col_id = "Número"           # serie + correlativo (001-001-000028642) o clave de acceso de 49 dígitos
+    col_serie = "R.U.C."        # opcional: RUC del emisor o serie en otra columna (por defecto, una columna RUC/emisor)
+
+    [conciliacion]
+    archivo_b = "contabilidad/{stem}.xlsx"
+    clave = "Número"
+    tolerancia = 0.01
+
+Cada archivo deja sus entregables en ``<salida>/<nombre>/`` y el resumen de todos queda en
+``<salida>/resumen_consolidado.xlsx``.
+"""
+import argparse, glob, json, os, sys, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import pandas as pd
+from .engine import procesar_archivo
+from .export import write_xlsx, FORMATOS
+try:
+    import tomllib
+except ImportError:      # Python < 3.11: solo JSON
+    tomllib = None
+
+EXTENSIONES = (".csv", ".txt", ".xlsx", ".xls")
+
+def cargar_config(ruta) -> dict:
+    ruta = Path(ruta)
+    if ruta.suffix.lower() == ".toml" and tomllib is None: raise SystemExit("Configuración TOML requiere Python 3.11+; use JSON.")
+    with open(ruta, "rb") as f:
+        return tomllib.load(f) if ruta.suffix.lower() == ".toml" else json.load(f)
+
+def expandir_entradas(entradas) -> list:
+    """Archivos a procesar: rutas directas, carpetas (sin recursión) y patrones glob, sin repetir."""
+    vistos = {}
+    for e in entradas:
+        p = Path(e)
+        if p.is_dir(): rutas = sorted(x for x in p.iterdir() if x.is_file())
+        elif p.is_file(): rutas = [p]
+        else: rutas = sorted(Path(x) for x in glob.glob(e, recursive=True))
+        for r in rutas:
+            if r.suffix.lower() in EXTENSIONES and not r.name.startswith("~$"): vistos.setdefault(r.resolve(), r)
+    return list(vistos.values())
+
+def _destinos(archivos, salida: Path) -> list:
+    """Carpeta de salida por archivo; los nombres repetidos en distintas carpetas se desambiguan."""
+    usados, out = {}, []
+    for a in archivos:
+        n = usados[a.stem] = usados.get(a.stem, 0) + 1
+        out.append(salida / (a.stem if n == 1 else f"{a.stem}_{n}"))
+    return out
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m caat", description="Ejecuta las pruebas CAAT sobre uno o varios archivos.")
+    ap.add_argument("entradas", nargs="+", help="Archivos, carpetas o patrones glob (p. ej. 'cierre/*.xlsx').")
+    ap.add_argument("-c", "--config", required=True, help="Configuración TOML o JSON con una sección por prueba.")
+    ap.add_argument("-o", "--salida", default="resultados_caat", help="Carpeta de entregables (por defecto: resultados_caat).")
+    ap.add_argument("-p", "--procesos", type=int, default=os.cpu_count(), help="Procesos en paralelo (por defecto: todos los núcleos).")
+    args = ap.parse_args(argv)
+
+    config = cargar_config(args.config)
+    if config.get("formato", "xlsx") not in FORMATOS: raise SystemExit(f"Formato desconocido: {config['formato']}")
+    archivos = expandir_entradas(args.entradas)
+    if not archivos: print("No se encontraron archivos CSV/TXT/XLSX/XLS.", file=sys.stderr); return 2
+    salida = Path(args.salida); salida.mkdir(parents=True, exist_ok=True)
+    destinos = _destinos(archivos, salida)
+    procesos = max(1, min(args.procesos or 1, len(archivos)))
+
+    t0, filas = time.perf_counter(), []
+    def informar(i, archivo, resultado):
+        filas.extend(resultado)
+        estado = ", ".join(f"{r['Prueba']}={r['Estado']}" for r in resultado)
+        print(f"[{i}/{len(archivos)}] {archivo.name}: {estado}", file=sys.stderr)
+
+    if procesos == 1:
+        for i, (a, d) in enumerate(zip(archivos, destinos), start=1): informar(i, a, procesar_archivo(a, config, d))
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as ex:
+            futuros = {ex.submit(procesar_archivo, a, config, d): a for a, d in zip(archivos, destinos)}
+            for i, fut in enumerate(as_completed(futuros), start=1):
+                try: resultado = fut.result()
+                except Exception as e:   # p. ej. un proceso que murió por memoria
+                    resultado = [{"Archivo": str(futuros[fut]), "Prueba": "proceso", "Estado": "Error",
+                                  "Detalle": f"{type(e).__name__}: {e}"}]
+                informar(i, futuros[fut], resultado)
+
+    resumen = pd.DataFrame(filas).sort_values(["Archivo", "Prueba"], kind="stable")
+    write_xlsx({"Resumen": resumen}, salida / "resumen_consolidado.xlsx")
+    errores = int((resumen["Estado"] != "OK").sum())
+    print(f"{len(archivos)} archivos, {len(resumen)} pruebas, {errores} con error en {time.perf_counter() - t0:,.1f} s "
+          f"({procesos} procesos) → {salida / 'resumen_consolidado.xlsx'}", file=sys.stderr)
+    return 1 if errores else 0
@@ -0,0 +1,271 @@
+"""Conversión de columnas de monto y fecha.
+
+Montos: el formato de la columna (separador decimal y de miles, símbolo de moneda, negativos
+entre paréntesis o con signo al final) se infiere de una muestra de valores distintos y cada
+texto distinto se convierte una sola vez (``factorize`` → conversión vectorizada → se reparte
+a las filas). Un valor que trae su propia evidencia ("1.234,56", "1234.56", "1.234.567") se
+interpreta por sí mismo; solo los ambiguos ("1.234", "1,234") siguen el formato de la columna
+y, si la muestra no decide, se leen como miles. Los valores ya numéricos de una columna mixta
+(Excel con celdas número y texto) pasan sin convertirse a texto.
+
+Fechas: los formatos dominantes se infieren de una muestra y cada texto distinto se convierte
+con formato explícito (camino rápido de pandas); los números se leen como serial de Excel y
+solo lo que no encaja pasa por la inferencia general, elemento a elemento.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading, warnings
+import numpy as np
+import pandas as pd
+
+MUESTRA_FORMATO = 2000
+_ESPACIOS = " \u00a0"          # espacio y espacio duro como separador de miles
+_MONEDA = r"(?:US\$|USD|EUR|COP|PEN|MXN|R\$|S/\.?|Bs\.?|[$€£¥₡])"
+# Signo/paréntesis, moneda opcional, dígitos con separadores, moneda y signo finales.
+_PATRON_MONTO = (r"^\s*[-+(]?\s*(?:" + _MONEDA + r")?\s*[-+]?\s*\d(?:[\d.,'" + _ESPACIOS + r"]*\d)?"
+                 r"\s*(?:" + _MONEDA + r")?\s*[-)]?\s*$")
+_NEGATIVO = r"[-()]"        # en un texto válido, "-" y paréntesis solo pueden ser signo
+
+@dataclass(frozen=True)
+class FormatoMonto:
+    decimal: str = None       # "." | "," | None (la muestra no lo decide)
+    miles: str = None
+    moneda: bool = False
+    parentesis: bool = False
+    decisivos: int = 0        # valores de la muestra que fijaron el separador decimal
+
+    def __str__(self):
+        if self.decimal is None: return "separador decimal no determinado (ambiguos como miles)"
+        partes = [f"decimal '{self.decimal}'", f"miles '{self.miles}'"]
+        if self.moneda: partes.append("con símbolo de moneda")
+        if self.parentesis: partes.append("negativos entre paréntesis")
+        return ", ".join(partes)
+
+_formatos: OrderedDict = OrderedDict()
+_formatos_lock = threading.Lock()
+MAX_FORMATOS = 512
+
+def _clasificar(u: pd.Series) -> dict:
+    """Rasgos por texto (ya sin duplicados): validez, signo, dígitos con separadores y candidato a decimal."""
+    u = u.astype("str").str.strip()
+    valido = np.array(u.str.match(_PATRON_MONTO).fillna(False), dtype=bool)
+    num = u.str.replace(r"^\D+|\D+$", "", regex=True)
+    if num.str.contains("['" + _ESPACIOS + "]").any(): num = num.str.replace("['" + _ESPACIOS + "]", "", regex=True)
+    n_pto = num.str.count(r"\.").to_numpy(dtype=np.int64)
+    n_com = num.str.count(",").to_numpy(dtype=np.int64)
+    ult_pto = np.array(num.str.contains(r"\.\d*$"), dtype=bool)
+    # Decimal propio del valor: 'p' punto, 'c' coma, 'm' solo miles, '' entero y '?' ambiguo: un único
+    # separador con 1–3 dígitos delante (sin ser "0") y exactamente 3 detrás, como "1.234" o "12,500".
+    uno_pto, uno_com = (n_pto == 1) & (n_com == 0), (n_com == 1) & (n_pto == 0)
+    ambiguo = np.array(num.str.match(r"^[1-9]\d{0,2}[.,]\d{3}$"), dtype=bool)
+    dec = np.select([(n_pto > 0) & (n_com > 0) & ult_pto, (n_pto > 0) & (n_com > 0),
+                     ambiguo, uno_pto, uno_com, (n_pto > 1) ^ (n_com > 1)],
+                    ["p", "c", "?", "p", "c", "m"], "")
+    # Con ambos separadores, el decimal debe aparecer una sola vez y al final.
+    valido &= ~(((dec == "p") & (n_pto > 1)) | ((dec == "c") & (n_com > 1)))
+    return {"texto": u, "valido": valido, "num": num, "dec": dec, "ult_pto": ult_pto,
+            "negativo": np.array(u.str.contains(_NEGATIVO).fillna(False), dtype=bool)}
+
+def inferir_formato(textos) -> FormatoMonto:
+    """Formato de columna a partir de una muestra de textos (mayoría entre valores decisivos)."""
+    u = pd.Series(pd.unique(pd.Series(textos, dtype="str").dropna()), dtype="str").head(MUESTRA_FORMATO)
+    if u.empty: return FormatoMonto()
+    c = _clasificar(u)
+    dec = c["dec"][c["valido"]]
+    pto, com = int((dec == "p").sum()), int((dec == "c").sum())
+    t = c["texto"][c["valido"]]
+    moneda = bool(t.str.contains(_MONEDA).any())
+    parentesis = bool(t.str.contains(r"^\s*\(").any())
+    if pto == com == 0: return FormatoMonto(moneda=moneda, parentesis=parentesis)
+    decimal = "." if pto > com else ","
+    return FormatoMonto(decimal, "," if decimal == "." else ".", moneda, parentesis, max(pto, com))
+
+def formato_columna(series: pd.Series, textos=None) -> FormatoMonto:
+    """Formato inferido para ``series``, memorizado por nombre de columna + muestra."""
+    if textos is None: textos = pd.unique(series.dropna().astype("str").head(MUESTRA_FORMATO * 4))
+    muestra = tuple(str(x) for x in textos[:MUESTRA_FORMATO])
+    clave = (series.name, hash(muestra))
+    with _formatos_lock:
+        if clave in _formatos: _formatos.move_to_end(clave); return _formatos[clave]
+    fmt = inferir_formato(muestra)
+    with _formatos_lock:
+        _formatos[clave] = fmt
+        while len(_formatos) > MAX_FORMATOS: _formatos.popitem(last=False)
+    return fmt
+
+# Formas canónicas por separador decimal: miles bien agrupados (sin empezar en 0) o sin miles.
+_CANONICO = {",": r"^-?(?:[1-9]\d{0,2}(?:\.\d{3})+|\d+)(?:,\d+)?$",
+             ".": r"^-?(?:[1-9]\d{0,2}(?:,\d{3})+|\d+)(?:\.\d+)?$"}
+
+def _convertir(u: pd.Series, fmt: FormatoMonto) -> np.ndarray:
+    """Textos distintos → float64. Los que ya tienen la forma canónica del formato de la columna van por
+    el camino corto (dos reemplazos literales); el resto se clasifica valor por valor."""
+    out = np.full(len(u), np.nan)
+    resto = np.ones(len(u), dtype=bool)
+    if fmt.decimal is not None:
+        resto = ~np.array(u.str.match(_CANONICO[fmt.decimal]).fillna(False), dtype=bool)
+        rapido = u[~resto].str.replace(fmt.miles, "", regex=False)
+        if fmt.decimal == ",": rapido = rapido.str.replace(",", ".", regex=False)
+        out[~resto] = pd.to_numeric(rapido, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    if resto.any(): out[resto] = _convertir_general(u[resto], fmt)
+    return out
+
+def _convertir_general(u: pd.Series, fmt: FormatoMonto) -> np.ndarray:
+    """Según la evidencia propia de cada valor o, si es ambiguo, según ``fmt``."""
+    c = _clasificar(u)
+    dec, num = c["dec"].copy(), c["num"]
+    ambiguo = dec == "?"
+    if ambiguo.any():
+        propio = np.where(c["ult_pto"], ".", ",")
+        dec[ambiguo] = np.where(propio[ambiguo] == fmt.decimal, np.where(c["ult_pto"][ambiguo], "p", "c"), "m")
+    norm = num.copy()
+    for codigo, quitar, poner in (("p", ",", None), ("c", ".", ","), ("m", r"[.,]", None)):
+        m = dec == codigo
+        if not m.any(): continue
+        s = num[m].str.replace(quitar, "", regex=codigo == "m")
+        norm[m] = s.str.replace(poner, ".", regex=False) if poner else s
+    out = pd.to_numeric(norm, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    out[c["negativo"]] = -np.abs(out[c["negativo"]])
+    out[~c["valido"]] = np.nan
+    # Notación científica u otros números válidos en C ("1e5") que el patrón local no cubre.
+    resto = ~c["valido"]
+    if resto.any(): out[resto] = pd.to_numeric(c["texto"][resto], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return out
+
+
+def coerce_amount(series, formato: FormatoMonto = None) -> pd.Series:
+    """Monto numérico de una columna de texto o mixta; ``formato`` fija la interpretación de los ambiguos."""
+    s = series if isinstance(series, pd.Series) else pd.Series(series)
+    if pd.api.types.is_numeric_dtype(s): return pd.to_numeric(s, errors="coerce").astype(np.float64)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # Categórica (compact_frame): se convierten solo las categorías y se reparten por código.
+        vals = coerce_amount(pd.Series(s.cat.categories), formato).to_numpy()
+        codes = s.cat.codes.to_numpy()
+        return pd.Series(np.where(codes >= 0, vals[codes], np.nan), index=s.index, name=s.name)
+    out = np.full(len(s), np.nan)
+    arr = s.to_numpy(dtype=object, na_value=None) if s.dtype == object else None
+    if arr is not None:
+        # Columna mixta: números nativos directo, solo los textos pasan por el parser.
+        es_texto = np.frompyfunc(lambda x: isinstance(x, str), 1, 1)(arr).astype(bool)
+        otros = ~es_texto & pd.notna(arr)
+        if otros.any(): out[otros] = pd.to_numeric(pd.Series(arr[otros]), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        textos = pd.Series(arr[es_texto], dtype="str")
+        pos = np.flatnonzero(es_texto)
+    else:
+        textos, pos = s.astype("str"), np.arange(len(s))
+        textos = textos.where(s.notna().to_numpy())
+    codes, uniques = pd.factorize(textos)
+    if len(uniques):
+        u = pd.Series(uniques, dtype="str")
+        fmt = formato or formato_columna(s, u.to_numpy())
+        vals = _convertir(u, fmt)
+        ok = codes >= 0
+        out[pos[ok]] = vals[codes[ok]]
+    return pd.Series(out, index=s.index, name=s.name)
+
+# ------------------- Fechas -------------------
+# Candidatos en orden de preferencia (día primero); "ISO8601" cubre fecha, fecha-hora y "T".
+FORMATOS_FECHA = ["ISO8601", "%d/%m/%Y", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d-%m-%Y", "%d.%m.%Y",
+                  "%Y/%m/%d", "%d/%m/%y", "%d-%m-%y", "%Y%m%d", "%d-%b-%Y", "%m/%d/%Y"]
+MAX_FORMATOS_FECHA = 3
+EXCEL_ORIGEN = np.datetime64("1899-12-30", "ns")
+SERIAL_MIN, SERIAL_MAX = 10_000, 100_000        # seriales de Excel plausibles: 1927–2173
+
+def _serial_excel(x: np.ndarray) -> np.ndarray:
+    """Días desde 1899-12-30 (con fracción de día) → datetime64[ns]; fuera de rango, NaT."""
+    x = np.asarray(x, dtype=np.float64)
+    ok = (x >= SERIAL_MIN) & (x <= SERIAL_MAX)
+    out = np.full(len(x), np.datetime64("NaT"), dtype="datetime64[ns]")
+    out[ok] = EXCEL_ORIGEN + np.round(x[ok] * 86_400_000_000_000).astype("timedelta64[ns]")
+    return out
+
+def _a_ns(parsed) -> np.ndarray:
+    """datetime64[ns] sin zona; las horas con zona se llevan a UTC (se parsean con ``utc=True``)."""
+    s = pd.Series(parsed)
+    if isinstance(s.dtype, pd.DatetimeTZDtype): s = s.dt.tz_convert(None)
+    return s.to_numpy(dtype="datetime64[ns]")
+
+def inferir_formatos_fecha(textos, max_formatos=MAX_FORMATOS_FECHA) -> list:
+    """Formatos dominantes de una muestra: se eligen por cobertura hasta explicar toda la muestra."""
+    u = pd.Series(pd.unique(pd.Series(textos, dtype="str").dropna()), dtype="str").head(MUESTRA_FORMATO)
+    u = u[u.str.strip() != ""]
+    elegidos, pendiente = [], np.ones(len(u), dtype=bool)
+    while pendiente.any() and len(elegidos) < max_formatos:
+        resto = u[pendiente]
+        cubre = {f: pd.to_datetime(resto, format=f, errors="coerce", utc=True).notna().to_numpy() for f in FORMATOS_FECHA if f not in elegidos}
+        mejor = max(cubre, key=lambda f: cubre[f].sum(), default=None)
+        if mejor is None or not cubre[mejor].any(): break
+        elegidos.append(mejor)
+        idx = np.flatnonzero(pendiente); pendiente[idx[cubre[mejor]]] = False
+    return elegidos
+
+def convertir_fechas(series, formatos=None) -> dict:
+    """Fechas de una columna de texto, nativa, serial de Excel o mixta.
+
+    Cada texto distinto se convierte una sola vez: primero con los ``formatos`` (inferidos de una
+    muestra si no se indican), luego como serial de Excel y, solo para lo que quede, con la
+    inferencia general de pandas. Devuelve ``fechas``, ``formatos``, ``informadas`` (valores no
+    vacíos), ``no_convertibles`` (informadas que no son fecha) y su ``proporcion``.
+    """
+    s = series if isinstance(series, pd.Series) else pd.Series(series)
+    out = np.full(len(s), np.datetime64("NaT"), dtype="datetime64[ns]")
+    presentes = s.notna().to_numpy()
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # Categórica (compact_frame): se convierten solo las categorías y se reparten por código.
+        cats = pd.Series(s.cat.categories)
+        r = convertir_fechas(cats, formatos); formatos = r["formatos"]
+        codes, ok = s.cat.codes.to_numpy(), presentes
+        informada = (cats.astype("str").str.strip() != "").to_numpy()
+        out[ok] = r["fechas"].to_numpy()[codes[ok]]
+        presentes = presentes.copy(); presentes[ok] = informada[codes[ok]]
+        textos, pos = None, None
+    elif pd.api.types.is_datetime64_any_dtype(s): out = _a_ns(s); textos, pos = None, None
+    elif pd.api.types.is_numeric_dtype(s): out = _serial_excel(s.to_numpy(dtype=np.float64, na_value=np.nan)); textos, pos = None, None
+    elif s.dtype == object:
+        arr = s.to_numpy(dtype=object)
+        # clase de cada celda por tipo distinto (no por celda): 1 texto, 2 número, 3 fecha nativa u otro
+        cod, clases = pd.factorize(np.frompyfunc(type, 1, 1)(arr))
+        clase = np.array([1 if issubclass(t, str) else 2 if issubclass(t, (int, float, np.number)) and not issubclass(t, (bool, np.bool_))
+                          else 3 for t in clases] + [0], dtype=np.int8)
+        tipo = clase[cod]
+        tipo[~presentes] = 0
+        if (tipo == 2).any(): out[tipo == 2] = _serial_excel(arr[tipo == 2].astype(np.float64))
+        if (tipo == 3).any(): out[tipo == 3] = _a_ns(pd.to_datetime(pd.Series(arr[tipo == 3]), errors="coerce", utc=True))
+        pos = np.flatnonzero(tipo == 1); textos = arr[pos]
+    else:
+        textos, pos = s.astype("str").where(presentes), np.arange(len(s))
+    if textos is not None:
+        codes, uniques = pd.factorize(textos)
+        if len(uniques):
+            u = pd.Series(uniques, dtype="str").str.strip()
+            if formatos is None: formatos = inferir_formatos_fecha(u)
+            vals = np.full(len(u), np.datetime64("NaT"), dtype="datetime64[ns]")
+            pendiente = (u != "").to_numpy(copy=True)
+            for f in formatos:
+                if not pendiente.any(): break
+                idx = np.flatnonzero(pendiente)
+                vals[idx] = _a_ns(pd.to_datetime(u[pendiente], format=f, errors="coerce", utc=True))
+                pendiente[idx] = np.isnat(vals[idx])
+            if pendiente.any():
+                idx = np.flatnonzero(pendiente)
+                num = pd.to_numeric(u[pendiente], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                vals[idx] = _serial_excel(num)
+                idx = idx[np.isnat(vals[idx]) & np.isnan(num)]
+                if len(idx):    # resto heterogéneo: inferencia general, solo sobre estos textos
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore")
+                        vals[idx] = _a_ns(pd.to_datetime(u.iloc[idx], errors="coerce", dayfirst=True, format="mixed", utc=True))
+            ok = codes >= 0
+            out[pos[ok]] = vals[codes[ok]]
+            presentes = presentes.copy(); presentes[pos[~ok]] = False; presentes[pos[ok]] = (u.to_numpy() != "")[codes[ok]]
+    fechas = pd.Series(out, index=s.index, name=s.name)
+    n = int(presentes.sum()); malas = int((presentes & np.isnat(out)).sum())
+    return {"fechas": fechas, "formatos": list(formatos or []), "informadas": n, "no_convertibles": malas,
+            "proporcion": (malas / n) if n else 0.0}
+
+def coerce_date(series, formatos=None) -> pd.Series: return convertir_fechas(series, formatos)["fechas"]
+
+def as_amount(series, formato: FormatoMonto = None) -> pd.Series:
+    """Monto numérico (float64): convierte texto con formato local y deja pasar columnas ya numéricas."""
+    if pd.api.types.is_numeric_dtype(series): return pd.to_numeric(series, errors="coerce").astype(np.float64)
+    return coerce_amount(series, formato)
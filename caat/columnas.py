@@ -0,0 +1,38 @@
+"""Encabezados y detección automática de columnas (ID, monto, fecha) por sinónimos."""
+import pandas as pd
+from .coerce import coerce_amount
+
+SINONIMOS_ID = ["idfactura","id_factura","numero","número","numerofactura","numero_factura",
+    "serie","serie_comprobante","clave_acceso","idtransaccion","id_transaccion","referencia","doc","documento","id","idcliente","idproveedor"]
+SINONIMOS_MONTO = ["total","monto","importe","valor","monto_total","total_ingresado",
+    "importe_total","importe neto","subtotal+iva","total factura","totalfactura","amount","total_amount"]
+SINONIMOS_FECHA = ["fecha","fecha_emision","fecha emisión","f_emision","fecha documento",
+    "fecha_doc","fechadoc","fecha fact","fecha factura","emision","date","fecha_registro"]
+SINONIMOS_PROVEEDOR = ["ruc","r.u.c.","proveedor","idproveedor","id_proveedor","ruc_proveedor","nit_proveedor",
+    "beneficiario","razon_social","razón social","cliente","idcliente","nombres"]
+# Emisor del comprobante (la serie de numeración es propia de cada emisor): sin sinónimos de cliente.
+SINONIMOS_EMISOR = ["ruc_emisor","ruc emisor","emisor","ruc","r.u.c."]
+
+def normalize_headers(df): df.columns = [str(c).strip() for c in df.columns]; return df
+def col_auto(df, candidatos):
+    cols_norm = {c.lower().strip(): c for c in df.columns}
+    for alias in candidatos:
+        if alias in cols_norm: return cols_norm[alias]
+    for c in df.columns:
+        if any(alias in c.lower() for alias in candidatos): return c
+    return None
+
+def col_exacta(df, candidatos):
+    """Como ``col_auto`` pero sin la búsqueda por subcadena: solo encabezados iguales a un sinónimo."""
+    cols_norm = {c.lower().strip(): c for c in df.columns}
+    return next((cols_norm[a] for a in candidatos if a in cols_norm), None)
+
+def sugerir_monto(df):
+    return col_auto(df, SINONIMOS_MONTO) or (df.select_dtypes(include="number").columns.tolist()[:1] or [None])[0]
+
+def es_columna_monto(s: pd.Series, muestra=1000) -> bool:
+    """Numérica, o texto cuya muestra se convierte a monto en ≥30%."""
+    if pd.api.types.is_numeric_dtype(s): return True
+    if pd.api.types.is_datetime64_any_dtype(s): return False
+    m = s.dropna().head(muestra)
+    return bool(len(m)) and coerce_amount(m).notna().mean() >= 0.30
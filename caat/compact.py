@@ -0,0 +1,77 @@
+"""Compactación de tablas recién leídas: menos bytes por celda sin cambiar ningún valor.
+
+- Texto con pocos valores distintos (≤ ``MAX_RATIO_CATEGORIA`` de las filas) → ``category``.
+- El resto del texto (claves, números de documento) → cadenas Arrow si ``pyarrow`` está instalado.
+- Enteros → el entero más chico que los contiene; flotantes sin decimales y menores a 2²⁴ (año,
+  mes, agencia…) → float32, que los representa exactos. Los montos con decimales quedan en float64.
+
+Las columnas mixtas (número y texto, típico de un Excel mal tipado) no se tocan: el parser de
+montos aprovecha sus números nativos. El antes/después queda en ``df.attrs["compactacion"]``.
+"""
+import time
+import numpy as np
+import pandas as pd
+from .cache import frame_nbytes, MB
+from .readers import HAS_PYARROW
+from .perf import etapa
+
+MAX_RATIO_CATEGORIA = 0.5
+MUESTRA_CATEGORIA = 10_000      # si la muestra ya es casi toda distinta, no se cuenta la columna entera
+MAX_FLOAT32_EXACTO = 2 ** 24
+
+def _dtype_texto():
+    if not HAS_PYARROW: return None
+    try: return pd.StringDtype("pyarrow", na_value=np.nan)     # pandas ≥ 2.3: mismo NaN que object
+    except TypeError:
+        try: return pd.StringDtype("pyarrow_numpy")             # pandas 2.1–2.2
+        except (TypeError, ValueError): return None
+
+TEXTO_ARROW = _dtype_texto()
+
+def _es_texto(s: pd.Series) -> bool:
+    if isinstance(s.dtype, pd.StringDtype): return True
+    return s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) == "string"
+
+def _pocos_distintos(s: pd.Series) -> bool:
+    muestra = s.iloc[:MUESTRA_CATEGORIA]
+    if muestra.nunique() > MAX_RATIO_CATEGORIA * len(muestra): return False
+    return s.nunique() <= MAX_RATIO_CATEGORIA * len(s)
+
+def _compactar_columna(s: pd.Series):
+    """Serie compactada y el tipo de cambio aplicado (``None`` si queda igual)."""
+    kind = s.dtype.kind if isinstance(s.dtype, np.dtype) else None
+    if kind in ("i", "u"):
+        out = pd.to_numeric(s, downcast="unsigned" if kind == "u" or (len(s) and s.min() >= 0) else "integer")
+        return (out, "entero") if out.dtype.itemsize < s.dtype.itemsize else (s, None)
+    if kind == "f" and s.dtype.itemsize > 4:
+        v = s.to_numpy()
+        finito = v[~np.isnan(v)]
+        if len(finito) and (np.abs(finito) < MAX_FLOAT32_EXACTO).all() and (finito == np.round(finito)).all():
+            return s.astype(np.float32), "float32"
+        return s, None
+    if len(s) and _es_texto(s):
+        if _pocos_distintos(s): return s.astype("category"), "categoría"
+        if TEXTO_ARROW is not None and s.dtype != TEXTO_ARROW: return s.astype(TEXTO_ARROW), "texto Arrow"
+    return s, None
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Compacta ``df`` columna por columna (reemplaza cada columna; no duplica la tabla entera)."""
+    t0 = time.perf_counter()
+    antes = frame_nbytes(df)
+    cambios = {}
+    with etapa("compactación", len(df)):
+        for c in df.columns.unique():
+            if isinstance(df[c], pd.DataFrame): continue        # encabezado repetido: se deja como está
+            s, tipo = _compactar_columna(df[c])
+            if tipo is not None: df[c] = s; cambios[tipo] = cambios.get(tipo, 0) + 1
+    df.attrs["compactacion"] = {"antes_mb": round(antes / MB, 2), "despues_mb": round(frame_nbytes(df) / MB, 2),
+                                "cambios": cambios, "segundos": round(time.perf_counter() - t0, 3)}
+    return df
+
+def describe_compaction(df: pd.DataFrame) -> str:
+    info = df.attrs.get("compactacion")
+    if not info: return ""
+    antes, despues = info["antes_mb"], info["despues_mb"]
+    ahorro = f" (−{(1 - despues / antes) * 100:.0f}%)" if antes else ""
+    cambios = ", ".join(f"{n} {t}" for t, n in info["cambios"].items()) or "sin cambios"
+    return f"Memoria: {antes:,.2f} MB → **{despues:,.2f} MB**{ahorro} · {cambios} · {info['segundos']:.2f} s"
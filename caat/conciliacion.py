@@ -0,0 +1,199 @@
+"""Conciliación A vs. B con hash-join sobre columnas mínimas y manejo explícito de duplicados.
+
+Solo se unen clave, monto y fecha (códigos enteros de un único ``factorize`` + ``get_indexer``);
+las demás columnas se adjuntan al final y únicamente para las filas que quedan en Solo_en_A
+o Solo_en_B. Las claves repetidas no generan producto cartesiano: se informan en su propia
+hoja y se resuelven según la política elegida.
+"""
+import numpy as np
+import pandas as pd
+from .coerce import as_amount, convertir_fechas
+from .fuzzy import emparejar_aproximado
+from .perf import etapa
+
+POLITICAS = {
+    "emparejar": "Emparejar 1 a 1 (por orden de monto dentro de la clave)",
+    "agregar": "Agregar por clave (suma de montos, fecha mínima)",
+}
+
+def normalizar_clave(series: pd.Series) -> pd.Series:
+    return series.astype(str).str.strip().str.upper()
+
+def _lado(df, clave, monto, fecha) -> dict:
+    """Vista estrecha de un lado: clave normalizada, monto y fecha como arreglos."""
+    conv = convertir_fechas(df[fecha]) if fecha is not None else None
+    return {"clave": normalizar_clave(df[clave]).reset_index(drop=True),
+            "monto": as_amount(df[monto]).to_numpy(dtype=float, na_value=np.nan),
+            "fecha": conv["fechas"].to_numpy() if conv is not None else None,
+            "fecha_nc": (conv["no_convertibles"], conv["proporcion"]) if conv is not None else None}
+
+def _ocurrencias(codes, orden=None) -> np.ndarray:
+    """Número de ocurrencia de cada fila dentro de su código (según ``orden`` si se indica)."""
+    order = np.lexsort((orden, codes)) if orden is not None else np.argsort(codes, kind="stable")
+    c = codes[order]
+    inicio = np.r_[True, c[1:] != c[:-1]] if len(c) else np.zeros(0, dtype=bool)
+    pos = np.arange(len(c))
+    occ_sorted = pos - np.maximum.accumulate(np.where(inicio, pos, 0))
+    occ = np.empty(len(c), dtype=np.int64); occ[order] = occ_sorted
+    return occ
+
+def _join(comp_a, comp_b):
+    pos = pd.Index(comp_b).get_indexer(comp_a)      # hash-join: -1 = sin contraparte
+    ia = np.flatnonzero(pos >= 0)
+    return ia, pos[ia]
+
+def _emparejar(ca, cb, ma, mb):
+    """Pares 1 a 1 dentro de cada clave: primero montos idénticos, luego el resto por orden de monto."""
+    cents = pd.factorize(np.round(np.concatenate([ma, mb]) * 100))[0].astype(np.int64)
+    n_c = int(cents.max(initial=0)) + 2          # +2: el centinela -1 (monto vacío) pasa a 0
+    k = pd.factorize(np.concatenate([ca.astype(np.int64) * n_c + cents[:len(ca)] + 1,
+                                     cb.astype(np.int64) * n_c + cents[len(ca):] + 1]))[0].astype(np.int64)
+    ka, kb = k[:len(ca)], k[len(ca):]
+    base = int(max(np.bincount(ca).max(initial=0), np.bincount(cb).max(initial=0))) + 1
+    ia, ib = _join(ka * base + _ocurrencias(ka), kb * base + _ocurrencias(kb))
+    libre_a = np.ones(len(ca), dtype=bool); libre_a[ia] = False
+    libre_b = np.ones(len(cb), dtype=bool); libre_b[ib] = False
+    ra, rb = np.flatnonzero(libre_a), np.flatnonzero(libre_b)
+    ja, jb = _join(ca[ra].astype(np.int64) * base + _ocurrencias(ca[ra], ma[ra]),
+                   cb[rb].astype(np.int64) * base + _ocurrencias(cb[rb], mb[rb]))
+    ia, ib = np.concatenate([ia, ra[ja]]), np.concatenate([ib, rb[jb]])
+    order = np.argsort(ia, kind="stable")
+    return ia[order], ib[order]
+
+def _unidades_agregar(codes, lado, n_codes) -> dict:
+    monto = lado["monto"]; ok = ~np.isnan(monto)
+    suma = np.bincount(codes[ok], weights=monto[ok], minlength=n_codes)
+    validos = np.bincount(codes[ok], minlength=n_codes)
+    presentes, primera = np.unique(codes, return_index=True)
+    fecha = None
+    if lado["fecha"] is not None:
+        fecha = pd.Series(lado["fecha"]).groupby(codes).min().reindex(presentes).to_numpy()
+    return {"code": presentes,
+            "monto": np.where(validos[presentes] > 0, suma[presentes], np.nan),
+            "fecha": fecha, "fila": primera}
+
+def _duplicados(ca, cb, ma, mb, uniques) -> pd.DataFrame:
+    n = len(uniques)
+    na, nb = np.bincount(ca, minlength=n), np.bincount(cb, minlength=n)
+    idx = np.flatnonzero((na > 1) | (nb > 1))
+    sa = np.bincount(ca, weights=np.nan_to_num(ma), minlength=n)
+    sb = np.bincount(cb, weights=np.nan_to_num(mb), minlength=n)
+    return pd.DataFrame({"_CLAVE_": np.asarray(uniques[idx], dtype=object), "n_A": na[idx], "n_B": nb[idx],
+                         "Suma_A": sa[idx].round(2), "Suma_B": sb[idx].round(2)})
+
+def conciliar(A, B, clave, monto_A, monto_B, fecha_A=None, fecha_B=None, tolerancia=0.0,
+              politica="emparejar", clave_B=None, aproximado=None) -> dict:
+    """Concilia A contra B; ``aproximado`` (p. ej. ``{"ventana_dias": 5, "score_min": 0.8}``) activa la
+    segunda etapa de emparejamiento aproximado sobre los no conciliados."""
+    with etapa("coerción", len(A) + len(B)):
+        a, b = _lado(A, clave, monto_A, fecha_A), _lado(B, clave_B or clave, monto_B, fecha_B)
+    codes, uniques = pd.factorize(pd.concat([a["clave"], b["clave"]], ignore_index=True), use_na_sentinel=False)
+    ca, cb = codes[:len(A)], codes[len(A):]
+    duplicados = _duplicados(ca, cb, a["monto"], b["monto"], uniques)
+
+    if politica == "agregar":
+        ua, ub = _unidades_agregar(ca, a, len(uniques)), _unidades_agregar(cb, b, len(uniques))
+        ia, ib = _join(ua["code"], ub["code"])
+    else:
+        ua = {"code": ca, "monto": a["monto"], "fecha": a["fecha"], "fila": np.arange(len(ca))}
+        ub = {"code": cb, "monto": b["monto"], "fecha": b["fecha"], "fila": np.arange(len(cb))}
+        ia, ib = _emparejar(ca, cb, a["monto"], b["monto"])
+    hit = np.zeros(len(ua["code"]), dtype=bool); hit[ia] = True
+    en_b = np.zeros(len(ub["code"]), dtype=bool); en_b[ib] = True
+
+    ma, mb = ua["monto"][ia], ub["monto"][ib]
+    dif = ma - mb
+    m = np.abs(dif) > tolerancia
+    diff_monto = pd.DataFrame({"_CLAVE_": np.asarray(uniques[ua["code"][ia[m]]], dtype=object),
+                               "_MONTO__A": ma[m], "_MONTO__B": mb[m], "_diff_monto": dif[m], "_diff_monto_abs": np.abs(dif[m]),
+                               "_fila_A": ua["fila"][ia[m]] + 1, "_fila_B": ub["fila"][ib[m]] + 1})
+
+    diff_fecha = pd.DataFrame(columns=["_CLAVE_", "_FECHA__A", "_FECHA__B"])
+    if ua["fecha"] is not None and ub["fecha"] is not None:
+        fa, fb = ua["fecha"][ia], ub["fecha"][ib]
+        m = ~pd.isna(fa) & ~pd.isna(fb) & (fa != fb)
+        diff_fecha = pd.DataFrame({"_CLAVE_": np.asarray(uniques[ua["code"][ia[m]]], dtype=object),
+                                   "_FECHA__A": fa[m], "_FECHA__B": fb[m]})
+
+    # Adjuntar columnas originales solo a las filas no conciliadas.
+    if politica == "agregar":
+        abierta = np.zeros(len(uniques), dtype=bool)
+        abierta_a = abierta.copy(); abierta_a[ua["code"][~hit]] = True
+        abierta_b = abierta.copy(); abierta_b[ub["code"][~en_b]] = True
+        filas_a, filas_b = np.flatnonzero(abierta_a[ca]), np.flatnonzero(abierta_b[cb])
+    else:
+        filas_a, filas_b = np.flatnonzero(~hit), np.flatnonzero(~en_b)
+    solo_A, solo_B = _adjuntar(A, a, filas_a), _adjuntar(B, b, filas_b)
+
+    total_A, total_B = np.nansum(a["monto"]), np.nansum(b["monto"])
+    out = {"solo_A": solo_A, "solo_B": solo_B, "n_pares": len(ia), "diff_monto": diff_monto, "diff_fecha": diff_fecha,
+           "duplicados": duplicados, "total_A": total_A, "total_B": total_B, "delta_total": total_A - total_B,
+           "tolerancia": tolerancia, "politica": politica,
+           "fechas_no_convertibles": {k: l["fecha_nc"] for k, l in (("A", a), ("B", b)) if l["fecha_nc"] is not None}}
+    if aproximado is not None:
+        with etapa("emparejamiento aproximado", len(solo_A) + len(solo_B)):
+            out["aprox"] = emparejar_aproximado(solo_A, solo_B, **aproximado)
+        out["score_min"] = aproximado.get("score_min", 0.8)
+    return out
+
+def _adjuntar(df, lado, filas) -> pd.DataFrame:
+    out = df.iloc[filas].copy(deep=False)
+    out["_CLAVE_"] = lado["clave"].iloc[filas].to_numpy()
+    out["_MONTO_"] = lado["monto"][filas]
+    if lado["fecha"] is not None: out["_FECHA_"] = lado["fecha"][filas]
+    out["_fila_"] = filas + 1
+    return out
+
+def conciliacion_sheets(r: dict) -> dict:
+    sheets = {
+        "Resumen": pd.DataFrame({
+            "Métrica":["Total A","Total B","Δ A-B","Solo en A (n)","Solo en B (n)","Dif. monto (n)","Dif. fecha (n)",
+                       "Claves duplicadas (n)","Política duplicados","Tolerancia"],
+            "Valor":[f"{r['total_A']:,.2f}", f"{r['total_B']:,.2f}", f"{r['delta_total']:,.2f}", len(r["solo_A"]),
+                     len(r["solo_B"]), len(r["diff_monto"]), len(r["diff_fecha"]), len(r["duplicados"]),
+                     POLITICAS.get(r["politica"], r["politica"]), f"{r['tolerancia']:,.2f}"]
+        }),
+        "Solo_en_A": r["solo_A"], "Solo_en_B": r["solo_B"],
+        "Diferencias_Monto": r["diff_monto"][["_CLAVE_","_MONTO__A","_MONTO__B","_diff_monto","_diff_monto_abs","_fila_A","_fila_B",
+                                              *[c for c in r["diff_monto"].columns if str(c).startswith(("_ARCHIVO", "_FILA_ARCHIVO"))]]],
+        "Diferencias_Fecha": r["diff_fecha"],
+        "Claves_Duplicadas": r["duplicados"],
+    }
+    for lado, (n, p) in r.get("fechas_no_convertibles", {}).items():
+        sheets["Resumen"].loc[len(sheets["Resumen"])] = [f"Fechas no convertibles {lado} (n)", f"{n} ({p*100:.2f}%)"]
+    if "aprox" in r:
+        sheets["Resumen"].loc[len(sheets["Resumen"])] = ["Coincidencias aproximadas (n)", len(r["aprox"])]
+        sheets["Coincidencias_Aproximadas"] = r["aprox"]
+    return sheets
+
+def conciliacion_sections(r: dict, nombre_a: str, nombre_b: str) -> list:
+    diff_monto, aprox = r["diff_monto"], r.get("aprox")
+    top_dif = diff_monto.sort_values("_diff_monto_abs", ascending=False).head(10)
+    pos = diff_monto.loc[diff_monto["_diff_monto"] > 0, "_diff_monto"].sum()
+    neg = diff_monto.loc[diff_monto["_diff_monto"] < 0, "_diff_monto"].sum()
+    bullets = [
+        f"Archivo A: {nombre_a} | Archivo B: {nombre_b}",
+        f"Total A: {r['total_A']:,.2f} | Total B: {r['total_B']:,.2f} | Δ A-B: {r['delta_total']:,.2f}",
+        f"Solo en A: {len(r['solo_A'])} | Solo en B: {len(r['solo_B'])}",
+        f"Dif. monto (> tol.): {len(diff_monto)} | Suma Δ+ {pos:,.2f} | Δ- {neg:,.2f}",
+        f"Dif. fecha: {len(r['diff_fecha'])}", f"Tolerancia aplicada: {r['tolerancia']:,.2f}",
+        f"Claves duplicadas: {len(r['duplicados'])} | Política: {POLITICAS[r['politica']]}"
+    ]
+    nc = {k: v for k, v in r.get("fechas_no_convertibles", {}).items() if v[0]}
+    if nc: bullets.append("Fechas no convertibles: " + " | ".join(f"{k}: {n} ({p*100:.2f}%)" for k, (n, p) in nc.items()))
+    if aprox is not None: bullets.append(f"Coincidencias aproximadas propuestas (puntaje ≥ {r['score_min']:.2f}): {len(aprox)}")
+    det = [f"{t.get('_CLAVE_','s/clave')}: A={t.get('_MONTO__A',np.nan):,.2f} | B={t.get('_MONTO__B',np.nan):,.2f} | Δ={t.get('_diff_monto',np.nan):,.2f} (|Δ|={t.get('_diff_monto_abs',np.nan):,.2f})"
+           for _, t in top_dif.iterrows()] or ["No hay diferencias de monto sobre la tolerancia."]
+    rec = [
+        "Revisar interfaz/logs, horarios de corte y reprocesos entre A y B.",
+        "En diferencias de monto: confirmar TC, descuentos, impuestos, NC y redondeos.",
+        "Descartar asientos manuales fuera del flujo; revisar bitácoras y perfiles.",
+        "Conciliaciones automáticas periódicas con umbrales por tipo de transacción.",
+        "Investigar Solo en A/B: reprocesar interfaz y validar dependencia temporal (cierres)."
+    ]
+    if aprox is not None and not aprox.empty:
+        rec.append("Validar las coincidencias aproximadas (claves con ceros/prefijos distintos o errores de digitación) y corregir la clave en origen.")
+    return [("RESUMEN", [f"• {x}" for x in bullets]),
+            ("TOP 10 DIFERENCIAS", [f"• {x}" for x in det]),
+            ("RECOMENDACIONES", [f"• {x}" for x in rec]),
+            ("REFERENCIA XLSX", ["• 'hallazgos_conciliacion.xlsx' (Resumen, Solo_en_A, Solo_en_B, Diferencias_Monto, Diferencias_Fecha, Claves_Duplicadas, Coincidencias_Aproximadas)."])]
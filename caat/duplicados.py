@@ -0,0 +1,209 @@
+"""Detección de facturas y pagos duplicados.
+
+- **Exactos**: mismo número (normalizado), mismo monto al centavo y misma fecha; también mismo
+  proveedor si se indica. Cada fila se reduce a un hash de 64 bits de sus códigos enteros y los
+  repetidos salen de un solo ``duplicated`` sobre ese hash. Solo las filas marcadas se vuelven a
+  agrupar por la clave completa, así que una colisión del hash no puede unir facturas distintas.
+- **Cercanos**, por vecindario ordenado (*sorted neighborhood*): la tabla se ordena por una clave
+  de bloqueo y cada fila se compara con las ``ventana`` filas que la siguen, nunca todas contra todas.
+  Hay tres pasadas:
+
+  * ``monto+fecha``: mismo proveedor y monto, con fechas a ≤ ``dias`` días;
+  * ``transposición``: mismo proveedor y monto, con dos dígitos contiguos del número intercambiados
+    (``…28642`` / ``…28462``). Se ordena por el número y por el número invertido, para que el
+    intercambio caiga hacia el final de la clave de orden en al menos una de las dos pasadas;
+  * ``número repetido``: mismo proveedor y número, con distinto monto o fecha.
+
+  Dentro de cada pasada el bloque (y la fecha) van ordenados. Si un desplazamiento no aporta ningún
+  par, los siguientes tampoco pueden aportarlo, y el recorrido corta antes de llegar a ``ventana``.
+"""
+import numpy as np
+import pandas as pd
+from .coerce import as_amount, convertir_fechas
+from .fuzzy import clave_canonica, MAX_LARGO
+from .perf import etapa
+
+DIAS = 7
+VENTANA = 10             # filas siguientes comparadas en cada pasada del vecindario ordenado
+MIN_LARGO_TRANSPOSICION = 4
+MOTIVOS = ["monto+fecha", "transposición", "número repetido"]
+TOP_N = 20
+
+def _dias(s: pd.Series) -> np.ndarray:
+    d = convertir_fechas(s)["fechas"].to_numpy().astype("datetime64[D]")
+    return np.where(np.isnat(d), np.iinfo(np.int64).min, d.astype(np.int64))
+
+def _vecindario(orden, bloque, ventana, cerca=None) -> list:
+    """Pares ``(i, j)`` a ≤ ``ventana`` posiciones en ``orden`` con el mismo ``bloque`` y, si se indica,
+    que cumplen ``cerca(i, j)`` (condición monótona en la distancia: fechas ordenadas dentro del bloque)."""
+    b, pares = bloque[orden], []
+    for k in range(1, ventana + 1):
+        m = b[k:] == b[:-k]
+        i, j = orden[:-k][m], orden[k:][m]
+        if cerca is not None: ok = cerca(i, j); i, j = i[ok], j[ok]
+        if not len(i): break
+        pares.append((i, j))
+    return pares
+
+def _transpuestos(a, b) -> np.ndarray:
+    """``a`` y ``b`` (pares de cadenas) difieren solo en dos caracteres contiguos intercambiados."""
+    a = np.asarray(a, dtype=f"<U{MAX_LARGO}"); b = np.asarray(b, dtype=f"<U{MAX_LARGO}")
+    if not len(a): return np.zeros(0, dtype=bool)
+    A, B = a.view(np.uint32).reshape(len(a), MAX_LARGO), b.view(np.uint32).reshape(len(b), MAX_LARGO)
+    dif = A != B
+    p = dif.argmax(axis=1); q = np.minimum(p + 1, MAX_LARGO - 1); fila = np.arange(len(a))
+    return ((np.char.str_len(a) == np.char.str_len(b)) & (dif.sum(axis=1) == 2) & dif[fila, q]
+            & (A[fila, p] == B[fila, q]) & (A[fila, q] == B[fila, p]))
+
+def _pares(i, j, bit) -> pd.DataFrame:
+    i, j = np.concatenate(i) if len(i) else np.zeros(0, np.int64), np.concatenate(j) if len(j) else np.zeros(0, np.int64)
+    return pd.DataFrame({"fila_1": np.minimum(i, j), "fila_2": np.maximum(i, j), "bit": 1 << bit})
+
+COLUMNAS = ["_PROVEEDOR_", "_NUMERO__1", "_NUMERO__2", "_MONTO__1", "_MONTO__2", "_FECHA__1", "_FECHA__2",
+            "dias", "motivo", "_fila_1", "_fila_2"]
+
+def detectar_duplicados(df, col_numero, col_monto, col_fecha=None, col_proveedor=None, dias=DIAS,
+                        ventana=VENTANA) -> dict:
+    """Duplicados exactos (hash) y cercanos (vecindario ordenado) de ``df``."""
+    n = len(df)
+    with etapa("coerción", n):
+        canon = clave_canonica(df[col_numero])
+        canon = canon.where(df[col_numero].notna() & (canon.str.len() > 0))
+        num = pd.factorize(canon)[0].astype(np.int64)
+        monto = as_amount(df[col_monto]).to_numpy(dtype=float, na_value=np.nan)
+        valido = ~np.isnan(monto)
+        cents = np.where(valido, np.round(np.nan_to_num(monto) * 100), 0).astype(np.int64)
+        dia = _dias(df[col_fecha]) if col_fecha is not None else np.zeros(n, dtype=np.int64)
+        prov, proveedores = (pd.factorize(df[col_proveedor]) if col_proveedor is not None
+                             else (np.zeros(n, dtype=np.int64), np.array([None])))
+        prov = prov.astype(np.int64)
+        proveedores = np.asarray(proveedores)
+        if proveedores.dtype.kind == "f" and (proveedores == np.round(proveedores)).all():
+            proveedores = proveedores.astype(np.int64)     # RUC leído como número
+        con_fecha = dia != np.iinfo(np.int64).min
+
+    with etapa("duplicados exactos (hash)", n):
+        claves = pd.DataFrame({"prov": prov, "num": num, "cents": cents, "dia": dia})
+        h = pd.util.hash_pandas_object(claves, index=False).to_numpy()
+        candidatas = np.flatnonzero(pd.Series(h).duplicated(keep=False).to_numpy() & valido & (num >= 0))
+        g = claves.iloc[candidatas].groupby(["prov", "num", "cents", "dia"], sort=False)
+        tam = g["num"].transform("size").to_numpy()
+        filas_ex, grupo_ex = candidatas[tam > 1], g.ngroup().to_numpy()[tam > 1]
+        grupo = np.full(n, -1, dtype=np.int64); grupo[filas_ex] = pd.factorize(grupo_ex)[0]
+
+    with etapa("duplicados cercanos (vecindario ordenado)", n):
+        # Bloque proveedor+monto; las filas sin monto quedan fuera de las pasadas que lo exigen.
+        pm = prov * (int(cents.max(initial=0)) - int(cents.min(initial=0)) + 1) + (cents - cents.min(initial=0))
+        distinto = lambda i, j: (grupo[i] < 0) | (grupo[i] != grupo[j])
+        pares = []
+        if col_fecha is not None:
+            base = np.flatnonzero(valido & con_fecha)
+            orden = base[np.lexsort((dia[base], pm[base]))]
+            p = _vecindario(orden, pm, ventana, lambda i, j: (dia[j] - dia[i] <= dias) & distinto(i, j))
+            pares.append(_pares([x for x, _ in p], [y for _, y in p], 0))
+        base = np.flatnonzero(valido & (canon.str.len() >= MIN_LARGO_TRANSPOSICION).to_numpy(dtype=bool, na_value=False))
+        for clave in (canon, canon.str[::-1]):
+            rango = pd.factorize(clave.iloc[base], sort=True)[0]
+            orden = base[np.lexsort((rango, pm[base]))]
+            p = _vecindario(orden, pm, ventana)
+            i = np.concatenate([x for x, _ in p]) if p else np.zeros(0, np.int64)
+            j = np.concatenate([y for _, y in p]) if p else np.zeros(0, np.int64)
+            ok = num[i] != num[j]; i, j = i[ok], j[ok]
+            ok = _transpuestos(canon.iloc[i].to_numpy(dtype=object), canon.iloc[j].to_numpy(dtype=object))
+            pares.append(_pares([i[ok]], [j[ok]], 1))
+        base = np.flatnonzero(num >= 0)
+        pn = prov * (int(num.max(initial=0)) + 1) + num
+        orden = base[np.lexsort((dia[base], pn[base]))]
+        p = _vecindario(orden, pn, ventana, distinto)
+        pares.append(_pares([x for x, _ in p], [y for _, y in p], 2))
+        pares = pd.concat(pares, ignore_index=True).drop_duplicates().groupby(["fila_1", "fila_2"], sort=False)["bit"].sum().reset_index()
+
+    # Filas "copia": en cada grupo exacto todas menos la primera; en cada par cercano, la segunda.
+    copia = np.zeros(n, dtype=bool)
+    if len(filas_ex):
+        orden = np.lexsort((filas_ex, grupo[filas_ex]))
+        g = grupo[filas_ex][orden]
+        copia[filas_ex[orden][np.r_[False, g[1:] == g[:-1]]]] = True
+    copia[pares["fila_2"].to_numpy()] = True
+
+    etiquetas = {m: ", ".join(x for i, x in enumerate(MOTIVOS) if m >> i & 1) for m in pares["bit"].unique()}
+    f1, f2 = pares["fila_1"].to_numpy(), pares["fila_2"].to_numpy()
+    numero = df[col_numero].to_numpy()
+    fechas = (pd.Series(np.where(con_fecha, dia, 0).astype("datetime64[D]")).where(con_fecha).to_numpy()
+              if col_fecha is not None else None)
+    cercanos = pd.DataFrame({
+        "_PROVEEDOR_": np.where(prov[f1] >= 0, proveedores[prov[f1]], None),
+        "_NUMERO__1": numero[f1], "_NUMERO__2": numero[f2], "_MONTO__1": monto[f1], "_MONTO__2": monto[f2],
+        "_FECHA__1": fechas[f1] if fechas is not None else pd.NaT, "_FECHA__2": fechas[f2] if fechas is not None else pd.NaT,
+        "dias": np.where(con_fecha[f1] & con_fecha[f2], np.abs(dia[f2] - dia[f1]), -1) if col_fecha is not None else -1,
+        "motivo": pares["bit"].map(etiquetas).to_numpy(), "_fila_1": f1 + 1, "_fila_2": f2 + 1})
+    cercanos = cercanos.sort_values(["_MONTO__2", "_fila_1"], ascending=[False, True], ignore_index=True)[COLUMNAS]
+    if col_proveedor is None: cercanos = cercanos.drop(columns="_PROVEEDOR_")
+    if col_fecha is None: cercanos = cercanos.drop(columns=["_FECHA__1", "_FECHA__2", "dias"])
+
+    exactos = df.iloc[filas_ex].copy(deep=False)
+    exactos["_GRUPO_"] = grupo[filas_ex] + 1
+    exactos["_N_GRUPO_"] = np.bincount(grupo[filas_ex])[grupo[filas_ex]]
+    exactos["_MONTO_"] = monto[filas_ex]
+    if fechas is not None: exactos["_FECHA_"] = fechas[filas_ex]
+    exactos["_fila_"] = filas_ex + 1
+    exactos = exactos.sort_values(["_GRUPO_", "_fila_"], ignore_index=True)
+
+    por_proveedor = pd.DataFrame()
+    if col_proveedor is not None and copia.any():
+        c = np.flatnonzero(copia)
+        por_proveedor = (pd.DataFrame({"_PROVEEDOR_": np.where(prov[c] >= 0, proveedores[prov[c]], None), "_MONTO_": monto[c]})
+                         .groupby("_PROVEEDOR_", sort=False, observed=True)["_MONTO_"].agg(["size", "sum"])
+                         .rename(columns={"size": "Copias", "sum": "Monto_copias"})
+                         .sort_values("Monto_copias", ascending=False).round(2).reset_index())
+    return {"exactos": exactos, "cercanos": cercanos, "por_proveedor": por_proveedor,
+            "n": n, "sin_monto": int((~valido).sum()), "sin_numero": int((num < 0).sum()),
+            "grupos_exactos": int(grupo.max(initial=-1)) + 1, "filas_exactas": len(filas_ex),
+            "por_motivo": {m: int((pares["bit"].to_numpy() >> i & 1).sum()) for i, m in enumerate(MOTIVOS)},
+            "copias": int(copia.sum()), "monto_copias": float(monto[copia].sum()), "monto_total": float(np.nansum(monto)),
+            "dias": dias, "ventana": ventana, "col_proveedor": col_proveedor, "col_fecha": col_fecha}
+
+def _criterio_txt(r: dict) -> str:
+    partes = ["número", "monto"] + (["fecha"] if r["col_fecha"] else []) + (["proveedor"] if r["col_proveedor"] else [])
+    return f"Exactos: mismo {', '.join(partes)} | Cercanos: ventana {r['ventana']} filas" + (
+        f", fechas a ≤ {r['dias']} días" if r["col_fecha"] else "")
+
+def duplicados_sheets(r: dict) -> dict:
+    sheets = {"Resumen": pd.DataFrame({
+                  "Métrica": ["Registros", "Sin monto válido", "Sin número", "Grupos exactos", "Filas en grupos exactos",
+                              *[f"Pares cercanos – {m}" for m in MOTIVOS], "Copias (filas)", "Monto de las copias",
+                              "% del monto total", "Criterio"],
+                  "Valor": [r["n"], r["sin_monto"], r["sin_numero"], r["grupos_exactos"], r["filas_exactas"],
+                            *r["por_motivo"].values(), r["copias"], f"{r['monto_copias']:,.2f}",
+                            f"{r['monto_copias'] / r['monto_total'] * 100 if r['monto_total'] else 0:.2f}%", _criterio_txt(r)]}),
+              "Duplicados_Exactos": r["exactos"], "Pares_Cercanos": r["cercanos"]}
+    if not r["por_proveedor"].empty: sheets["PorProveedor"] = r["por_proveedor"]
+    return sheets
+
+def duplicados_sections(r: dict, nombre: str) -> list:
+    bullets = [
+        f"Archivo: {nombre}", f"Registros analizados: {r['n']:,} (sin monto válido: {r['sin_monto']:,})",
+        f"Duplicados exactos: {r['grupos_exactos']:,} grupos, {r['filas_exactas']:,} filas",
+        "Pares cercanos: " + " | ".join(f"{m}: {v:,}" for m, v in r["por_motivo"].items()),
+        f"Copias estimadas: {r['copias']:,} filas por {r['monto_copias']:,.2f} (de {r['monto_total']:,.2f})",
+        f"Criterio: {_criterio_txt(r)}"
+    ]
+    ex = r["exactos"].drop_duplicates("_GRUPO_").nlargest(TOP_N // 2, "_MONTO_")
+    det = [f"Grupo {g['_GRUPO_']}: {g['_N_GRUPO_']} × {g['_MONTO_']:,.2f} (primera fila {g['_fila_']})"
+           for _, g in ex.iterrows()]
+    det += [f"{t['_NUMERO__1']} / {t['_NUMERO__2']}: {t['_MONTO__1']:,.2f} / {t['_MONTO__2']:,.2f} ({t['motivo']})"
+            for _, t in r["cercanos"].head(TOP_N // 2).iterrows()]
+    if not r["por_proveedor"].empty:
+        det.append("Top 5 proveedores por monto de copias: " + ", ".join(
+            f"{p}: {v:,.2f}" for p, v in r["por_proveedor"].head(5)[["_PROVEEDOR_", "Monto_copias"]].itertuples(index=False)))
+    rec = [
+        "Verificar contra el mayor de pagos si las copias fueron efectivamente pagadas; solicitar NC o reintegro.",
+        "En transposiciones y números repetidos: confirmar el número correcto con el proveedor o el SRI.",
+        "Revisar el control de unicidad (proveedor + número) en el ERP y quién puede omitirlo.",
+        "Analizar concentración de duplicados por proveedor, usuario de registro y periodo de cierre.",
+        "Incorporar la prueba como control periódico previo a cada corrida de pagos."
+    ]
+    return [("RESUMEN", [f"• {x}" for x in bullets]),
+            ("DETALLE PRINCIPAL", [f"• {x}" for x in det] if det else ["• No se encontraron duplicados."]),
+            ("RECOMENDACIONES", [f"• {x}" for x in rec]),
+            ("REFERENCIA XLSX", ["• 'facturas_duplicadas.xlsx' (Resumen, Duplicados_Exactos, Pares_Cercanos, PorProveedor si aplica)."])]
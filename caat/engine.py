@@ -0,0 +1,137 @@
+"""Ejecución sin interfaz de las pruebas CAAT.
+
+Cada prueba recibe el DataFrame ya leído, la ruta del archivo y su sección de configuración,
+y devuelve el resultado junto con sus entregables (tablas y secciones DOCX) y una fila de
+resumen. ``procesar_archivo`` encadena lectura → pruebas → escritura y es lo que el CLI
+reparte entre procesos.
+"""
+import time
+from pathlib import Path
+from .readers import read_table
+from .compact import compact_frame
+from .columnas import normalize_headers, col_auto, col_exacta, sugerir_monto, SINONIMOS_ID, SINONIMOS_FECHA, SINONIMOS_PROVEEDOR, SINONIMOS_EMISOR
+from .montos import detectar_montos, montos_sheets, montos_sections, MIN_GRUPO
+from .benford import analizar_benford, benford_sheets, benford_sections, MIN_N_SEGMENTO
+from .conciliacion import conciliar, conciliacion_sheets, conciliacion_sections, POLITICAS
+from .duplicados import detectar_duplicados, duplicados_sheets, duplicados_sections, DIAS, VENTANA
+from .secuencias import analizar_secuencias, secuencias_sheets, secuencias_sections
+from .export import export_bytes, export_name, docx_from_sections, FORMATOS
+
+def _columna(df, cfg, campo, sugerida=None, requerida=True):
+    col = cfg.get(campo) or sugerida
+    if col is None and requerida: raise ValueError(f"No se pudo determinar '{campo}'; indíquelo en la configuración.")
+    if col is not None and col not in df.columns: raise ValueError(f"La columna '{col}' ({campo}) no existe.")
+    return col
+
+def prueba_montos(df, ruta, cfg) -> dict:
+    res = detectar_montos(df, col_monto=_columna(df, cfg, "col_monto", sugerir_monto(df)),
+                          metodo=cfg.get("metodo", "fijo"), umbral=float(cfg.get("umbral", 10000.0)), k=cfg.get("k", 2),
+                          col_id=_columna(df, cfg, "col_id", requerida=False),
+                          col_fecha=_columna(df, cfg, "col_fecha", requerida=False),
+                          por_id=bool(cfg.get("por_id", False)), periodo=cfg.get("periodo"),
+                          ventana=int(cfg.get("ventana", 1)), min_grupo=int(cfg.get("min_grupo", MIN_GRUPO)))
+    return {"res": res,
+            "tablas": {"montos_inusuales": montos_sheets(res)},
+            "reportes": {"reporte_montos_inusuales": ("Montos Inusuales – Reporte de Auditoría", montos_sections(res, Path(ruta).name))},
+            "resumen": {"Registros": res["total_tx"], "Hallazgos": res["total_h"], "Detalle": res["criterio_txt"]}}
+
+def prueba_benford(df, ruta, cfg) -> dict:
+    r = analizar_benford(df, _columna(df, cfg, "col_monto", sugerir_monto(df)),
+                         min_val=float(cfg.get("min_val", 0.0)), desvio_min=float(cfg.get("desvio_min", 2.0)),
+                         col_grupo=_columna(df, cfg, "col_grupo", requerida=False),
+                         col_fecha=_columna(df, cfg, "col_fecha", requerida=False), periodo=cfg.get("periodo"),
+                         min_n=int(cfg.get("min_n", MIN_N_SEGMENTO)))
+    if r["n"] == 0: raise ValueError("No hay datos suficientes tras filtros.")
+    tablas = {"benford_resumen": benford_sheets(r)}
+    if len(r["sospechosas"]): tablas["benford_sospechosas"] = {"Sospechosas_Benford": r["sospechosas"]}
+    primer = r["bat"]["primer"]
+    return {"res": r, "tablas": tablas,
+            "reportes": {"reporte_benford": ("Ley de Benford – Reporte de Auditoría", benford_sections(r, Path(ruta).name))},
+            "resumen": {"Registros": r["n"], "Hallazgos": len(r["sospechosas"]),
+                        "Detalle": f"χ² {primer['chi2']:,.3f} – {'Cumple' if primer['cumple'] else 'No cumple'}"}}
+
+def prueba_conciliacion(df, ruta, cfg) -> dict:
+    """``archivo_b`` admite los campos ``{stem}``, ``{name}`` y ``{dir}`` del archivo A."""
+    ruta = Path(ruta)
+    if "archivo_b" not in cfg: raise ValueError("Falta 'archivo_b' en la configuración de conciliación.")
+    ruta_b = Path(cfg["archivo_b"].format(stem=ruta.stem, name=ruta.name, dir=ruta.parent))
+    B = compact_frame(normalize_headers(read_table(ruta_b, sheet=cfg.get("hoja_b"))))
+    clave = _columna(df, cfg, "clave", col_auto(df, SINONIMOS_ID))
+    if clave not in B.columns: raise ValueError(f"La clave '{clave}' no existe en {ruta_b.name}.")
+    politica = cfg.get("politica", "emparejar")
+    if politica not in POLITICAS: raise ValueError(f"Política desconocida: {politica}")
+    aprox = {"ventana_dias": int(cfg.get("ventana_dias", 5)), "score_min": float(cfg.get("score_min", 0.8))}
+    res = conciliar(df, B, clave, _columna(df, cfg, "monto_a", sugerir_monto(df)), _columna(B, cfg, "monto_b", sugerir_monto(B)),
+                    fecha_A=_columna(df, cfg, "fecha_a", col_auto(df, SINONIMOS_FECHA), requerida=False),
+                    fecha_B=_columna(B, cfg, "fecha_b", col_auto(B, SINONIMOS_FECHA), requerida=False),
+                    tolerancia=float(cfg.get("tolerancia", 0.0)), politica=politica,
+                    aproximado=aprox if cfg.get("aproximado", True) else None)
+    return {"res": res,
+            "tablas": {"hallazgos_conciliacion": conciliacion_sheets(res)},
+            "reportes": {"reporte_conciliacion": ("Conciliación A vs. B – Reporte de Auditoría",
+                                                  conciliacion_sections(res, ruta.name, ruta_b.name))},
+            "resumen": {"Registros": len(df), "Hallazgos": len(res["solo_A"]) + len(res["solo_B"]) + len(res["diff_monto"]),
+                        "Detalle": f"Solo A {len(res['solo_A'])} | Solo B {len(res['solo_B'])} | Δ {res['delta_total']:,.2f}"}}
+
+def prueba_duplicados(df, ruta, cfg) -> dict:
+    numero = _columna(df, cfg, "col_numero", col_auto(df, SINONIMOS_ID))
+    proveedor = _columna(df, cfg, "col_proveedor", col_auto(df.drop(columns=numero), SINONIMOS_PROVEEDOR), requerida=False)
+    r = detectar_duplicados(df, numero, _columna(df, cfg, "col_monto", sugerir_monto(df)),
+                            col_fecha=_columna(df, cfg, "col_fecha", col_auto(df, SINONIMOS_FECHA), requerida=False),
+                            col_proveedor=proveedor, dias=int(cfg.get("dias", DIAS)), ventana=int(cfg.get("ventana", VENTANA)))
+    return {"res": r,
+            "tablas": {"facturas_duplicadas": duplicados_sheets(r)},
+            "reportes": {"reporte_duplicados": ("Facturas Duplicadas – Reporte de Auditoría", duplicados_sections(r, Path(ruta).name))},
+            "resumen": {"Registros": r["n"], "Hallazgos": r["filas_exactas"] + len(r["cercanos"]),
+                        "Detalle": f"Exactos {r['grupos_exactos']} grupos | Cercanos {len(r['cercanos'])} pares | "
+                                   f"Copias {r['monto_copias']:,.2f}"}}
+
+def prueba_secuencias(df, ruta, cfg) -> dict:
+    col_id = _columna(df, cfg, "col_id", col_auto(df, SINONIMOS_ID))
+    r = analizar_secuencias(df, col_id,
+                            col_serie=_columna(df, cfg, "col_serie", col_exacta(df.drop(columns=col_id), SINONIMOS_EMISOR), requerida=False),
+                            col_fecha=_columna(df, cfg, "col_fecha", col_auto(df, SINONIMOS_FECHA), requerida=False))
+    return {"res": r,
+            "tablas": {"secuencias_facturas": secuencias_sheets(r)},
+            "reportes": {"reporte_secuencias": ("Correlatividad de la Numeración – Reporte de Auditoría",
+                                                secuencias_sections(r, Path(ruta).name))},
+            "resumen": {"Registros": r["n"], "Hallazgos": len(r["huecos"]) + len(r["repetidos"]) + len(r["invertidas"]),
+                        "Detalle": f"Faltantes {r['faltantes']:,} en {len(r['huecos'])} rangos | Repetidos {len(r['repetidos'])} | "
+                                   f"Fechas invertidas {len(r['invertidas'])}"}}
+
+PRUEBAS = {"duplicados": prueba_duplicados, "montos": prueba_montos, "conciliacion": prueba_conciliacion,
+           "benford": prueba_benford, "secuencias": prueba_secuencias}
+
+def escribir_entregables(out: dict, destino: Path, formato="xlsx") -> list:
+    destino.mkdir(parents=True, exist_ok=True)
+    escritos = []
+    for base, sheets in out["tablas"].items():
+        nombre, _ = export_name(base, formato, len(sheets))
+        (destino / nombre).write_bytes(export_bytes(sheets, formato)); escritos.append(nombre)
+    for base, (titulo, secciones) in out["reportes"].items():
+        (destino / f"{base}.docx").write_bytes(docx_from_sections(titulo, secciones)); escritos.append(f"{base}.docx")
+    return escritos
+
+def procesar_archivo(ruta, config: dict, destino) -> list:
+    """Lee ``ruta`` una vez, corre las pruebas presentes en ``config`` y escribe sus entregables en ``destino``."""
+    ruta, destino = Path(ruta), Path(destino)
+    formato = config.get("formato", "xlsx")
+    if formato not in FORMATOS: raise ValueError(f"Formato desconocido: {formato}")
+    fila = {"Archivo": str(ruta), "Prueba": "lectura", "Estado": "OK", "Registros": None, "Hallazgos": None,
+            "Detalle": "", "Segundos": 0.0, "Salida": str(destino)}
+    t0 = time.perf_counter()
+    try: df = compact_frame(normalize_headers(read_table(ruta, sheet=config.get("hoja"))))
+    except Exception as e:
+        return [{**fila, "Estado": "Error", "Detalle": f"{type(e).__name__}: {e}", "Segundos": round(time.perf_counter() - t0, 3)}]
+    filas = []
+    for prueba, fn in PRUEBAS.items():
+        if prueba not in config: continue
+        t0 = time.perf_counter()
+        try:
+            out = fn(df, ruta, config[prueba] or {})
+            escribir_entregables(out, destino, formato)
+            filas.append({**fila, "Prueba": prueba, **out["resumen"], "Segundos": round(time.perf_counter() - t0, 3)})
+        except Exception as e:
+            filas.append({**fila, "Prueba": prueba, "Estado": "Error", "Detalle": f"{type(e).__name__}: {e}",
+                          "Segundos": round(time.perf_counter() - t0, 3)})
+    return filas
@@ -0,0 +1,199 @@
+"""Exportación de entregables: XLSX en streaming, Parquet, CSV comprimido y reportes DOCX.
+
+El XLSX se escribe directamente como OOXML: cada bloque de filas se convierte a XML con
+operaciones de texto vectorizadas por columna y se vuelca al ZIP antes de procesar el
+siguiente, de modo que la memoria queda acotada por el bloque y no por la hoja. Las hojas
+que superan el límite de Excel (1.048.576 filas) se parten en ``Nombre``, ``Nombre_2``, …
+"""
+import datetime, io, re, zipfile
+from xml.sax.saxutils import escape, quoteattr
+import numpy as np
+import pandas as pd
+from docx import Document
+from docx.shared import Pt
+
+MAX_FILAS_XLSX = 1_048_576 - 1      # una fila queda para el encabezado
+BLOQUE = 100_000
+MAX_TEXTO = 32_767                  # límite de caracteres por celda en Excel
+
+FORMATOS = {
+    "xlsx": ("XLSX", ".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": ("Parquet", ".parquet", "application/vnd.apache.parquet"),
+    "csv.gz": ("CSV.gz", ".csv.gz", "application/gzip"),
+}
+
+_ILEGALES = r"[\x00-\x08\x0b\x0c\x0e-\x1f]"
+_EPOCH = np.datetime64("1899-12-30")
+# Estilos: 0 normal, 1 fecha y hora, 2 fecha, 3 encabezado en negrita.
+_ESTILO_FECHA_HORA, _ESTILO_FECHA, _ESTILO_ENCABEZADO = 1, 2, 3
+
+def _col_letra(i: int) -> str:
+    s = ""
+    i += 1
+    while i: i, r = divmod(i - 1, 26); s = chr(65 + r) + s
+    return s
+
+def _texto_xml(s: pd.Series) -> pd.Series:
+    s = s.astype(str).str.slice(0, MAX_TEXTO).str.replace(_ILEGALES, "", regex=True)
+    return s.str.replace("&", "&amp;").str.replace("<", "&lt;").str.replace(">", "&gt;")
+
+def _fecha_local(v) -> pd.Timestamp:
+    t = pd.Timestamp(v)
+    return t.tz_localize(None) if t.tzinfo is not None else t
+
+def _celdas_mixtas(s: pd.Series, ref: pd.Series) -> pd.Series:
+    """Columna object con tipos mezclados (datos de origen): cada valor con su tipo de celda; texto solo para cadenas."""
+    es = lambda tipos: s.map(lambda v: isinstance(v, tipos)).to_numpy(dtype=bool)
+    booleano = es((bool, np.bool_))
+    numero = es((int, float, np.integer, np.floating)) & ~booleano
+    fecha = es((datetime.date, np.datetime64)) & ~pd.isna(s).to_numpy()
+    texto = ~(booleano | numero | fecha) & s.notna().to_numpy()
+    out = pd.Series("", index=s.index, dtype=object)
+    for m, conv in ((booleano, lambda x: x.astype(bool)), (numero, lambda x: pd.to_numeric(x)),
+                    (fecha, lambda x: pd.to_datetime(x.map(_fecha_local))), (texto, lambda x: x.astype(str))):
+        if m.any(): out[m] = _celdas(conv(s[m]), ref[m]).to_numpy()
+    return out
+
+def _celdas(s: pd.Series, ref: pd.Series) -> pd.Series:
+    """XML de las celdas de una columna; ``ref`` trae las referencias ``A2``, ``A3``, …"""
+    if isinstance(s.dtype, pd.CategoricalDtype): s = s.astype(s.cat.categories.dtype)
+    if isinstance(s.dtype, pd.DatetimeTZDtype): s = s.dt.tz_localize(None)
+    if s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) not in ("string", "empty"): return _celdas_mixtas(s, ref)
+    nulo = s.isna().to_numpy().copy()
+    kind = s.dtype.kind
+    abre = '<c r="' + ref
+    if kind == "b":
+        x = abre + '" t="b"><v>' + s.astype("Int8").astype(str) + "</v></c>"
+    elif kind in "iuf":
+        v = s.to_numpy(dtype=float, na_value=np.nan)
+        nulo |= ~np.isfinite(v)
+        x = abre + '"><v>' + (s if kind in "iu" else pd.Series(v, index=s.index)).astype(str) + "</v></c>"
+    elif kind == "M":
+        t = s.to_numpy().astype("datetime64[ns]")
+        serial = (t - _EPOCH) / np.timedelta64(1, "D")
+        solo_fecha = bool(((t[~nulo] - t[~nulo].astype("datetime64[D]")) == np.timedelta64(0)).all())
+        estilo = _ESTILO_FECHA if solo_fecha else _ESTILO_FECHA_HORA
+        x = abre + f'" s="{estilo}"><v>' + pd.Series(serial, index=s.index).astype(str) + "</v></c>"
+    else:
+        x = abre + '" t="inlineStr"><is><t xml:space="preserve">' + _texto_xml(s) + "</t></is></c>"
+    return x.where(~nulo, "")
+
+def _filas_xml(df: pd.DataFrame, fila0: int) -> str:
+    """Filas ``fila0``… (numeración Excel) del bloque como XML."""
+    n = np.arange(fila0, fila0 + len(df)).astype(str)
+    nums = pd.Series(n, index=df.index, dtype="str")
+    filas = '<row r="' + nums + '">'
+    for j, (_, col) in enumerate(df.items()):
+        filas = filas + _celdas(col, _col_letra(j) + nums)
+    return "".join((filas + "</row>").tolist())
+
+def _encabezado_xml(columnas) -> str:
+    celdas = "".join(f'<c r="{_col_letra(j)}1" s="{_ESTILO_ENCABEZADO}" t="inlineStr"><is><t xml:space="preserve">'
+                     f'{escape(re.sub(_ILEGALES, "", str(c)))}</t></is></c>' for j, c in enumerate(columnas))
+    return f'<row r="1">{celdas}</row>'
+
+_NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+_NS_R = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_ESTILOS = (_XML + f'<styleSheet {_NS}>'
+            '<numFmts count="2"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/>'
+            '<numFmt numFmtId="165" formatCode="yyyy-mm-dd"/></numFmts>'
+            '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+            '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+            '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+            '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+            '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+            '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+            '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+            '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>')
+
+def _nombres_hoja(sheets: dict) -> list:
+    """(nombre de hoja, DataFrame, fila inicial, fila final) con nombres válidos, únicos y partidos por límite."""
+    out, usados = [], set()
+    for name, df in sheets.items():
+        if not isinstance(df, pd.DataFrame): df = pd.DataFrame({"valor": [df]})
+        base = re.sub(r"[\[\]:*?/\\]", "_", str(name)).strip("'")[:31] or "Hoja"
+        cortes = range(0, max(len(df), 1), MAX_FILAS_XLSX)
+        for k, ini in enumerate(cortes, start=1):
+            nm = base if k == 1 else f"{base[:31 - len(str(k)) - 1]}_{k}"
+            i = 2
+            while nm.lower() in usados: nm = f"{base[:31 - len(str(i)) - 1]}_{i}"; i += 1
+            usados.add(nm.lower()); out.append((nm, df, ini, min(ini + MAX_FILAS_XLSX, len(df))))
+    return out
+
+def write_xlsx(sheets: dict, out) -> None:
+    """Escribe ``{nombre: DataFrame}`` como XLSX en ``out`` (ruta o binario escribible)."""
+    hojas = _nombres_hoja(sheets)
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        for k, (_, df, ini, fin) in enumerate(hojas, start=1):
+            with z.open(f"xl/worksheets/sheet{k}.xml", "w", force_zip64=True) as f:
+                f.write(f"{_XML}<worksheet {_NS}><sheetData>{_encabezado_xml(df.columns)}".encode())
+                for b in range(ini, fin, BLOQUE):
+                    f.write(_filas_xml(df.iloc[b:min(b + BLOQUE, fin)], b - ini + 2).encode())
+                f.write(b"</sheetData></worksheet>")
+        n = len(hojas)
+        z.writestr("[Content_Types].xml", _XML +
+                   '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                   '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                   '<Default Extension="xml" ContentType="application/xml"/>'
+                   '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                   '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                   + "".join(f'<Override PartName="/xl/worksheets/sheet{k}.xml" '
+                             'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                             for k in range(1, n + 1)) + "</Types>")
+        z.writestr("_rels/.rels", _XML +
+                   '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+                   'Target="xl/workbook.xml"/></Relationships>')
+        z.writestr("xl/workbook.xml", _XML + f"<workbook {_NS} {_NS_R}><sheets>" +
+                   "".join(f'<sheet name={quoteattr(nm)} sheetId="{k}" r:id="rId{k}"/>'
+                           for k, (nm, *_) in enumerate(hojas, start=1)) + "</sheets></workbook>")
+        z.writestr("xl/_rels/workbook.xml.rels", _XML +
+                   '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">' +
+                   "".join(f'<Relationship Id="rId{k}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                           f'Target="worksheets/sheet{k}.xml"/>' for k in range(1, n + 1)) +
+                   f'<Relationship Id="rId{n + 1}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+                   'Target="styles.xml"/></Relationships>')
+        z.writestr("xl/styles.xml", _ESTILOS)
+
+def _parquet(df: pd.DataFrame, out) -> None:
+    import pyarrow as pa
+    df = df.rename(columns=str)
+    try: df.to_parquet(out, index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # Columnas object con tipos mezclados: se guardan como texto (solo en este camino se copia).
+        out.seek(0); out.truncate()
+        mixtas = {c: df[c].astype(str).where(df[c].notna()) for c in df.columns if df[c].dtype == object}
+        df.assign(**mixtas).to_parquet(out, index=False)
+
+def _csv_gz(df: pd.DataFrame, out) -> None:
+    df.to_csv(out, index=False, compression={"method": "gzip", "compresslevel": 1, "mtime": 0})
+
+def export_bytes(sheets: dict, fmt: str = "xlsx") -> bytes:
+    """Entregable en ``fmt``; Parquet y CSV.gz con varias tablas se empaquetan en un ZIP."""
+    buf = io.BytesIO()
+    if fmt == "xlsx": write_xlsx(sheets, buf); return buf.getvalue()
+    escribir, ext = {"parquet": _parquet, "csv.gz": _csv_gz}[fmt], FORMATOS[fmt][1]
+    tablas = {k: v if isinstance(v, pd.DataFrame) else pd.DataFrame({"valor": [v]}) for k, v in sheets.items()}
+    if len(tablas) == 1: escribir(next(iter(tablas.values())), buf); return buf.getvalue()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as z:
+        for name, df in tablas.items():
+            parte = io.BytesIO(); escribir(df, parte)
+            z.writestr(re.sub(r"[^\w\-]", "_", str(name)) + ext, parte.getvalue())
+    return buf.getvalue()
+
+def export_name(base: str, fmt: str, n_tablas: int) -> tuple:
+    """Nombre de archivo y MIME del entregable."""
+    _, ext, mime = FORMATOS[fmt]
+    if fmt != "xlsx" and n_tablas > 1: return f"{base}_{fmt.replace('.', '_')}.zip", "application/zip"
+    return base + ext, mime
+
+def docx_from_sections(title: str, sections: list[tuple[str, list[str]]]) -> bytes:
+    d = Document(); d.add_heading(title, level=1)
+    for heading, bullets in sections:
+        d.add_heading(heading, level=2)
+        for item in bullets:
+            p = d.add_paragraph(item, style="List Bullet"); p.style.font.size = Pt(11)
+    bio = io.BytesIO(); d.save(bio); return bio.getvalue()
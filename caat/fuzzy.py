@@ -0,0 +1,177 @@
+"""Segunda etapa de la conciliación: emparejamiento aproximado de los no conciliados.
+
+Los candidatos salen de índices de bloqueo (nunca se comparan todos contra todos):
+
+- ``canónica``: clave sin separadores ni ceros a la izquierda (``001-001-000028642`` → ``1128642``);
+- ``numérica``: último tramo numérico de la clave (cubre la falta del prefijo de serie);
+- ``tipeo``: variantes con un carácter borrado dentro de la misma banda de monto (cubre un error de
+  digitación o una transposición; sin la banda, las numeraciones correlativas colisionan entre sí);
+- ``monto+fecha``: misma banda de monto y fecha dentro de la ventana.
+
+Cada par candidato se puntúa por similitud de clave (Levenshtein vectorizado), monto y fecha,
+y se asigna 1 a 1 de forma voraz por puntaje.
+"""
+import numpy as np
+import pandas as pd
+
+MAX_BLOQUE = 50          # bloques con más filas por lado no discriminan: se descartan
+MAX_LARGO = 32           # largo máximo de clave comparado
+
+def clave_canonica(s: pd.Series) -> pd.Series:
+    s = s.astype(str).str.upper().str.replace(r"(?<![0-9])0+(?=[0-9])", "", regex=True)
+    return s.str.replace(r"[^0-9A-Z]", "", regex=True)
+
+def tramo_numerico(s: pd.Series) -> pd.Series:
+    t = s.astype(str).str.extract(r"(\d+)\D*$", expand=False).str.lstrip("0")
+    return t.where(t.str.len() >= 3)
+
+MOTIVOS = ["canónica", "numérica", "tipeo", "monto+fecha"]
+
+def _codigos(*series) -> list:
+    """Códigos enteros comunes a varias series de texto (-1 = vacío)."""
+    codes = pd.factorize(pd.concat(series, ignore_index=True))[0]
+    return np.split(codes, np.cumsum([len(s) for s in series])[:-1])
+
+def _combinar(a, b):
+    """Código único por par (a, b); -1 si alguno de los dos falta."""
+    out = pd.factorize(a.astype(np.int64) * (int(b.max(initial=0)) + 1) + b)[0]
+    return np.where((a < 0) | (b < 0), -1, out)
+
+def _bloquear(fa, va, fb, vb, bit: int) -> pd.DataFrame:
+    """Pares (fila_a, fila_b) que comparten valor de bloque, omitiendo bloques demasiado grandes."""
+    n = int(max(va.max(initial=-1), vb.max(initial=-1))) + 1
+    ok_a, ok_b = va >= 0, vb >= 0
+    grande = (np.bincount(va[ok_a], minlength=n) > MAX_BLOQUE) | (np.bincount(vb[ok_b], minlength=n) > MAX_BLOQUE)
+    ok_a[ok_a] = ~grande[va[ok_a]]; ok_b[ok_b] = ~grande[vb[ok_b]]
+    pares = pd.DataFrame({"fila_a": fa[ok_a], "v": va[ok_a]}).merge(pd.DataFrame({"fila_b": fb[ok_b], "v": vb[ok_b]}), on="v")
+    return pares[["fila_a", "fila_b"]].drop_duplicates().assign(bit=1 << bit)
+
+def _variantes_borrado(canon: pd.Series):
+    """Cada clave canónica (4 a 24 caracteres) junto con sus variantes de un carácter borrado."""
+    c = canon[canon.str.len().between(4, 24)]
+    filas, textos = [c.index.to_numpy()], [c]
+    for i in range(int(c.str.len().max()) if len(c) else 0):
+        v = c[c.str.len() > i]
+        filas.append(v.index.to_numpy()); textos.append(v.str[:i] + v.str[i+1:])
+    return np.concatenate(filas), pd.concat(textos, ignore_index=True)
+
+def _dias(s: pd.Series) -> np.ndarray:
+    d = pd.to_datetime(s).to_numpy().astype("datetime64[D]")
+    return np.where(np.isnat(d), np.nan, d.astype(np.int64))
+
+def _rango(*arrays) -> list:
+    """Código denso común de arreglos numéricos con nulos (NaN → -1)."""
+    vals = [np.asarray(a, dtype=float) for a in arrays]
+    todos = np.concatenate(vals); u = np.unique(todos[~np.isnan(todos)])
+    return [np.where(np.isnan(v), -1, np.searchsorted(u, np.nan_to_num(v))) for v in vals]
+
+def levenshtein(a, b) -> np.ndarray:
+    """Distancia de edición (con transposición adyacente) para pares de cadenas, vectorizada sobre los pares."""
+    a = np.asarray(a, dtype=f"<U{MAX_LARGO}"); b = np.asarray(b, dtype=f"<U{MAX_LARGO}")
+    P = len(a)
+    if P == 0: return np.zeros(0, dtype=np.int32)
+    la, lb = np.char.str_len(a), np.char.str_len(b)
+    L = int(max(la.max(), lb.max(), 1))
+    A = a.view(np.uint32).reshape(P, MAX_LARGO)[:, :L]; B = b.view(np.uint32).reshape(P, MAX_LARGO)[:, :L]
+    prev = np.tile(np.arange(L + 1, dtype=np.int32), (P, 1)); prev2 = prev
+    out = prev[np.arange(P), lb].copy()          # la == 0
+    for i in range(1, L + 1):
+        cur = np.empty_like(prev); cur[:, 0] = i
+        costo = (A[:, i-1:i] != B).astype(np.int32)
+        for j in range(1, L + 1):
+            cur[:, j] = np.minimum(np.minimum(prev[:, j] + 1, cur[:, j-1] + 1), prev[:, j-1] + costo[:, j-1])
+            if i > 1 and j > 1:
+                t = (A[:, i-1] == B[:, j-2]) & (A[:, i-2] == B[:, j-1])
+                cur[:, j] = np.where(t, np.minimum(cur[:, j], prev2[:, j-2] + 1), cur[:, j])
+        fin = la == i
+        out[fin] = cur[fin, lb[fin]]
+        prev2, prev = prev, cur
+    return out
+
+def _similitud(a, b) -> np.ndarray:
+    """1 − distancia / largo mayor; 0 si falta alguna de las dos cadenas."""
+    falta = pd.isna(a) | pd.isna(b)
+    a, b = np.where(falta, "", a).astype(str), np.where(falta, "", b).astype(str)
+    largo = np.maximum(np.char.str_len(a), np.char.str_len(b)).clip(min=1)
+    sim = np.zeros(len(a)); ok = ~falta
+    sim[ok] = 1 - levenshtein(a[ok], b[ok]) / largo[ok]
+    return sim
+
+def _asignar_1a1(p: pd.DataFrame) -> pd.DataFrame:
+    p = p.sort_values("score", ascending=False, kind="stable")
+    elegidos, usados_a, usados_b = [], set(), set()
+    for _ in range(5):
+        r = p[~p["fila_a"].isin(usados_a) & ~p["fila_b"].isin(usados_b)]
+        if r.empty: break
+        r = r.drop_duplicates("fila_a").drop_duplicates("fila_b")
+        elegidos.append(r); usados_a.update(r["fila_a"]); usados_b.update(r["fila_b"])
+    return pd.concat(elegidos) if elegidos else p.head(0)
+
+COLUMNAS = ["_CLAVE__A", "_CLAVE__B", "_MONTO__A", "_MONTO__B", "_FECHA__A", "_FECHA__B",
+            "sim_clave", "sim_monto", "sim_fecha", "score", "motivo", "_fila_A", "_fila_B"]
+
+def emparejar_aproximado(solo_A: pd.DataFrame, solo_B: pd.DataFrame, ventana_dias=5, tolerancia_rel=0.01,
+                         score_min=0.8) -> pd.DataFrame:
+    """Propone pares entre filas no conciliadas de A y B (columnas ``_CLAVE_``, ``_MONTO_``, ``_FECHA_``, ``_fila_``)."""
+    if solo_A.empty or solo_B.empty: return pd.DataFrame(columns=COLUMNAS)
+    a, b = solo_A.reset_index(drop=True), solo_B.reset_index(drop=True)
+    ca, cb = clave_canonica(a["_CLAVE_"]), clave_canonica(b["_CLAVE_"])
+    con_fecha = "_FECHA_" in a.columns and "_FECHA_" in b.columns
+
+    ia, ib = np.arange(len(a)), np.arange(len(b))
+    va, vb = _codigos(ca, cb)
+    pares = [_bloquear(ia, va, ib, vb, 0)]
+    ta, tb = tramo_numerico(a["_CLAVE_"]), tramo_numerico(b["_CLAVE_"])
+    va, vb = _codigos(ta, tb)
+    pares.append(_bloquear(ia, va, ib, vb, 1))
+
+    # Bandas de monto (y de fecha): A se replica en las bandas vecinas para no perder montos
+    # o fechas que caen justo al otro lado del borde.
+    banda_a, banda_b = np.floor(a["_MONTO_"].to_numpy(dtype=float)), np.floor(b["_MONTO_"].to_numpy(dtype=float))
+    dia_a, dia_b = (_dias(a["_FECHA_"]), _dias(b["_FECHA_"])) if con_fecha else (np.zeros(len(a)), np.zeros(len(b)))
+    desp = [(d, e) for d in (-1, 0, 1) for e in ((-1, 0, 1) if con_fecha else (0,))]
+    m_b, *m_a = _rango(banda_b, *[banda_a + d for d, _ in desp])
+    f_b, *f_a = _rango(dia_b // (ventana_dias + 1), *[dia_a // (ventana_dias + 1) + e for _, e in desp])
+    comb = _combinar(np.concatenate([m_b, *m_a]), np.concatenate([f_b, *f_a]))
+    pares.append(_bloquear(np.tile(ia, len(desp)), comb[len(b):], ib, comb[:len(b)], 3))
+
+    # Tipeo: variantes de borrado dentro de la misma banda de monto.
+    fva, tva = _variantes_borrado(ca); fvb, tvb = _variantes_borrado(cb)
+    va, vb = _codigos(tva, tvb)
+    m_b, *m_a = _rango(banda_b[fvb], *[banda_a[fva] + d for d in (-1, 0, 1)])
+    comb = _combinar(np.concatenate([vb, va, va, va]), np.concatenate([m_b, *m_a]))
+    pares.append(_bloquear(np.tile(fva, 3), comb[len(vb):], fvb, comb[:len(vb)], 2))
+
+    pares = pd.concat(pares, ignore_index=True)
+    if pares.empty: return pd.DataFrame(columns=COLUMNAS)
+    pares = pares.groupby(["fila_a", "fila_b"], sort=False)["bit"].sum().reset_index()
+    etiquetas = {m: ", ".join(n for i, n in enumerate(MOTIVOS) if m >> i & 1) for m in pares["bit"].unique()}
+    fa, fb, bit = pares["fila_a"].to_numpy(), pares["fila_b"].to_numpy(), pares["bit"].to_numpy()
+    ma, mb = a["_MONTO_"].to_numpy(dtype=float)[fa], b["_MONTO_"].to_numpy(dtype=float)[fb]
+    escala = np.maximum(np.abs(ma), np.abs(mb)); escala[escala == 0] = 1
+    sim_monto = np.nan_to_num(1 - np.abs(ma - mb) / escala / max(tolerancia_rel * 10, 1e-9)).clip(0, 1)
+    if con_fecha:
+        dias = np.abs(dia_a[fa] - dia_b[fb])
+        sim_fecha = np.nan_to_num(1 - dias / (ventana_dias + 1), nan=0.5).clip(0, 1)
+        pesos = (0.5, 0.3, 0.2)
+        # En el bloque monto+fecha la fecha es condición, no solo puntaje.
+        ok = (bit != 1 << 3) | (dias <= ventana_dias)
+    else:
+        sim_fecha, pesos, ok = np.full(len(fa), np.nan), (0.6, 0.4, 0.0), np.ones(len(fa), dtype=bool)
+    resto = pesos[1] * sim_monto + pesos[2] * np.nan_to_num(sim_fecha)
+    # La distancia de edición solo se calcula donde una clave idéntica alcanzaría el puntaje mínimo.
+    ok &= resto + pesos[0] >= score_min
+    fa, fb, bit, ma, mb, sim_monto, sim_fecha, resto = (x[ok] for x in (fa, fb, bit, ma, mb, sim_monto, sim_fecha, resto))
+    sim_clave = np.maximum(_similitud(ca.to_numpy()[fa], cb.to_numpy()[fb]),
+                           _similitud(ta.to_numpy()[fa], tb.to_numpy()[fb]))
+    out = pd.DataFrame({"_CLAVE__A": a["_CLAVE_"].to_numpy()[fa], "_CLAVE__B": b["_CLAVE_"].to_numpy()[fb],
+                        "_MONTO__A": ma, "_MONTO__B": mb,
+                        "_FECHA__A": a["_FECHA_"].to_numpy()[fa] if con_fecha else pd.NaT,
+                        "_FECHA__B": b["_FECHA_"].to_numpy()[fb] if con_fecha else pd.NaT,
+                        "sim_clave": sim_clave.round(3), "sim_monto": sim_monto.round(3), "sim_fecha": sim_fecha.round(3),
+                        "score": (pesos[0] * sim_clave + resto).round(3),
+                        "motivo": pd.Series(bit).map(etiquetas).to_numpy(),
+                        "_fila_A": a["_fila_"].to_numpy()[fa], "_fila_B": b["_fila_"].to_numpy()[fb],
+                        "fila_a": fa, "fila_b": fb})
+    out = _asignar_1a1(out[out["score"] >= score_min])
+    return out.sort_values("score", ascending=False)[COLUMNAS].reset_index(drop=True)
@@ -0,0 +1,218 @@
+"""Conciliación incremental contra un índice local persistente (SQLite).
+
+El índice guarda, por clave normalizada, el estado de cada lado (filas, suma de montos, fecha
+mínima) y el resultado de la última conciliación de esa clave. Cada carga trae solo las filas
+nuevas o modificadas: una clave presente en la carga reemplaza lo que el índice tenía para ese
+lado (volver a cargar el mismo archivo no cambia nada) y solo las claves tocadas se vuelven a
+conciliar, con una búsqueda por clave primaria. Las partidas abiertas de corridas anteriores se
+informan con su antigüedad; el costo de una corrida depende de la carga y de las abiertas, no
+del histórico acumulado.
+"""
+import os, re, sqlite3, time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from .conciliacion import _lado, _unidades_agregar
+from .perf import etapa
+
+DEFAULT_DIR = os.environ.get("CAAT_INDICES_DIR") or os.path.join(os.path.expanduser("~"), ".caat", "indices")
+ESTADOS = {"conciliada": "Conciliada", "solo_A": "Solo en A", "solo_B": "Solo en B", "diferencia": "Diferencia de monto"}
+COLUMNAS = ["clave", "n_A", "monto_A", "fecha_A", "n_B", "monto_B", "fecha_B", "estado", "desde", "corrida"]
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS claves (
+    clave TEXT PRIMARY KEY, n_A INTEGER NOT NULL, monto_A REAL, fecha_A INTEGER,
+    n_B INTEGER NOT NULL, monto_B REAL, fecha_B INTEGER,
+    estado TEXT NOT NULL, desde INTEGER NOT NULL, corrida INTEGER NOT NULL) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS claves_abiertas ON claves(estado) WHERE estado <> 'conciliada';
+CREATE TABLE IF NOT EXISTS corridas (
+    id INTEGER PRIMARY KEY, ts TEXT NOT NULL, filas_A INTEGER, filas_B INTEGER, claves INTEGER,
+    resueltas INTEGER, abiertas_nuevas INTEGER, abiertas INTEGER);
+CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT);
+"""
+
+class IndiceConciliacion:
+    """Índice persistente de una pareja de sistemas A/B (un archivo SQLite por nombre)."""
+    def __init__(self, nombre: str, carpeta=DEFAULT_DIR):
+        self.nombre = re.sub(r"[^\w.-]+", "_", nombre.strip()) or "conciliacion"
+        self.ruta = os.path.join(carpeta, f"{self.nombre}.sqlite")
+        os.makedirs(carpeta, exist_ok=True)
+        self.con = sqlite3.connect(self.ruta)
+        self.con.execute("PRAGMA journal_mode=WAL"); self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript(_ESQUEMA)
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close(); return False
+    def close(self): self.con.close()
+
+    def meta(self, k, defecto=None):
+        fila = self.con.execute("SELECT v FROM meta WHERE k = ?", (k,)).fetchone()
+        return defecto if fila is None else fila[0]
+
+    def resumen(self) -> dict:
+        # total de claves desde meta y abiertas por el índice parcial: ninguna consulta recorre el histórico
+        claves = int(self.meta("claves", 0))
+        abiertas = self.con.execute("SELECT COUNT(*) FROM claves WHERE estado <> 'conciliada'").fetchone()[0]
+        ultima = self.con.execute("SELECT id, ts FROM corridas ORDER BY id DESC LIMIT 1").fetchone()
+        return {"claves": claves, "abiertas": abiertas, "corridas": ultima[0] if ultima else 0,
+                "ultima": ultima[1] if ultima else None, "tolerancia": self.meta("tolerancia")}
+
+    def historial(self) -> pd.DataFrame:
+        return pd.read_sql_query("SELECT * FROM corridas ORDER BY id", self.con)
+
+    def reiniciar(self):
+        with self.con: self.con.executescript("DELETE FROM claves; DELETE FROM corridas; DELETE FROM meta;")
+
+def _por_clave(lado) -> pd.DataFrame:
+    """Una fila por clave de la carga: N, suma de montos y fecha mínima (las claves repetidas se suman).
+
+    Las filas sin clave no pueden seguirse entre corridas: quedan fuera del índice (se informan aparte)."""
+    ok = lado["clave"].notna().to_numpy()
+    if not ok.all(): lado = {k: (v[ok] if k in ("clave", "monto", "fecha") and v is not None else v) for k, v in lado.items()}
+    codes, uniques = pd.factorize(lado["clave"])
+    u = _unidades_agregar(codes, lado, len(uniques))
+    fecha = None if u["fecha"] is None else pd.to_datetime(u["fecha"]).as_unit("ns").asi8.astype(float)
+    if fecha is not None: fecha[np.isnat(u["fecha"])] = np.nan
+    return pd.DataFrame({"n": np.bincount(codes, minlength=len(uniques))[u["code"]], "monto": u["monto"], "fecha": fecha},
+                        index=pd.Index(np.asarray(uniques[u["code"]], dtype=object), name="clave"))
+
+def _sql(df: pd.DataFrame) -> list:
+    """Filas como tuplas de tipos de Python, con ``None`` en lugar de NaN."""
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+def _fechas(ns) -> pd.Series:
+    return pd.to_datetime(pd.Series(ns, dtype="Float64").astype("Int64"), unit="ns")
+
+def _tabla(df: pd.DataFrame, ts: dict) -> pd.DataFrame:
+    """Vista de auditoría de filas del índice (``desde`` → fecha de la corrida en que se abrió)."""
+    out = pd.DataFrame({"_CLAVE_": df["clave"].to_numpy(), "Estado": df["estado"].map(ESTADOS).to_numpy(),
+                        "_MONTO__A": df["monto_A"].to_numpy(dtype=float), "_MONTO__B": df["monto_B"].to_numpy(dtype=float)})
+    out["_diff_monto"] = (out["_MONTO__A"].fillna(0) - out["_MONTO__B"].fillna(0)).round(2)
+    out["_FECHA__A"], out["_FECHA__B"] = _fechas(df["fecha_A"]).to_numpy(), _fechas(df["fecha_B"]).to_numpy()
+    out["n_A"], out["n_B"] = df["n_A"].to_numpy(), df["n_B"].to_numpy()
+    if "previo" in df.columns: out.insert(2, "Estado anterior", df["previo"].map(ESTADOS).to_numpy())
+    out["Corrida apertura"] = df["desde"].to_numpy(dtype=np.int64)
+    out["Abierta desde"] = pd.to_datetime(df["desde"].map(ts)).to_numpy()
+    return out
+
+def conciliar_incremental(indice: IndiceConciliacion, A, B, clave, monto_A, monto_B, fecha_A=None, fecha_B=None,
+                          tolerancia=0.0, clave_B=None) -> dict:
+    """Aplica la carga del día (``A`` y/o ``B``, cualquiera puede ser ``None``) al índice y la concilia.
+
+    Devuelve las partidas resueltas en esta corrida, las abiertas nuevas (incluidas las reabiertas)
+    y las abiertas que vienen de corridas anteriores, tocadas o no por la carga.
+    """
+    t0 = time.perf_counter()
+    tol_previa = indice.meta("tolerancia")
+    if tol_previa is not None and float(tol_previa) != float(tolerancia):
+        raise ValueError(f"El índice '{indice.nombre}' se concilia con tolerancia {float(tol_previa):,.2f}; "
+                         "use la misma o reinicie el índice.")
+    with etapa("coerción", sum(len(x) for x in (A, B) if x is not None)):
+        lados = {k: _lado(df, c, m, f) for k, df, c, m, f in (("A", A, clave, monto_A, fecha_A),
+                                                             ("B", B, clave_B or clave, monto_B, fecha_B)) if df is not None}
+    with etapa("agregado por clave"):
+        carga = {k: _por_clave(l) for k, l in lados.items()}
+    sin_clave = {k: int(l["clave"].isna().sum()) for k, l in lados.items()}
+    tocadas = pd.Index([]).append([c.index for c in carga.values()]).unique() if carga else pd.Index([])
+
+    con = indice.con
+    with con:
+        with etapa("lectura del índice", len(tocadas)):
+            con.execute("CREATE TEMP TABLE IF NOT EXISTS tocadas (clave TEXT PRIMARY KEY) WITHOUT ROWID")
+            con.execute("DELETE FROM tocadas")
+            con.executemany("INSERT INTO tocadas VALUES (?)", zip(tocadas.to_numpy(dtype=object)))
+            previo = pd.DataFrame(con.execute(f"SELECT {', '.join('c.' + c for c in COLUMNAS)} FROM claves c "
+                                              "JOIN tocadas t USING (clave)").fetchall(), columns=COLUMNAS)
+        corrida = (con.execute("SELECT COALESCE(MAX(id), 0) FROM corridas").fetchone()[0]) + 1
+        ts = datetime.now().isoformat(timespec="seconds")
+
+        with etapa("conciliación de claves tocadas", len(tocadas)):
+            nuevo = previo.set_index("clave").reindex(tocadas)
+            for lado, agg in carga.items():     # la carga reemplaza el estado de ese lado para sus claves
+                pos = agg.index.get_indexer(nuevo.index); en = pos >= 0
+                nuevo.loc[en, [f"n_{lado}", f"monto_{lado}", f"fecha_{lado}"]] = agg[["n", "monto", "fecha"]].to_numpy()[pos[en]]
+            n_a, n_b = nuevo["n_A"].fillna(0).to_numpy(dtype=float), nuevo["n_B"].fillna(0).to_numpy(dtype=float)
+            dif = np.abs(nuevo["monto_A"].to_numpy(dtype=float) - nuevo["monto_B"].to_numpy(dtype=float))
+            ambos = (n_a > 0) & (n_b > 0)
+            estado = np.select([ambos & (dif <= tolerancia), ambos, n_a > 0], ["conciliada", "diferencia", "solo_A"], "solo_B")
+            antes = nuevo["estado"].to_numpy(dtype=object)
+            abierto_antes = pd.notna(antes) & (antes != "conciliada")
+            # "desde" marca la corrida en que la clave se abrió (o concilió); pasar de un estado abierto a otro no la reinicia
+            reinicia = pd.isna(antes) | (abierto_antes != (estado != "conciliada"))
+            nuevo["previo"], nuevo["desde_previo"] = antes, nuevo["desde"]
+            nuevo["estado"] = estado
+            nuevo["desde"] = np.where(reinicia, corrida, nuevo["desde"]).astype(np.int64)
+            nuevo["corrida"] = corrida
+            nuevo["n_A"], nuevo["n_B"] = n_a.astype(np.int64), n_b.astype(np.int64)
+            nuevo = nuevo.reset_index(names="clave")
+
+        resueltas = nuevo[abierto_antes & (estado == "conciliada")]
+        resueltas = resueltas.assign(desde=resueltas["desde_previo"].astype(np.int64))   # abierta desde
+        abiertas_nuevas = nuevo[~abierto_antes & (estado != "conciliada")]
+        siguen = nuevo[abierto_antes & (estado != "conciliada")]
+
+        with etapa("escritura del índice", len(nuevo)):
+            con.executemany(f"INSERT OR REPLACE INTO claves ({', '.join(COLUMNAS)}) VALUES ({', '.join('?' * len(COLUMNAS))})",
+                            _sql(nuevo[COLUMNAS]))
+            arrastradas = pd.DataFrame(con.execute(
+                f"SELECT {', '.join(COLUMNAS)} FROM claves WHERE estado <> 'conciliada' "
+                "AND clave NOT IN (SELECT clave FROM tocadas)").fetchall(), columns=COLUMNAS)
+            abiertas = len(abiertas_nuevas) + len(siguen) + len(arrastradas)
+            con.execute("INSERT INTO corridas VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (corrida, ts, len(A) if A is not None else 0, len(B) if B is not None else 0, len(tocadas),
+                         len(resueltas), len(abiertas_nuevas), abiertas))
+            claves_indice = int(indice.meta("claves", 0)) + len(nuevo) - len(previo)
+            con.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                            [("tolerancia", str(float(tolerancia))), ("claves", str(claves_indice))])
+        fechas_corrida = dict(con.execute("SELECT id, ts FROM corridas").fetchall())
+
+    anteriores = pd.concat([siguen.drop(columns=["previo", "desde_previo"]), arrastradas], ignore_index=True)
+    anteriores = _tabla(anteriores, fechas_corrida).sort_values("Corrida apertura", kind="stable")
+    anteriores.insert(2, "Tocada hoy", np.r_[np.ones(len(siguen), bool), np.zeros(len(arrastradas), bool)][anteriores.index])
+    return {"corrida": corrida, "ts": ts, "indice": indice.nombre, "ruta": indice.ruta, "tolerancia": tolerancia,
+            "filas_A": len(A) if A is not None else 0, "filas_B": len(B) if B is not None else 0,
+            "claves_tocadas": len(tocadas), "sin_clave": sin_clave, "conciliadas_nuevas": int(((estado == "conciliada") & pd.isna(antes)).sum()),
+            "reabiertas": int(((antes == "conciliada") & (estado != "conciliada")).sum()),
+            "resueltas": _tabla(resueltas, fechas_corrida), "abiertas_nuevas": _tabla(abiertas_nuevas, fechas_corrida),
+            "abiertas_anteriores": anteriores.reset_index(drop=True), "abiertas": abiertas,
+            "claves_indice": claves_indice, "historial": indice.historial(),
+            "segundos": round(time.perf_counter() - t0, 3)}
+
+def incremental_sheets(r: dict) -> dict:
+    resumen = pd.DataFrame({
+        "Métrica": ["Índice", "Corrida", "Fecha", "Filas A", "Filas B", "Claves tocadas", "Resueltas (antes abiertas)",
+                    "Conciliadas nuevas", "Abiertas nuevas", "Reabiertas", "Abiertas de corridas anteriores",
+                    "Abiertas en total", "Claves en el índice", "Filas sin clave (fuera del índice)", "Tolerancia"],
+        "Valor": [r["indice"], r["corrida"], r["ts"], r["filas_A"], r["filas_B"], r["claves_tocadas"], len(r["resueltas"]),
+                  r["conciliadas_nuevas"], len(r["abiertas_nuevas"]), r["reabiertas"], len(r["abiertas_anteriores"]),
+                  r["abiertas"], r["claves_indice"], " | ".join(f"{k}: {n}" for k, n in r["sin_clave"].items()),
+                  f"{r['tolerancia']:,.2f}"]})
+    return {"Resumen": resumen, "Resueltas": r["resueltas"], "Abiertas_Nuevas": r["abiertas_nuevas"],
+            "Abiertas_Anteriores": r["abiertas_anteriores"], "Historial": r["historial"]}
+
+def incremental_sections(r: dict, nombre_a: str, nombre_b: str) -> list:
+    ant = r["abiertas_anteriores"]
+    por_estado = ant["Estado"].value_counts() if len(ant) else pd.Series(dtype=int)
+    bullets = [
+        f"Índice: {r['indice']} | Corrida n.º {r['corrida']} ({r['ts']})",
+        f"Carga A: {nombre_a} ({r['filas_A']} filas) | Carga B: {nombre_b} ({r['filas_B']} filas)",
+        f"Claves tocadas: {r['claves_tocadas']} | Conciliadas nuevas: {r['conciliadas_nuevas']}",
+        f"Resueltas en esta corrida (abiertas en corridas anteriores): {len(r['resueltas'])}",
+        f"Abiertas nuevas: {len(r['abiertas_nuevas'])} (reabiertas: {r['reabiertas']})",
+        f"Abiertas de corridas anteriores: {len(ant)}"
+        + (" (" + ", ".join(f"{k}: {v}" for k, v in por_estado.items()) + ")" if len(por_estado) else ""),
+        f"Abiertas en total: {r['abiertas']} | Claves en el índice: {r['claves_indice']} | Tolerancia: {r['tolerancia']:,.2f}",
+    ]
+    sin_clave = {k: n for k, n in r["sin_clave"].items() if n}
+    if sin_clave: bullets.append("Filas sin clave (no se siguen entre corridas): " + " | ".join(f"{k}: {n}" for k, n in sin_clave.items()))
+    antiguas = [f"• {t['_CLAVE_']}: {t['Estado']} desde {t['Abierta desde']:%Y-%m-%d} | A={t['_MONTO__A']:,.2f} | B={t['_MONTO__B']:,.2f}"
+                for _, t in ant.head(10).iterrows()] or ["• No hay partidas abiertas de corridas anteriores."]
+    rec = [
+        "Priorizar las partidas abiertas más antiguas: su antigüedad indica fallas de interfaz o de corte.",
+        "Confirmar con soporte documental las resueltas que cambiaron de monto respecto de la corrida anterior.",
+        "Investigar las reabiertas: una clave conciliada que vuelve a abrirse implica una modificación posterior en A o B.",
+    ]
+    return [("RESUMEN", [f"• {x}" for x in bullets]),
+            ("ABIERTAS MÁS ANTIGUAS", antiguas),
+            ("RECOMENDACIONES", [f"• {x}" for x in rec]),
+            ("REFERENCIA XLSX", ["• 'conciliacion_incremental.xlsx' (Resumen, Resueltas, Abiertas_Nuevas, Abiertas_Anteriores, Historial)."])]
@@ -0,0 +1,341 @@
+"""Detección de montos inusuales: versión en memoria y versión streaming (por bloques).
+
+Ambas devuelven el mismo diccionario de resultados, de modo que la interfaz y los
+entregables (XLSX/DOCX) no distinguen cómo se calculó.
+"""
+import numpy as np
+import pandas as pd
+from .coerce import as_amount, convertir_fechas, formato_columna
+from .perf import etapa
+
+TOP_N = 20
+METODOS = {"fijo": "Umbral fijo", "estadistico": "media + k·σ", "mediana_mad": "mediana + k·MAD",
+           "iqr": "Q3 + k·IQR"}
+PERIODOS = {"M": "mes", "Q": "trimestre"}
+PERIODOS_PLURAL = {"M": "meses", "Q": "trimestres"}
+MIN_GRUPO = 10           # grupos más chicos se evalúan con el umbral global del mismo método
+MAD_A_SIGMA = 1.4826     # MAD → σ bajo normalidad
+MEANAD_A_SIGMA = 1.2533  # desvío absoluto medio → σ, si el MAD del grupo es 0
+IQR_A_SIGMA = 1.349
+
+def _criterio(metodo, umbral, k, media, std):
+    if metodo == "fijo": return umbral, f"Umbral fijo = {umbral:,.2f}"
+    limite = media + k*std
+    return limite, f"Umbral estadístico = media {media:,.2f} + {k}·σ {std:,.2f} → {limite:,.2f}"
+
+# ------------------- Umbrales por grupo -------------------
+def _estadisticos(x: np.ndarray, cod: np.ndarray, n_grupos: int, metodo: str, k) -> dict:
+    """Centro, σ (o su equivalente robusto), límite y N de cada grupo ``0..n_grupos-1``.
+
+    Cada estadístico es un ``groupby`` sobre los códigos (sin recorrer grupos en Python); como
+    agrupador va una categórica armada con los códigos, para que pandas no los vuelva a factorizar.
+    El resultado se indexa por código para repartirlo luego a las filas con ``take``.
+    """
+    clave = pd.Categorical.from_codes(cod, categories=pd.RangeIndex(n_grupos))
+    agrupar = lambda v: pd.Series(v).groupby(clave, observed=False)
+    g = agrupar(x)
+    n = np.bincount(cod, minlength=n_grupos)
+    if metodo == "estadistico":
+        centro = np.bincount(cod, weights=x, minlength=n_grupos) / np.maximum(n, 1)
+        sigma = g.std(ddof=0).to_numpy()
+        return {"n": n, "centro": centro, "sigma": sigma, "limite": centro + k*sigma}
+    centro = g.median().to_numpy()
+    if metodo == "mediana_mad":
+        desv = np.abs(x - centro[cod])
+        mad_g = agrupar(desv).median().to_numpy()
+        media_desv = np.bincount(cod, weights=desv, minlength=n_grupos) / np.maximum(n, 1)
+        sigma = np.where(mad_g > 0, MAD_A_SIGMA * mad_g, MEANAD_A_SIGMA * media_desv)
+        return {"n": n, "centro": centro, "sigma": sigma, "limite": centro + k*sigma}
+    q1, q3 = g.quantile(0.25).to_numpy(), g.quantile(0.75).to_numpy()
+    return {"n": n, "centro": centro, "sigma": (q3 - q1) / IQR_A_SIGMA, "limite": q3 + k*(q3 - q1)}
+
+def _ventanas(gcod: np.ndarray, pcod: np.ndarray, ventana: int):
+    """Filas replicadas y clave (grupo, periodo final) de cada ventana móvil de ``ventana`` periodos.
+
+    Una fila del periodo ``p`` cuenta en las ventanas que terminan en ``p … p+ventana-1``; las
+    primeras ``len(gcod)`` entradas son la ventana propia de cada fila. Sin fecha (``pcod`` < 0)
+    la fila forma un bloque aparte que no se desplaza.
+    """
+    m = int(pcod.max(initial=0)) + ventana + 1
+    clave = gcod.astype(np.int64) * m + np.where(pcod < 0, m - 1, pcod)
+    con_fecha = np.flatnonzero(pcod >= 0)
+    filas = np.concatenate([np.arange(len(gcod)), *([con_fecha] * (ventana - 1))])
+    claves = np.concatenate([clave, *(clave[con_fecha] + d for d in range(1, ventana))])
+    return filas, claves
+
+def umbrales_por_grupo(x, metodo="mediana_mad", k=2, grupo=None, fechas=None, periodo=None, ventana=1,
+                       min_grupo=MIN_GRUPO) -> dict:
+    """Límite por fila según las estadísticas de su grupo, para todos los grupos a la vez.
+
+    El grupo es ``grupo`` (ID), el periodo (``fechas`` → ``"M"``/``"Q"``) o ambos; con ``ventana`` > 1
+    las estadísticas de cada periodo cubren también los ``ventana-1`` anteriores. Los grupos con
+    menos de ``min_grupo`` filas usan el umbral global del mismo método. Devuelve arreglos
+    alineados con ``x`` y el resumen para el criterio.
+    """
+    x = np.asarray(x, dtype=float)
+    gcod = np.zeros(len(x), dtype=np.int64)
+    if grupo is not None: gcod = np.where((c := pd.factorize(grupo)[0]) < 0, c.max(initial=-1) + 1, c)
+    if periodo is not None:
+        ordinal = fechas.dt.to_period(periodo).array.asi8
+        nat = fechas.isna().to_numpy()
+        pcod = np.where(nat, -1, ordinal - (ordinal[~nat].min() if (~nat).any() else 0))
+    else: pcod, ventana = np.zeros(len(x), dtype=np.int64), 1
+    if periodo is None:         # los códigos del ID ya son densos: no hace falta otra factorización
+        filas, cod, n_cod = np.arange(len(x)), gcod, int(gcod.max(initial=-1)) + 1
+    else:
+        filas, claves = _ventanas(gcod, pcod, max(int(ventana), 1))
+        cod, uni = pd.factorize(claves); n_cod = len(uni)
+    por_cod = _estadisticos(x[filas], cod, n_cod, metodo, k)
+    propio = cod[:len(x)]
+    est = {c: v[propio] for c, v in por_cod.items()}
+    chico = est["n"] < min_grupo
+    if chico.any():
+        glob = _estadisticos(x, np.zeros(len(x), dtype=np.int64), 1, metodo, k)
+        for c in ("centro", "sigma", "limite"): est[c] = np.where(chico, glob[c][0], est[c])
+    usados = np.bincount(propio, minlength=n_cod) > 0      # ventanas que terminan en un periodo con filas
+    est["global"] = chico
+    est["n_grupos"] = int(usados.sum())
+    est["grupos_chicos"] = int((usados & (por_cod["n"] < min_grupo)).sum())
+    return est
+
+def _criterio_grupo(metodo, k, col_id, periodo, ventana, min_grupo, est):
+    if not (col_id or periodo):
+        return f"Umbral robusto = {METODOS[metodo]} (k={k}) → {est['limite'][0] if len(est['limite']) else np.nan:,.2f}"
+    por = " y ".join(x for x in (col_id, PERIODOS.get(periodo)) if x)
+    if periodo and ventana > 1: por += f" (ventana móvil de {ventana} {PERIODOS_PLURAL[periodo]})"
+    return (f"Umbral por {por} = {METODOS[metodo]} (k={k}) · {est['n_grupos']:,} grupos; "
+            f"{est['grupos_chicos']:,} con < {min_grupo} filas usan el umbral global")
+
+def _resultado(hall, total_tx, suma_total, media, std, limite, criterio_txt, fecha_min, fecha_max,
+               top_monto=None, grp=None, col_id=None, fechas_nc=(0, 0), lineas_omitidas=()):
+    sd = std or 1.0
+    por_grupo = "_CENTRO_GRUPO_" in hall.columns
+    if por_grupo: hall["_zscore_"] = (hall["_MONTO_"] - hall["_CENTRO_GRUPO_"]) / hall["_SIGMA_GRUPO_"].where(hall["_SIGMA_GRUPO_"] > 0)
+    else: hall["_zscore_"] = (hall["_MONTO_"] - media) / sd
+    if top_monto is None: top_monto = hall.sort_values("_MONTO_", ascending=False).head(TOP_N)
+    else: top_monto = top_monto.assign(_zscore_=(top_monto["_MONTO_"] - media) / sd)
+    # Con σ global el orden por z-score coincide con el orden por monto; por grupo, no.
+    top_z = hall.nlargest(TOP_N, "_zscore_") if por_grupo else top_monto.sort_values("_zscore_", ascending=False)
+    if grp is None:
+        grp = pd.DataFrame()
+        if col_id is not None and col_id in hall.columns:
+            grp = hall.groupby(col_id, dropna=False, observed=True).agg(N=("_MONTO_","count"), Suma=("_MONTO_","sum"), Max=("_MONTO_","max"))
+    grp = grp.sort_values("Suma", ascending=False) if not grp.empty else grp
+    total_h = len(hall)
+    return {"hall": hall, "total_tx": total_tx, "total_h": total_h,
+            "prop_h": (total_h/total_tx) if total_tx else 0.0,
+            "suma_total": suma_total, "suma_h": hall["_MONTO_"].sum(),
+            "media": media, "std": std, "limite": limite, "criterio_txt": criterio_txt,
+            "top_monto": top_monto, "top_z": top_z, "grp": grp.head(TOP_N),
+            "top_id": grp["Suma"].head(5) if not grp.empty else pd.Series(dtype=float),
+            "fecha_min": fecha_min, "fecha_max": fecha_max,
+            "fecha_no_convertible": fechas_nc[0],
+            "prop_fecha_no_convertible": (fechas_nc[0]/fechas_nc[1]) if fechas_nc[1] else 0.0,
+            "lineas_omitidas": len(lineas_omitidas), "lineas_omitidas_detalle": list(lineas_omitidas)[:20]}
+
+def detectar_montos(df, col_monto, metodo="fijo", umbral=10000.0, k=2, col_id=None, col_fecha=None,
+                    por_id=False, periodo=None, ventana=1, min_grupo=MIN_GRUPO) -> dict:
+    """Detección en memoria: solo se leen las columnas de monto/fecha y solo se copian las filas que superan el límite.
+
+    ``mediana_mad``/``iqr``, o ``estadistico`` con ``por_id`` (grupo = ``col_id``) y/o ``periodo``
+    (``"M"``/``"Q"`` sobre ``col_fecha``, con ``ventana`` periodos móviles), fijan un límite por grupo
+    con ``umbrales_por_grupo``; las estadísticas del grupo de cada hallazgo quedan en sus columnas.
+    """
+    if metodo not in METODOS: raise ValueError(f"Método desconocido: {metodo}")
+    agrupado = metodo in ("mediana_mad", "iqr") or por_id or periodo is not None
+    if agrupado and metodo == "fijo": raise ValueError("El umbral fijo no se calcula por grupo.")
+    if por_id and col_id is None: raise ValueError("Indique la columna identificadora para calcular el umbral por ID.")
+    if periodo is not None and col_fecha is None: raise ValueError("Indique la columna de fecha para calcular el umbral por periodo.")
+    with etapa("coerción de monto", len(df)): monto = as_amount(df[col_monto])
+    valido = monto.notna()
+    base = monto[valido]
+    media, std = base.mean(), base.std(ddof=0)
+    conv = None
+    if col_fecha is not None:
+        with etapa("coerción de fecha", int(valido.sum())): conv = convertir_fechas(df.loc[valido, col_fecha])
+    if not agrupado:
+        limite, criterio_txt = _criterio(metodo, umbral, k, media, std)
+        sel = valido & (monto > limite)
+    else:
+        with etapa("umbrales por grupo", len(base)):
+            est = umbrales_por_grupo(base.to_numpy(), metodo, k, grupo=df.loc[valido, col_id] if por_id else None,
+                                     fechas=conv["fechas"] if periodo else None, periodo=periodo, ventana=ventana,
+                                     min_grupo=min_grupo)
+        limite, criterio_txt = None, _criterio_grupo(metodo, k, col_id if por_id else None, periodo, ventana, min_grupo, est)
+        marca = base.to_numpy() > est["limite"]
+        sel = np.zeros(len(df), dtype=bool); sel[np.flatnonzero(valido.to_numpy())[marca]] = True
+        sel = pd.Series(sel, index=df.index)
+    hall = df.loc[sel].copy(deep=False)     # .loc ya copió las filas elegidas
+    hall["_MONTO_"] = monto[sel]
+    if agrupado:
+        hall["_N_GRUPO_"] = est["n"][marca]
+        hall["_CENTRO_GRUPO_"], hall["_SIGMA_GRUPO_"] = est["centro"][marca], est["sigma"][marca]
+        hall["_LIMITE_"] = est["limite"][marca]
+        hall["_REFERENCIA_"] = np.where(est["global"][marca], f"global (grupo < {min_grupo})", "grupo")
+    fecha_min = fecha_max = None; fechas_nc = (0, 0)
+    if conv is not None:
+        fechas = conv["fechas"]
+        hall["_FECHA_"] = fechas[sel[valido]]
+        if periodo is not None:     # solo los periodos distintos pasan a texto
+            cod_p, uni_p = pd.factorize(hall["_FECHA_"].dt.to_period(periodo))
+            hall["_PERIODO_"] = np.append(np.asarray(uni_p.astype(str), dtype=object), None)[cod_p]
+        fecha_min, fecha_max = fechas.min(), fechas.max()
+        fechas_nc = (conv["no_convertibles"], conv["informadas"])
+    return _resultado(hall, int(valido.sum()), base.sum(), media, std, limite, criterio_txt,
+                      fecha_min, fecha_max, col_id=col_id, fechas_nc=fechas_nc)
+
+# ------------------- Modo streaming -------------------
+class RunningStats:
+    """Media y varianza acumuladas (Welford, combinando bloques con la fórmula de Chan)."""
+    def __init__(self): self.n, self.mean, self.m2, self.total = 0, 0.0, 0.0, 0.0
+
+    def update(self, x: np.ndarray):
+        nb = x.size
+        if nb == 0: return
+        mb = float(x.mean()); m2b = float(((x - mb) ** 2).sum())
+        n = self.n + nb; delta = mb - self.mean
+        self.mean += delta * nb / n
+        self.m2 += m2b + delta * delta * self.n * nb / n
+        self.n = n; self.total += float(x.sum())
+
+    @property
+    def std(self) -> float: return (self.m2 / self.n) ** 0.5 if self.n else np.nan
+
+    @property
+    def media(self) -> float: return self.mean if self.n else np.nan
+
+class TopK:
+    """Las ``n`` filas con mayor valor en ``col``, mantenidas bloque a bloque."""
+    def __init__(self, col, n=TOP_N): self.col, self.n, self.df = col, n, None
+
+    def push(self, frame: pd.DataFrame):
+        if frame.empty: return
+        cand = frame.nlargest(self.n, self.col)
+        self.df = cand if self.df is None else pd.concat([self.df, cand]).nlargest(self.n, self.col)
+
+class GroupAgg:
+    """Agregados N/Suma/Max por ID sobre los hallazgos, acumulados por bloque."""
+    def __init__(self, col): self.col, self.df = col, None
+
+    def push(self, frame: pd.DataFrame):
+        if frame.empty: return
+        g = frame.groupby(self.col, dropna=False, observed=True)["_MONTO_"].agg(N="count", Suma="sum", Max="max")
+        if self.df is None: self.df = g; return
+        both = pd.concat([self.df, g])
+        self.df = both.groupby(level=0, dropna=False, observed=True).agg({"N": "sum", "Suma": "sum", "Max": "max"})
+
+def detectar_montos_streaming(chunks, col_monto, metodo="fijo", umbral=10000.0, k=2,
+                              col_id=None, col_fecha=None) -> dict:
+    """Detección por bloques con memoria acotada.
+
+    ``chunks(usecols=None)`` debe devolver un iterador nuevo de DataFrames en cada llamada.
+    Con umbral fijo basta una pasada; con media + k·σ la primera pasada solo lee las
+    columnas de monto/fecha y la segunda emite las filas que superan el límite. Los umbrales por
+    grupo o robustos (mediana, cuartiles) necesitan la columna entera y no se ofrecen aquí.
+    """
+    if metodo not in ("fijo", "estadistico"): raise ValueError(f"El método '{METODOS.get(metodo, metodo)}' no está disponible en modo streaming.")
+    stats, top = RunningStats(), TopK("_MONTO_")
+    grp = GroupAgg(col_id) if col_id is not None else None
+    hall, fmin, fmax, fechas_nc, omitidas = [], [], [], [0, 0], []
+    formato = {}     # los formatos de monto y de fecha se infieren del primer bloque y valen para todos
+
+    def prepare(chunk):
+        s = chunk[col_monto]
+        if "fmt" not in formato: formato["fmt"] = None if pd.api.types.is_numeric_dtype(s) else formato_columna(s)
+        monto = as_amount(s, formato["fmt"]); valido = monto.notna()
+        if col_fecha is None: return monto, valido, None
+        conv = convertir_fechas(chunk.loc[valido, col_fecha], formato.get("fechas"))
+        if conv["formatos"]: formato.setdefault("fechas", conv["formatos"])
+        return monto, valido, conv
+
+    def observe(monto, valido, conv):
+        stats.update(monto[valido].to_numpy(dtype=float))
+        if conv is None: return
+        fechas = conv["fechas"]
+        fechas_nc[0] += conv["no_convertibles"]; fechas_nc[1] += conv["informadas"]
+        if fechas.notna().any(): fmin.append(fechas.min()); fmax.append(fechas.max())
+
+    def emit(chunk, monto, valido, conv, limite):
+        sel = valido & (monto > limite)
+        if not sel.any(): return
+        h = chunk.loc[sel].copy(deep=False); h["_MONTO_"] = monto[sel]
+        if conv is not None: h["_FECHA_"] = conv["fechas"][sel[valido]]
+        hall.append(h); top.push(h)
+        if grp is not None: grp.push(h)
+
+    columnas = []
+    if metodo == "fijo":
+        for chunk in chunks():
+            columnas = list(chunk.columns); omitidas += chunk.attrs.get("lineas_omitidas", [])
+            monto, valido, conv = prepare(chunk)
+            observe(monto, valido, conv); emit(chunk, monto, valido, conv, umbral)
+        limite, criterio_txt = _criterio(metodo, umbral, k, stats.media, stats.std)
+    else:
+        needed = [c for c in (col_monto, col_fecha) if c is not None]
+        for chunk in chunks(usecols=needed):
+            omitidas += chunk.attrs.get("lineas_omitidas", []); observe(*prepare(chunk))
+        limite, criterio_txt = _criterio(metodo, umbral, k, stats.media, stats.std)
+        for chunk in chunks():
+            # Con usecols el motor C puede aceptar una línea que con todas las columnas rechaza: se juntan ambas pasadas.
+            columnas = list(chunk.columns); omitidas += chunk.attrs.get("lineas_omitidas", [])
+            emit(chunk, *prepare(chunk), limite)
+
+    hall_df = pd.concat(hall) if hall else pd.DataFrame(columns=[*columnas, "_MONTO_"])
+    return _resultado(hall_df, stats.n, stats.total, stats.media, stats.std, limite, criterio_txt,
+                      min(fmin) if fmin else None, max(fmax) if fmax else None,
+                      top_monto=top.df if top.df is not None else hall_df.head(0),
+                      grp=grp.df if grp is not None and grp.df is not None else None,
+                      col_id=col_id, fechas_nc=fechas_nc, lineas_omitidas=sorted(set(omitidas)))
+
+def montos_sheets(r: dict) -> dict:
+    sheets = {"Hallazgos": r["hall"],
+              "ResumenEstadistico": pd.DataFrame({
+                  "Métrica":["Transacciones","Hallazgos","% hallazgos","Suma total","Suma hallazgos","Criterio",
+                             "Fechas no convertibles"],
+                  "Valor":[r["total_tx"], r["total_h"], f"{r['prop_h']*100:.2f}%", f"{r['suma_total']:,.2f}",
+                           f"{r['suma_h']:,.2f}", r["criterio_txt"],
+                           f"{r['fecha_no_convertible']} ({r['prop_fecha_no_convertible']*100:.2f}%)"]
+              }),
+              "TopPorMonto": r["top_monto"], "TopPorZscore": r["top_z"]}
+    if r.get("lineas_omitidas"):
+        sheets["ResumenEstadistico"].loc[len(sheets["ResumenEstadistico"])] = [
+            "Líneas mal formadas omitidas (streaming)", f"{r['lineas_omitidas']} (líneas {_lineas_txt(r)})"]
+    if not r["grp"].empty: sheets["GrupoPorID"] = r["grp"].reset_index()
+    return sheets
+
+def _lineas_txt(r: dict) -> str:
+    d = r["lineas_omitidas_detalle"]
+    return ", ".join(map(str, d)) + ("…" if r["lineas_omitidas"] > len(d) else "")
+
+def montos_sections(r: dict, nombre: str) -> list:
+    hall = r["hall"]
+    fecha_rango = "Sin fecha" if r["fecha_min"] is None else f"{r['fecha_min']} → {r['fecha_max']}"
+    bullets_resumen = [
+        f"Archivo: {nombre}", f"Válidas: {r['total_tx']}",
+        f"Hallazgos: {r['total_h']} ({r['prop_h']*100:.2f}%)", f"Suma hallazgos: {r['suma_h']:,.2f} (vs total {r['suma_total']:,.2f})",
+        f"Criterio: {r['criterio_txt']}", f"Rango de fechas: {fecha_rango}"
+    ]
+    if r["fecha_no_convertible"]:
+        bullets_resumen.append(f"Fechas no convertibles: {r['fecha_no_convertible']} "
+                               f"({r['prop_fecha_no_convertible']*100:.2f}% de las fechas informadas)")
+    if r.get("lineas_omitidas"):
+        bullets_resumen.append(f"Líneas mal formadas omitidas en la lectura por bloques: {r['lineas_omitidas']} "
+                               f"(líneas {_lineas_txt(r)}); no pueden figurar como hallazgos")
+    detalle = []
+    if r["total_h"] > 0:
+        detalle += [f"Mayor hallazgo: {hall['_MONTO_'].max():,.2f}",
+                    f"Promedio hallazgos: {hall['_MONTO_'].mean():,.2f}"]
+        if not r["top_id"].empty:
+            detalle.append("Top 5 por suma (ID): " + ", ".join([f"{i}: {v:,.2f}" for i, v in r["top_id"].items()]))
+    recomendaciones = [
+        "Solicitar respaldo (OC, contratos, aprobaciones) y verificar trazabilidad en el ERP.",
+        "Revisar los 20 mayores importes y los 20 mayores z-scores (muestreo dirigido).",
+        "Validar límites de aprobación/segregación vs. flujo real de autorizaciones.",
+        "Analizar concentración por ID/centro/periodo; buscar patrones a fin de mes/cierre.",
+        "Cruzar con políticas de precios/ descuentos, impuestos y redondeos.",
+        "Si el % supera materialidad, ampliar muestra y aplicar pruebas sustantivas adicionales."
+    ]
+    return [("RESUMEN", [f"• {x}" for x in bullets_resumen]),
+            ("DETALLE PRINCIPAL", [f"• {x}" for x in detalle] if detalle else ["• Sin detalles adicionales."]),
+            ("RECOMENDACIONES", [f"• {x}" for x in recomendaciones]),
+            ("REFERENCIA XLSX", ["• 'montos_inusuales.xlsx' (Hallazgos, ResumenEstadistico, TopPorMonto, TopPorZscore, GrupoPorID si aplica)."])]
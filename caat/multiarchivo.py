@@ -0,0 +1,126 @@
+"""Varios archivos como una sola tabla: 12 exportaciones mensuales, un archivo por sucursal…
+
+- ``leer_archivos`` parsea cada archivo (con su hoja, columnas y filas) en un pool de procesos.
+  Con un único archivo, un solo núcleo o pocos bytes, lee en el mismo proceso, porque arrancar
+  los procesos cuesta más que la lectura.
+- ``alinear_encabezados`` lleva los encabezados de todos los archivos a los nombres del primero que
+  trae cada columna. La comparación ignora mayúsculas, acentos y separadores (``FECHA_EMISION`` =
+  ``Fecha emisión``). Además, el ID, el monto, la fecha y el proveedor se emparejan por los
+  sinónimos de ``columnas`` (``Importe`` → ``Total``); solo cuentan las coincidencias exactas,
+  porque la búsqueda por subcadena de ``col_auto`` es demasiado permisiva entre archivos distintos.
+- ``consolidar`` concatena y compacta, agregando ``_ARCHIVO_`` y ``_FILA_ARCHIVO_`` (fila de datos
+  1-based dentro de su archivo). ``trazar`` agrega archivo y fila de origen junto a cada columna
+  ``_fila…`` de un resultado, que apunta a la tabla consolidada.
+"""
+import io, multiprocessing, os, re, unicodedata
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from .cache import MB
+from .columnas import normalize_headers, SINONIMOS_ID, SINONIMOS_MONTO, SINONIMOS_FECHA, SINONIMOS_PROVEEDOR
+from .compact import compact_frame
+from .readers import read_csv_fast, read_excel_columns
+
+COL_ARCHIVO, COL_FILA = "_ARCHIVO_", "_FILA_ARCHIVO_"
+PROCESOS = int(os.environ.get("CAAT_PROCESOS", "0")) or (os.cpu_count() or 1)
+MIN_BYTES_PARALELO = 8 * MB
+ROLES = {"ID": SINONIMOS_ID, "monto": SINONIMOS_MONTO, "fecha": SINONIMOS_FECHA, "proveedor": SINONIMOS_PROVEEDOR}
+
+def es_excel(nombre: str) -> bool: return nombre.lower().endswith((".xlsx", ".xls"))
+
+def leer_archivo(nombre, datos: bytes, hoja=None, usecols=None, nrows=None) -> pd.DataFrame:
+    """Mismo resultado que la lectura de un archivo suelto en la interfaz (CSV completo; Excel por columnas)."""
+    buf = io.BytesIO(datos)
+    if es_excel(nombre): return compact_frame(read_excel_columns(buf, name=nombre, sheet=hoja, usecols=usecols, nrows=nrows))
+    return compact_frame(normalize_headers(read_csv_fast(buf)))
+
+def _leer(tarea: dict) -> pd.DataFrame: return leer_archivo(**tarea)
+
+def leer_archivos(tareas: list, procesos=PROCESOS) -> list:
+    """``tareas``: dicts con los argumentos de ``leer_archivo``. Devuelve las tablas en el mismo orden."""
+    procesos = min(procesos, len(tareas))
+    if procesos <= 1 or sum(len(t["datos"]) for t in tareas) < MIN_BYTES_PARALELO: return [_leer(t) for t in tareas]
+    # spawn: la interfaz corre en hilos y fork desde un proceso con hilos no es seguro.
+    with ProcessPoolExecutor(procesos, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(_leer, tareas))
+
+def _clave(c) -> str:
+    c = unicodedata.normalize("NFKD", str(c)).encode("ascii", "ignore").decode().lower()
+    return re.sub(r"[^0-9a-z]+", " ", c).strip()
+
+def _rol(columnas, sinonimos):
+    claves = {_clave(a) for a in sinonimos}
+    return next((c for c in columnas if _clave(c) in claves), None)
+
+def alinear_encabezados(columnas: list) -> list:
+    """Por archivo, ``{encabezado original: nombre consolidado}``."""
+    nombres, roles, mapeos = {}, {}, []
+    for cols in columnas:
+        cols = [str(c).strip() for c in cols]
+        claves, m = {_clave(c) for c in cols}, {}
+        for rol, sinonimos in ROLES.items():
+            c = _rol(cols, sinonimos)
+            if c is None: continue
+            ref = roles.setdefault(rol, nombres.setdefault(_clave(c), c))
+            if _clave(ref) not in claves and ref not in m.values(): m[c] = ref
+        for c in cols:
+            if c in m: continue
+            destino = nombres.setdefault(_clave(c), c)
+            if destino in m.values(): destino = c if c not in m.values() else f"{c}.1"   # dos variantes en un mismo archivo
+            m[c] = destino
+        mapeos.append(m)
+    return mapeos
+
+def describir_alineacion(mapeos: list, nombres: list) -> list:
+    """Renombres aplicados y columnas que faltan en algún archivo, como texto."""
+    notas = [f"{nombre}: " + ", ".join(f"'{o}' → '{d}'" for o, d in m.items() if o != d)
+             for m, nombre in zip(mapeos, nombres) if any(o != d for o, d in m.items())]
+    todas = list(dict.fromkeys(d for m in mapeos for d in m.values()))
+    faltan = {c: [n for m, n in zip(mapeos, nombres) if c not in m.values()] for c in todas}
+    notas += [f"'{c}' no está en {', '.join(f)}" for c, f in faltan.items() if f]
+    return notas
+
+def consolidar(frames: list, nombres: list, mapeos: list) -> pd.DataFrame:
+    partes = []
+    for df, nombre, m in zip(frames, nombres, mapeos):
+        df = normalize_headers(df.copy(deep=False)).rename(columns=m)
+        df[COL_ARCHIVO] = nombre; df[COL_FILA] = np.arange(1, len(df) + 1)
+        partes.append(df)
+    out = pd.concat(partes, ignore_index=True)
+    out[COL_ARCHIVO] = pd.Categorical(out[COL_ARCHIVO], categories=list(dict.fromkeys(nombres)))
+    for c in out.columns[out.dtypes == object]:
+        # Tipos distintos entre archivos: fechas nativas de uno y otro se unifican como datetime; fecha en un
+        # libro y texto en un CSV queda como texto, que las pruebas ya convierten.
+        tipo = pd.api.types.infer_dtype(out[c], skipna=True)
+        if tipo in ("date", "datetime"): out[c] = pd.to_datetime(out[c], errors="coerce")
+        elif tipo in ("mixed", "mixed-integer"): out[c] = out[c].map(str, na_action="ignore")
+    out = compact_frame(out)
+    out.attrs["archivos"] = {n: len(df) for n, df in zip(nombres, frames)}
+    if any("lectura" in df.attrs for df in frames):
+        lecturas = [df.attrs["lectura"] for df in frames if "lectura" in df.attrs]
+        out.attrs["lectura"] = {**lecturas[0], "filas": len(out), "vista_previa": any(x.get("vista_previa") for x in lecturas),
+                                "segundos": round(sum(x.get("segundos", 0) for x in lecturas), 3)}
+    return out
+
+def trazar(res: dict, origen: pd.DataFrame, origen_b: pd.DataFrame = None) -> dict:
+    """Copia de ``res`` donde cada tabla con columnas ``_fila…`` lleva al lado ``_ARCHIVO…`` y ``_FILA_ARCHIVO…``.
+
+    Las columnas que terminan en ``_B`` y las tablas cuya clave termina en ``_B`` (``solo_B``) se resuelven
+    contra ``origen_b`` (conciliación). Un origen sin
+    ``_ARCHIVO_`` (un solo archivo) no agrega nada; tampoco se agrega si la tabla ya trae esas columnas.
+    """
+    out = dict(res)
+    for k, t in res.items():
+        if not isinstance(t, pd.DataFrame): continue
+        for col in [c for c in t.columns if str(c).startswith("_fila")]:
+            o = origen_b if (str(col).endswith("_B") or str(k).endswith("_B")) and origen_b is not None else origen
+            sufijo = str(col).removeprefix("_fila")
+            if o is None or COL_ARCHIVO not in o.columns or f"_ARCHIVO{sufijo}" in t.columns: continue
+            if t is res[k]: t = t.copy(deep=False)
+            pos = pd.to_numeric(t[col], errors="coerce").to_numpy(dtype=float) - 1
+            ok = (pos >= 0) & (pos < len(o)); p = np.where(ok, pos, 0).astype(np.int64)
+            i = t.columns.get_loc(col) + 1
+            t.insert(i, f"_ARCHIVO{sufijo}", np.where(ok, o[COL_ARCHIVO].iloc[p].to_numpy(dtype=object), None))
+            t.insert(i + 1, f"_FILA_ARCHIVO{sufijo}", np.where(ok, o[COL_FILA].iloc[p].to_numpy(), -1))
+        out[k] = t
+    return out
@@ -0,0 +1,111 @@
+"""Instrumentación por etapa: tiempo de pared, CPU, pico de memoria y filas.
+
+Una ``Medicion`` se abre alrededor de una corrida (una pestaña de la interfaz) y las etapas se
+marcan con ``etapa()`` desde cualquier nivel, también dentro de ``caat``::
+
+    with Medicion("Conciliación") as med:
+        with etapa("carga") as e: df = leer(...); e.filas = len(df)
+
+Fuera de una medición ``etapa()`` devuelve un contexto vacío compartido. Dentro, el tiempo cuesta
+dos lecturas de reloj por etapa; el pico de memoria usa ``tracemalloc`` y solo se activa con
+``memoria=True`` porque trazar asignaciones sí encarece el código con muchos objetos pequeños.
+Las etapas anidadas se registran como ``padre › hija``. Al cerrar, la corrida se agrega como
+JSON Lines a ``LOG_RENDIMIENTO``.
+"""
+import contextvars, json, os, tempfile, threading, time, tracemalloc, uuid
+from datetime import datetime
+import pandas as pd
+
+MB = 1024 * 1024
+LOG_RENDIMIENTO = os.environ.get("CAAT_LOG_RENDIMIENTO") or os.path.join(tempfile.gettempdir(), "caat_logs", "rendimiento.jsonl")
+LOG_MIN_SEGUNDOS = float(os.environ.get("CAAT_LOG_MIN_S", "0.5"))   # corridas más cortas no se registran
+
+_actual = contextvars.ContextVar("caat_medicion", default=None)
+_lock = threading.Lock()
+_trazas = 0              # mediciones con memoria abiertas (tracemalloc es global al proceso)
+
+class _Nula:
+    filas = None
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def __setattr__(self, k, v): pass
+
+_NULA = _Nula()
+
+class _Etapa:
+    __slots__ = ("med", "nombre", "filas", "t0", "c0", "base", "pico")
+    def __init__(self, med, nombre, filas):
+        self.med, self.nombre, self.filas, self.pico = med, nombre, filas, 0
+
+    def __enter__(self):
+        pila = self.med._pila
+        if pila: self.nombre = f"{pila[-1].nombre} › {self.nombre}"
+        if self.med.memoria:
+            actual, pico = tracemalloc.get_traced_memory()
+            for p in pila: p.pico = max(p.pico, pico - p.base)
+            tracemalloc.reset_peak(); self.base = actual
+        pila.append(self)
+        self.t0, self.c0 = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, tipo, *exc):
+        segundos, cpu = time.perf_counter() - self.t0, time.process_time() - self.c0
+        pila = self.med._pila; pila.pop()
+        pico = None
+        if self.med.memoria:
+            pico = tracemalloc.get_traced_memory()[1]
+            for p in pila: p.pico = max(p.pico, pico - p.base)
+            pico = max(self.pico, pico - self.base) / MB
+        self.med.etapas.append({"etapa": self.nombre, "segundos": round(segundos, 4), "cpu_s": round(cpu, 4),
+                                "pico_mb": None if pico is None else round(pico, 2),
+                                "filas": None if self.filas is None else int(self.filas),
+                                "error": None if tipo is None else tipo.__name__})
+        return False
+
+class Medicion:
+    """Corrida medida; ``registrar=True`` fuerza el log aunque dure menos de ``LOG_MIN_SEGUNDOS``."""
+    def __init__(self, origen: str, memoria=False, log=LOG_RENDIMIENTO):
+        self.origen, self.memoria, self.log, self.registrar = origen, memoria, log, False
+        self.id, self.etapas, self._pila, self._token = uuid.uuid4().hex[:12], [], [], None
+
+    def __enter__(self):
+        global _trazas
+        if self.memoria:
+            with _lock:
+                if _trazas == 0 and not tracemalloc.is_tracing(): tracemalloc.start()
+                _trazas += 1
+        self._token = _actual.set(self); return self
+
+    def __exit__(self, *exc):
+        global _trazas
+        _actual.reset(self._token)
+        if self.memoria:
+            with _lock:
+                _trazas -= 1
+                if _trazas == 0: tracemalloc.stop()
+        if self.log and (self.registrar or self.total() >= LOG_MIN_SEGUNDOS):
+            try: self.escribir_log()
+            except OSError: pass     # el log es diagnóstico: nunca interrumpe la prueba
+        return False
+
+    def total(self) -> float:
+        """Segundos de las etapas de primer nivel (las anidadas ya están dentro)."""
+        return sum(e["segundos"] for e in self.etapas if " › " not in e["etapa"])
+
+    def tabla(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.etapas, columns=["etapa", "segundos", "cpu_s", "pico_mb", "filas", "error"])
+        df["filas"] = df["filas"].astype("Int64")
+        df["filas_por_s"] = (df["filas"] / df["segundos"].where(df["segundos"] > 0)).round(0)
+        return df
+
+    def escribir_log(self):
+        ts = datetime.now().isoformat(timespec="seconds")
+        lineas = "".join(json.dumps({"ts": ts, "corrida": self.id, "origen": self.origen, **e}, ensure_ascii=False) + "\n"
+                         for e in self.etapas)
+        os.makedirs(os.path.dirname(self.log) or ".", exist_ok=True)
+        with _lock, open(self.log, "a", encoding="utf-8") as f: f.write(lineas)
+
+def etapa(nombre: str, filas=None):
+    """Contexto que mide ``nombre`` dentro de la medición activa; sin medición no hace nada."""
+    med = _actual.get()
+    return _NULA if med is None else _Etapa(med, nombre, filas)
@@ -0,0 +1,379 @@
+"""Lectura rápida de CSV/TXT.
+
+Se olfatea una sola vez una muestra acotada (codificación, delimitador, separador decimal,
+encabezado) y se parsea con el motor más rápido disponible:
+
+1. ``pyarrow`` (multihilo) si está instalado;
+2. motor C de pandas, saltando las líneas mal formadas;
+3. módulo ``csv`` solo para esos registros, que se reinsertan en su posición; los que no se pueden
+   reparar sin perder datos (p. ej. un campo de más en una columna numérica) se excluyen y se informan.
+
+El camino usado queda en ``df.attrs["lectura"]``. Los libros de Excel se abren de forma perezosa:
+nombres de hoja y vista previa de las primeras filas en modo read-only, y luego solo las columnas
+que usa la prueba (``read_excel_columns``), con ``python-calamine`` si está instalado.
+"""
+import codecs, csv, io, operator, re, time, warnings
+from dataclasses import dataclass, asdict
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+CSV_READER_VERSION = 3          # forma parte de la clave de caché: cambiarlo invalida lecturas previas
+SAMPLE_BYTES = 256 * 1024
+MAX_RECHAZADAS = 20             # registros irreparables que se guardan en attrs["lectura"] para el aviso
+DELIMITADORES = ";,|\t"
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+@dataclass
+class CsvFormat:
+    encoding: str = "utf-8"
+    sep: str = ","
+    decimal: str = "."
+    header: bool = True
+    quotechar: str = '"'
+
+def sniff_encoding(sample: bytes) -> str:
+    if sample.startswith(codecs.BOM_UTF8): return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)): return "utf-16"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)   # tolera un carácter cortado al final
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+def sniff_delimiter(sample_bytes: bytes):
+    try:
+        sample = sample_bytes.decode('utf-8', errors='ignore')
+        dialect = csv.Sniffer().sniff(sample, delimiters=DELIMITADORES)
+        return dialect.delimiter
+    except Exception:
+        return None
+
+def _count_delimiter(lines: list[str]) -> str:
+    # Respaldo del Sniffer: el delimitador con conteo por línea más alto y estable.
+    best, best_score = ",", -1.0
+    for d in DELIMITADORES:
+        counts = [ln.count(d) for ln in lines]
+        if not counts or max(counts) == 0: continue
+        moda = max(set(counts), key=counts.count)
+        score = moda * counts.count(moda) / len(counts)
+        if score > best_score: best, best_score = d, score
+    return best
+
+_NUM_COMA = re.compile(r"^\s*-?\d+,\d+\s*$")
+_NUM_PUNTO = re.compile(r"^\s*-?\d+\.\d+\s*$")
+_NUMERICO = re.compile(r"^\s*-?[\d.,]+\s*$")
+
+def sniff_csv(sample: bytes) -> CsvFormat:
+    fmt = CsvFormat(encoding=sniff_encoding(sample))
+    enc = "utf-16" if fmt.encoding == "utf-16" else fmt.encoding
+    text = sample.decode(enc, errors="ignore")
+    lines = [ln for ln in text.splitlines()[:-1] or text.splitlines() if ln.strip()][:200]
+    if not lines: return fmt
+    fmt.sep = sniff_delimiter("\n".join(lines[:50]).encode("utf-8")) or _count_delimiter(lines)
+    rows = list(csv.reader(lines, delimiter=fmt.sep, quotechar=fmt.quotechar))
+    campos = [c for r in rows[1:] for c in r]
+    if fmt.sep != ",":
+        coma, punto = sum(bool(_NUM_COMA.match(c)) for c in campos), sum(bool(_NUM_PUNTO.match(c)) for c in campos)
+        if coma > punto: fmt.decimal = ","
+    # Sin encabezado si la primera fila es completamente numérica.
+    if rows and rows[0] and all(_NUMERICO.match(c) for c in rows[0] if c.strip()): fmt.header = False
+    return fmt
+
+def _read_sample(file_obj, n=SAMPLE_BYTES) -> bytes:
+    pos = file_obj.tell(); sample = file_obj.read(n); file_obj.seek(pos)
+    return sample.encode("utf-8") if isinstance(sample, str) else sample
+
+def _pandas_kwargs(fmt: CsvFormat) -> dict:
+    kw = dict(sep=fmt.sep, encoding=fmt.encoding, decimal=fmt.decimal, quotechar=fmt.quotechar)
+    if not fmt.header: kw["header"] = None
+    return kw
+
+def _name_columns(df: pd.DataFrame, fmt: CsvFormat) -> pd.DataFrame:
+    if not fmt.header: df.columns = [f"col_{i+1}" for i in range(df.shape[1])]
+    return df
+
+def _read_pyarrow(file_obj, fmt: CsvFormat) -> pd.DataFrame:
+    return pd.read_csv(file_obj, engine="pyarrow", **_pandas_kwargs(fmt))
+
+def _read_c(file_obj, fmt: CsvFormat):
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", pd.errors.ParserWarning)
+        df = pd.read_csv(file_obj, engine="c", on_bad_lines="warn", low_memory=True, **_pandas_kwargs(fmt))
+    bad = sorted({int(m) for w in caught for m in re.findall(r"Skipping line (\d+)", str(w.message))})
+    return df, bad
+
+def _reparar(campos: list, ncol: int, sep: str, ultima_numerica: bool):
+    """Campos de un registro con columnas de más, o ``None`` si no se puede reparar sin perder datos."""
+    if not any(c.strip() for c in campos[ncol:]): return campos[:ncol]      # delimitadores sobrantes al final
+    if ultima_numerica: return None        # unir el sobrante en un monto lo dejaría en NaN
+    return campos[:ncol-1] + [sep.join(campos[ncol-1:])]   # delimitador sin escapar dentro de un texto
+
+def _recover_records(file_obj, fmt: CsvFormat, df: pd.DataFrame):
+    """Re-parsea con el módulo csv los registros que el motor C rechazó.
+
+    Se cuentan registros, no líneas de texto (un campo entre comillas puede ocupar varias) y se
+    saltan las líneas en blanco como hace el motor C. Devuelve los registros reparados, su posición
+    (índice de la fila buena a la que preceden) y los que no se pudieron reparar, con su línea.
+    """
+    ncol = df.shape[1]
+    numericas = [pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c]) for c in df.columns]
+    rows, pos, rechazadas, buenas = [], [], [], 0
+    file_obj.seek(0)
+    text = io.TextIOWrapper(file_obj, encoding=fmt.encoding, errors="replace", newline="")
+    try:
+        reader = csv.reader(text, delimiter=fmt.sep, quotechar=fmt.quotechar)
+        if fmt.header: next(reader, None)
+        for campos in reader:
+            if not campos or (len(campos) == 1 and not campos[0].strip()): continue
+            if len(campos) <= ncol: buenas += 1; continue
+            fila = _reparar(campos, ncol, fmt.sep, numericas[-1])
+            if fila is None: rechazadas.append((reader.line_num, fmt.sep.join(campos)))
+            else: rows.append(fila); pos.append(buenas)
+    finally:
+        text.detach()
+    if buenas != len(df):
+        raise ValueError(f"El módulo csv cuenta {buenas} registros válidos y el motor C {len(df)}")
+    rec = pd.DataFrame(rows, columns=df.columns, dtype=object)
+    malos = np.zeros(len(rec), dtype=bool)
+    for c, num in zip(df.columns, numericas):
+        if not num or rec.empty: continue
+        vals = rec[c].astype(str).str.strip()
+        if fmt.decimal == ",": vals = vals.str.replace(",", ".", regex=False)
+        rec[c] = pd.to_numeric(vals, errors="coerce")
+        malos |= (rec[c].isna() & vals.ne("")).to_numpy()      # texto en una columna numérica: no se adivina
+    rechazadas += [(None, fmt.sep.join(map(str, f))) for f in np.asarray(rows, dtype=object)[malos]] if malos.any() else []
+    return rec[~malos], np.asarray(pos)[~malos], rechazadas
+
+def _merge_recovered(df: pd.DataFrame, rec: pd.DataFrame, pos) -> pd.DataFrame:
+    # Cada registro recuperado va antes de la fila buena que le seguía en el archivo (orden estable entre malos seguidos).
+    keys = np.concatenate([np.arange(len(df), dtype=float), np.asarray(pos, dtype=float) - 0.5])
+    out = pd.concat([df, rec.astype({c: df[c].dtype for c in df.columns if pd.api.types.is_numeric_dtype(df[c])
+                                      and not rec[c].isna().any()}, errors="ignore")], ignore_index=True)
+    return out.iloc[np.argsort(keys, kind="stable")].reset_index(drop=True)
+
+def read_csv_fast(file_obj) -> pd.DataFrame:
+    t0 = time.perf_counter()
+    sample = _read_sample(file_obj)
+    fmt = sniff_csv(sample)
+    start = file_obj.tell()
+    df, engine, bad = None, None, []
+    if HAS_PYARROW and fmt.encoding != "utf-16":
+        try: df, engine = _read_pyarrow(file_obj, fmt), "pyarrow"
+        except Exception: file_obj.seek(start)
+    if df is None:
+        try:
+            df, bad = _read_c(file_obj, fmt); engine = "c"
+        except UnicodeDecodeError:
+            # La muestra era UTF-8 pero el resto del archivo no.
+            file_obj.seek(start); fmt.encoding = "latin-1"
+            df, bad = _read_c(file_obj, fmt); engine = "c"
+        except Exception:
+            file_obj.seek(start)
+            df = pd.read_csv(file_obj, sep=None, engine="python", encoding=fmt.encoding, encoding_errors="replace")
+            engine = "python"
+    rechazadas, recuperadas = [], 0
+    if bad:
+        try:
+            rec, pos, rechazadas = _recover_records(file_obj, fmt, df)
+            df = _merge_recovered(df, rec, pos); engine = "c+python"; recuperadas = len(rec)
+        except ValueError:
+            # csv y el motor C no tokenizan igual: sin posiciones confiables, todo con el motor python
+            # y los registros con columnas de más se informan en lugar de repararse.
+            file_obj.seek(start)
+            df = pd.read_csv(file_obj, engine="python", encoding_errors="replace",
+                             on_bad_lines=lambda campos: rechazadas.append((None, fmt.sep.join(campos))), **_pandas_kwargs(fmt))
+            engine = "python"
+    df = _name_columns(df, fmt)
+    df.attrs["lectura"] = {"motor": engine, **asdict(fmt), "filas": len(df), "lineas_recuperadas": recuperadas,
+                           "lineas_rechazadas": len(rechazadas), "rechazadas": rechazadas[:MAX_RECHAZADAS],
+                           "segundos": round(time.perf_counter() - t0, 3)}
+    return df
+
+def describe_read(df: pd.DataFrame) -> str:
+    info = df.attrs.get("lectura")
+    if not info: return ""
+    if "sep" not in info:       # Excel (read_excel_columns)
+        de = f" de {info['columnas_hoja']}" if info.get("columnas_hoja") else ""
+        txt = f"Lectura Excel: motor **{info['motor']}** · {info['columnas']}{de} columnas · {info['segundos']:.2f} s"
+        if info.get("vista_previa"):
+            txt += f" · vista previa de {info['filas']} filas" + (f" (hoja: ~{info['filas_hoja']:,})" if info.get("filas_hoja") else "")
+        return txt
+    sep = {"\t": "TAB"}.get(info["sep"], info["sep"])
+    txt = (f"Lectura: motor **{info['motor']}** · sep `{sep}` · decimal `{info['decimal']}` · "
+           f"{info['encoding']} · {'con' if info['header'] else 'sin'} encabezado · {info['segundos']:.2f} s")
+    if info.get("lineas_recuperadas"): txt += f" · {info['lineas_recuperadas']} líneas recuperadas con el módulo csv"
+    if info.get("lineas_rechazadas"):
+        lineas = ", ".join(str(n) for n, _ in info["rechazadas"] if n is not None)
+        txt += (f" · ⚠️ {info['lineas_rechazadas']} registros mal formados excluidos (no se pudieron reparar sin perder datos"
+                + (f"; líneas {lineas}" if lineas else "") + ")")
+    return txt
+
+# ------------------- Lectura por bloques (modo streaming) -------------------
+CHUNK_ROWS = 250_000
+
+def _is_excel(name: str) -> bool: return name.lower().endswith((".xlsx", ".xls"))
+
+class _KeepOpen(io.RawIOBase):
+    """Vista de un archivo ajeno: pandas puede cerrarla sin cerrar el original (p. ej. el upload)."""
+    def __init__(self, fh): self._fh = fh
+    def readable(self): return True
+    def seekable(self): return True
+    def tell(self): return self._fh.tell()
+    def seek(self, pos, whence=0): return self._fh.seek(pos, whence)
+    def readinto(self, b):
+        data = self._fh.read(len(b)); n = len(data); b[:n] = data; return n
+
+def _open_binary(src):
+    if isinstance(src, (str, bytes)) or hasattr(src, "__fspath__"): return open(src, "rb"), True
+    return io.BufferedReader(_KeepOpen(src)), True
+
+def iter_csv_chunks(src, usecols=None, chunksize=CHUNK_ROWS):
+    fh, own = _open_binary(src)
+    try:
+        fh.seek(0); fmt = sniff_csv(_read_sample(fh)); kw = _pandas_kwargs(fmt)
+        if usecols is not None and not fmt.header:
+            usecols = [int(str(c).removeprefix("col_")) - 1 for c in usecols]
+        elif usecols is not None:
+            wanted = set(usecols); usecols = lambda c: str(c).strip() in wanted   # nombres ya normalizados
+        lector = pd.read_csv(fh, engine="c", chunksize=chunksize, usecols=usecols, on_bad_lines="warn",
+                             encoding_errors="replace", **kw)
+        while True:
+            # Las líneas mal formadas se saltan, pero cada bloque informa cuáles en attrs["lineas_omitidas"].
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always", pd.errors.ParserWarning)
+                chunk = next(lector, None)
+            if chunk is None: break
+            if not fmt.header: chunk.columns = [f"col_{int(c)+1}" for c in chunk.columns]
+            chunk.attrs["lineas_omitidas"] = sorted({int(m) for w in caught for m in re.findall(r"Skipping line (\d+)", str(w.message))})
+            yield chunk
+    finally:
+        if own: fh.close()
+
+def _encabezado(fila) -> list:
+    return [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(fila or ())]
+
+def iter_excel_chunks(src, sheet=None, usecols=None, chunksize=CHUNK_ROWS):
+    name = str(getattr(src, "name", src))
+    if not name.lower().endswith(".xlsx"):
+        # .xls (xlrd) no admite lectura incremental: se lee entero y se entrega por tramos.
+        df = pd.read_excel(src, sheet_name=sheet or 0, usecols=usecols)
+        for i in range(0, len(df), chunksize): yield df.iloc[i:i+chunksize]
+        return
+    from openpyxl import load_workbook
+    if hasattr(src, "seek"): src.seek(0)
+    wb = load_workbook(src, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = _encabezado(next(rows, ()))
+        idx = [i for i, c in enumerate(header) if usecols is None or c.strip() in usecols]
+        cols = [header[i] for i in idx]
+        buf, offset = [], 0
+        for r in rows:
+            buf.append([r[i] if i < len(r) else None for i in idx])
+            if len(buf) >= chunksize:
+                yield pd.DataFrame(buf, columns=cols, index=pd.RangeIndex(offset, offset + len(buf)))
+                offset += len(buf); buf = []
+        if buf: yield pd.DataFrame(buf, columns=cols, index=pd.RangeIndex(offset, offset + len(buf)))
+    finally:
+        wb.close()
+
+def iter_chunks(src, name=None, sheet=None, usecols=None, chunksize=CHUNK_ROWS):
+    """Recorre un CSV/TXT/XLSX por bloques de ``chunksize`` filas sin cargarlo completo."""
+    name = name or str(getattr(src, "name", src))
+    if _is_excel(name): return iter_excel_chunks(src, sheet=sheet, usecols=usecols, chunksize=chunksize)
+    return iter_csv_chunks(src, usecols=usecols, chunksize=chunksize)
+
+def read_preview(src, name=None, sheet=None, nrows=200) -> pd.DataFrame:
+    """Primeras ``nrows`` filas (para elegir columnas sin leer el archivo completo)."""
+    chunks = iter_chunks(src, name=name, sheet=sheet, chunksize=nrows)
+    try: return next(iter(chunks))
+    except StopIteration: return pd.DataFrame()
+    finally:
+        if hasattr(chunks, "close"): chunks.close()
+
+# ------------------- Excel perezoso: hojas, vista previa y solo las columnas elegidas -------------------
+try:
+    import python_calamine  # noqa: F401
+    # pandas incorpora engine="calamine" en 2.2; antes, con el paquete instalado, read_excel falla.
+    HAS_CALAMINE = tuple(int(x) for x in re.findall(r"\d+", pd.__version__)[:2]) >= (2, 2)
+except ImportError:
+    HAS_CALAMINE = False
+
+PREVIEW_ROWS = 200
+
+def excel_sheets(src, name=None) -> list:
+    """Nombres de hoja sin leer celdas: en XLSX basta ``xl/workbook.xml`` dentro del zip."""
+    name = name or str(getattr(src, "name", src))
+    if hasattr(src, "seek"): src.seek(0)
+    if not name.lower().endswith(".xlsx"): return pd.ExcelFile(src).sheet_names
+    import zipfile
+    from xml.etree import ElementTree
+    with zipfile.ZipFile(src) as z: raiz = ElementTree.fromstring(z.read("xl/workbook.xml"))
+    return [e.get("name") for e in raiz.iter() if e.tag.rsplit("}", 1)[-1] == "sheet"]
+
+def _read_xlsx_openpyxl(src, sheet, usecols, nrows):
+    """Pasada read-only de openpyxl que solo guarda las celdas de las columnas pedidas.
+
+    Las filas recortadas pasan por el mismo ``TextParser`` que usa ``pd.read_excel``, así los
+    tipos inferidos (texto numérico → número, etc.) coinciden con la lectura completa.
+    """
+    from openpyxl import load_workbook
+    wb = load_workbook(src, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        filas_hoja = ws.max_row - 1 if ws.max_row else None     # según <dimension>; puede faltar
+        header = _encabezado(next(ws.iter_rows(max_row=1, values_only=True), ()))
+        idx = [i for i, c in enumerate(header) if usecols is None or c.strip() in usecols]
+        filas = []
+        if idx:
+            ancho = idx[-1] + 1
+            tomar = operator.itemgetter(*idx) if len(idx) > 1 else (lambda r: (r[idx[0]],))
+            # max_col evita construir las celdas a la derecha de la última columna pedida
+            for r in ws.iter_rows(min_row=2, max_row=None if nrows is None else nrows + 1, max_col=ancho, values_only=True):
+                filas.append(tomar(r if len(r) >= ancho else r + (None,) * (ancho - len(r))))
+    finally:
+        wb.close()
+    cols = [header[i] for i in idx]
+    if not filas: return pd.DataFrame(columns=cols), len(header), filas_hoja
+    df = TextParser([cols, *filas], header=0).read()
+    return df, len(header), filas_hoja
+
+def read_excel_columns(src, name=None, sheet=None, usecols=None, nrows=None) -> pd.DataFrame:
+    """Hoja de Excel restringida a ``usecols`` (nombres sin espacios extremos) y a ``nrows`` filas.
+
+    Con ``python-calamine`` instalado se lee con ese motor; si no, XLSX pasa por openpyxl en modo
+    read-only guardando solo las celdas pedidas y XLS por xlrd. ``usecols=None`` lee todas.
+    """
+    t0 = time.perf_counter()
+    name = name or str(getattr(src, "name", src))
+    if hasattr(src, "seek"): src.seek(0)
+    wanted = None if usecols is None else {str(c).strip() for c in usecols}
+    total = filas_hoja = None
+    if HAS_CALAMINE or not name.lower().endswith(".xlsx"):
+        motor = "calamine" if HAS_CALAMINE else "xlrd"
+        df = pd.read_excel(src, sheet_name=sheet if sheet is not None else 0, nrows=nrows,
+                           engine="calamine" if HAS_CALAMINE else None,
+                           usecols=None if wanted is None else (lambda c: str(c).strip() in wanted))
+    else:
+        motor = "openpyxl (read-only)"
+        df, total, filas_hoja = _read_xlsx_openpyxl(src, sheet, wanted, nrows)
+    df.attrs["lectura"] = {"motor": motor, "hoja": sheet, "filas": len(df), "columnas": df.shape[1],
+                           "columnas_hoja": total, "filas_hoja": filas_hoja, "vista_previa": nrows is not None,
+                           "segundos": round(time.perf_counter() - t0, 3)}
+    return df
+
+def read_table(src, name=None, sheet=None) -> pd.DataFrame:
+    """Lectura completa de CSV/TXT/XLSX/XLS desde ruta o binario (sin interfaz ni caché)."""
+    name = name or getattr(src, "name", None) or str(src)
+    if _is_excel(name):
+        return pd.read_excel(src, sheet_name=sheet if sheet is not None else 0, engine="calamine" if HAS_CALAMINE else None)
+    if not name.lower().endswith((".csv", ".txt")): raise ValueError(f"Formato no soportado: {name}")
+    fh, _ = _open_binary(src)
+    with fh: return read_csv_fast(fh)
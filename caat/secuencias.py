@@ -0,0 +1,149 @@
+"""Correlatividad de la numeración: faltantes, repetidos y fechas fuera de orden por serie.
+
+Cada ID se separa en serie (todo lo anterior al último tramo de dígitos, ``001-001-``) y correlativo
+(``28642``) con tres reemplazos vectorizados. Una clave de acceso del SRI (49 dígitos) se corta por
+posición: RUC, tipo de comprobante, establecimiento, punto de emisión y secuencial. Si la serie
+viene en su propia columna, se antepone a la que traiga el ID.
+
+Con las filas ordenadas por (serie, correlativo) con ``np.lexsort``, la diferencia entre vecinas
+basta: > 1 es un hueco, 0 un número repetido y, entre números consecutivos, una fecha menor que la
+anterior es una inversión. Los huecos se informan como rangos desde–hasta, sin expandir los números
+faltantes.
+"""
+import numpy as np
+import pandas as pd
+from .coerce import convertir_fechas
+from .perf import etapa
+
+MAX_DIGITOS = 15         # correlativos más largos no se convierten exactos (pasan a "no interpretables")
+LARGO_CLAVE_ACCESO = 49
+TOP_N = 10
+
+def separar_numero(s: pd.Series, serie: pd.Series = None) -> dict:
+    """Serie (texto), correlativo (float; NaN si no se pudo leer) y ancho con ceros de cada ID."""
+    if pd.api.types.is_numeric_dtype(s):
+        v = s.to_numpy(dtype=float, na_value=np.nan)
+        numero, pre, ancho = np.where((v >= 0) & (v == np.round(v)), v, np.nan), pd.Series("", index=s.index), np.zeros(len(s), int)
+    else:
+        t = s.astype(str).str.strip().str.replace(r"\D+$", "", regex=True)
+        dig, pre = t.str.replace(r"^.*\D", "", regex=True), t.str.replace(r"\d+$", "", regex=True)
+        clave = t.str.fullmatch(rf"\d{{{LARGO_CLAVE_ACCESO}}}").fillna(False).to_numpy(dtype=bool)
+        if clave.any():
+            k = t[clave]
+            pre[clave] = k.str[10:23] + " " + k.str[8:10] + " " + k.str[24:27] + "-" + k.str[27:30] + "-"
+            dig[clave] = k.str[30:39]
+        largo = dig.str.len()
+        numero = pd.to_numeric(dig.where(largo.between(1, MAX_DIGITOS) & s.notna()), errors="coerce").to_numpy(dtype=float)
+        ancho = largo.fillna(0).to_numpy(dtype=int)
+    if serie is not None:
+        if pd.api.types.is_float_dtype(serie) and (serie.dropna() == np.round(serie.dropna())).all():
+            serie = serie.astype("Int64")     # RUC leído como número
+        pre = (serie.astype(str).fillna("").str.strip() + " " + pre.astype(str)).str.strip()
+    return {"serie": pre.reset_index(drop=True), "numero": numero, "ancho": ancho}
+
+def _rango(serie, desde, hasta, ancho) -> pd.Series:
+    """Texto ``serie+desde – serie+hasta`` con el relleno de ceros del número anterior al hueco."""
+    d, h = pd.Series(desde).astype(str), pd.Series(hasta).astype(str)
+    for w in np.unique(ancho):
+        m = ancho == w
+        d[m], h[m] = d[m].str.zfill(w), h[m].str.zfill(w)
+    serie = pd.Series(serie, dtype=str)      # sin huecos el arreglo vacío no tiene tipo y la suma falla
+    d, h = serie + d, serie + h
+    return d.where(desde == hasta, d + " – " + h)
+
+def analizar_secuencias(df, col_id, col_serie=None, col_fecha=None) -> dict:
+    n = len(df)
+    with etapa("separación serie/correlativo", n):
+        p = separar_numero(df[col_id], df[col_serie] if col_serie is not None else None)
+        filas = np.flatnonzero(~np.isnan(p["numero"]))
+        cod, series = pd.factorize(p["serie"].iloc[filas].to_numpy(dtype=object))
+        series = np.asarray(series, dtype=object)
+        fecha = convertir_fechas(df[col_fecha])["fechas"].to_numpy() if col_fecha is not None else None
+
+    with etapa("orden y diferencias", len(filas)):
+        x = p["numero"][filas].astype(np.int64)
+        orden = np.lexsort((x, cod))
+        f, c, x = filas[orden], cod[orden], x[orden]
+        misma = c[1:] == c[:-1]
+        d = np.diff(x)
+        i = np.flatnonzero(misma & (d > 1))
+        huecos = pd.DataFrame({"Serie": series[c[i]], "Desde": x[i] + 1, "Hasta": x[i+1] - 1, "Faltantes": d[i] - 1,
+                               "Rango": _rango(series[c[i]], x[i] + 1, x[i+1] - 1, p["ancho"][f[i]]).to_numpy(),
+                               "_fila_anterior": f[i] + 1, "_fila_siguiente": f[i+1] + 1})
+        rep = misma & (d == 0)
+        marca = np.r_[rep, False] | np.r_[False, rep]
+        inv = np.zeros(0, dtype=np.int64)
+        if fecha is not None:
+            fo = fecha[f]
+            inv = np.flatnonzero(misma & (d > 0) & ~pd.isna(fo[1:]) & ~pd.isna(fo[:-1]) & (fo[1:] < fo[:-1]))
+            huecos["_FECHA_anterior"], huecos["_FECHA_siguiente"] = fo[i], fo[i+1]
+
+    repetidos = df.iloc[f[marca]].copy(deep=False)
+    repetidos.insert(0, "_SERIE_", series[c[marca]]); repetidos.insert(1, "_NUMERO_", x[marca])
+    repetidos["_N_"] = pd.DataFrame({"c": c[marca], "x": x[marca]}).groupby(["c", "x"])["x"].transform("size").to_numpy()
+    repetidos["_fila_"] = f[marca] + 1
+    invertidas = pd.DataFrame({"Serie": series[c[inv]], "Número anterior": x[inv], "Número": x[inv+1],
+                               "_FECHA_anterior": fecha[f[inv]] if fecha is not None else None,
+                               "_FECHA_": fecha[f[inv+1]] if fecha is not None else None,
+                               "_fila_anterior": f[inv] + 1, "_fila_": f[inv+1] + 1})
+    if fecha is not None: invertidas["Días de retroceso"] = (invertidas["_FECHA_anterior"] - invertidas["_FECHA_"]).dt.days
+
+    k = len(series)
+    cuenta = lambda idx, w=None: np.bincount(c[idx], weights=w, minlength=k)
+    primero = np.full(k, np.iinfo(np.int64).max); np.minimum.at(primero, c, x)
+    ultimo = np.full(k, np.iinfo(np.int64).min); np.maximum.at(ultimo, c, x)
+    n_s = np.bincount(c, minlength=k)
+    distintos = n_s - cuenta(np.flatnonzero(rep)).astype(np.int64)
+    por_serie = pd.DataFrame({"Serie": series, "Documentos": n_s, "Primero": primero, "Último": ultimo,
+                              "Esperados": ultimo - primero + 1, "Distintos": distintos,
+                              "Faltantes": cuenta(i, d[i] - 1).astype(np.int64), "Huecos": cuenta(i).astype(np.int64),
+                              "Repetidos": cuenta(np.flatnonzero(marca)).astype(np.int64),
+                              "Fechas invertidas": cuenta(inv).astype(np.int64)})
+    por_serie["Completitud %"] = (por_serie["Distintos"] / por_serie["Esperados"].clip(lower=1) * 100).round(2)
+    if fecha is not None:
+        g = pd.Series(fecha[f]).groupby(c)
+        por_serie["Fecha mínima"], por_serie["Fecha máxima"] = g.min().reindex(range(k)).to_numpy(), g.max().reindex(range(k)).to_numpy()
+    por_serie = por_serie.sort_values(["Faltantes", "Documentos"], ascending=False, ignore_index=True)
+
+    sin = np.flatnonzero(np.isnan(p["numero"]))
+    no_interpretables = df.iloc[sin].copy(deep=False); no_interpretables["_fila_"] = sin + 1
+    return {"n": n, "validos": len(filas), "por_serie": por_serie, "huecos": huecos, "repetidos": repetidos,
+            "invertidas": invertidas, "no_interpretables": no_interpretables,
+            "faltantes": int(huecos["Faltantes"].sum()), "col_fecha": col_fecha}
+
+def secuencias_sheets(r: dict) -> dict:
+    sheets = {"Resumen": pd.DataFrame({
+                  "Métrica": ["Documentos", "Interpretados", "Series", "Números faltantes", "Huecos (rangos)",
+                              "Filas con número repetido", "Fechas invertidas", "No interpretables"],
+                  "Valor": [r["n"], r["validos"], len(r["por_serie"]), r["faltantes"], len(r["huecos"]),
+                            len(r["repetidos"]), len(r["invertidas"]) if r["col_fecha"] else "Sin fecha",
+                            len(r["no_interpretables"])]}),
+              "PorSerie": r["por_serie"], "Faltantes": r["huecos"], "Repetidos": r["repetidos"]}
+    if r["col_fecha"]: sheets["Fechas_Invertidas"] = r["invertidas"]
+    if len(r["no_interpretables"]): sheets["No_Interpretables"] = r["no_interpretables"]
+    return sheets
+
+def secuencias_sections(r: dict, nombre: str) -> list:
+    ps = r["por_serie"]
+    bullets = [
+        f"Archivo: {nombre}", f"Documentos: {r['n']:,} | Interpretados: {r['validos']:,} | Series: {len(ps):,}",
+        f"Números faltantes: {r['faltantes']:,} en {len(r['huecos']):,} rangos",
+        f"Filas con número repetido: {len(r['repetidos']):,}",
+        f"Fechas invertidas: {len(r['invertidas']):,}" if r["col_fecha"] else "Fechas invertidas: no evaluado (sin columna de fecha)",
+    ]
+    if len(r["no_interpretables"]): bullets.append(f"IDs no interpretables (sin correlativo numérico): {len(r['no_interpretables']):,}")
+    det = [f"Serie {t['Serie'] or '(sin serie)'}: {t['Primero']:,} → {t['Último']:,} | faltantes {t['Faltantes']:,} "
+           f"({t['Huecos']:,} huecos) | completitud {t['Completitud %']:.2f}%"
+           for _, t in ps[ps["Faltantes"] > 0].head(TOP_N).iterrows()]
+    det += [f"Hueco mayor: {t['Rango']} ({t['Faltantes']:,} números)" for _, t in r["huecos"].nlargest(5, "Faltantes").iterrows()]
+    rec = [
+        "Cruzar los rangos faltantes con el registro de comprobantes anulados y con el listado del SRI.",
+        "Solicitar explicación de los números repetidos: reemisión, doble registro o puntos de emisión duplicados.",
+        "En fechas invertidas: revisar emisión retroactiva, cambios manuales de fecha y configuración del punto de emisión.",
+        "Verificar que cada punto de emisión use su propia secuencia y que los saltos de inicio de año estén autorizados.",
+        "Incorporar la prueba al cierre mensual con seguimiento de los rangos pendientes."
+    ]
+    return [("RESUMEN", [f"• {x}" for x in bullets]),
+            ("DETALLE PRINCIPAL", [f"• {x}" for x in det] if det else ["• Numeración completa en todas las series."]),
+            ("RECOMENDACIONES", [f"• {x}" for x in rec]),
+            ("REFERENCIA XLSX", ["• 'secuencias_facturas.xlsx' (Resumen, PorSerie, Faltantes, Repetidos, Fechas_Invertidas y No_Interpretables si aplican)."])]
@@ -0,0 +1,32 @@
+"""XLSX en streaming: ida y vuelta con openpyxl de columnas con tipos mezclados."""
+import datetime, io
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from caat.export import write_xlsx
+
+def ida_y_vuelta(df: pd.DataFrame) -> list:
+    buf = io.BytesIO(); write_xlsx({"Hoja": df}, buf); buf.seek(0)
+    return list(load_workbook(buf).active.iter_rows(min_row=2, values_only=True))
+
+def test_object_mezclado_conserva_el_tipo_de_cada_celda():
+    df = pd.DataFrame({
+        "mixta": pd.Series([1234.5, "1.234,50", 7, None, np.nan, np.inf], dtype=object),
+        "bool": pd.Series([True, False, None, True, np.bool_(False), True], dtype=object),
+        "fecha": pd.Series([pd.Timestamp("2025-01-02 10:00", tz="America/Guayaquil"), datetime.date(2025, 3, 4),
+                            "texto", pd.NaT, np.datetime64("2025-05-06"), -np.inf], dtype=object),
+        "tz": pd.date_range("2025-01-01", periods=6, tz="UTC"),
+        "texto": ["a<b", "c&d", '"q"', "\x01z", None, "ok"],
+    })
+    filas = ida_y_vuelta(df)
+    mixta, booleana, fecha, tz, texto = (list(c) for c in zip(*filas))
+    assert mixta == [1234.5, "1.234,50", 7, None, None, None]
+    assert booleana == [True, False, None, True, False, True]
+    assert fecha == [datetime.datetime(2025, 1, 2, 10), datetime.datetime(2025, 3, 4), "texto", None,
+                     datetime.datetime(2025, 5, 6), None]
+    assert tz == [datetime.datetime(2025, 1, d) for d in range(1, 7)]
+    assert texto == ["a<b", "c&d", '"q"', "z", None, "ok"]
+
+def test_columnas_tipadas():
+    df = pd.DataFrame({"n": [1, 2], "f": [1.5, np.nan], "b": [True, False], "s": pd.Series(["x", None], dtype="str")})
+    assert ida_y_vuelta(df) == [(1, 1.5, True, "x"), (2, None, False, None)]
@@ -0,0 +1,15 @@
+"""Montos inusuales en modo streaming: las líneas mal formadas se informan, no se pierden en silencio."""
+import io
+import pytest
+from caat.readers import iter_chunks
+from caat.montos import detectar_montos_streaming, montos_sheets
+
+CSV = ("id;monto\n" + "\n".join("20;120;extra" if i == 20 else f"{i};{100 + i}" for i in range(50)) + "\n").encode()
+
+@pytest.mark.parametrize("metodo", ["fijo", "estadistico"])
+def test_streaming_informa_lineas_omitidas(metodo):
+    r = detectar_montos_streaming(lambda usecols=None: iter_chunks(io.BytesIO(CSV), name="x.csv", usecols=usecols, chunksize=7),
+                                  "monto", metodo=metodo, umbral=140)
+    assert r["lineas_omitidas"] == 1 and r["lineas_omitidas_detalle"] == [22]
+    resumen = montos_sheets(r)["ResumenEstadistico"]
+    assert resumen["Métrica"].str.contains("mal formadas").any()
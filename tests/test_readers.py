@@ -0,0 +1,37 @@
+"""Lectura de CSV con registros mal formados: posición, contenido y aviso de los rechazados."""
+import io
+import numpy as np
+from caat.readers import read_csv_fast, describe_read
+
+def leer(texto: str):
+    return read_csv_fast(io.BytesIO(texto.encode("utf-8")))
+
+def test_registro_multilinea_antes_del_malo():
+    # El motor C numera registros, no líneas: el "3" no puede confundirse con la segunda línea del texto.
+    df = leer('id;monto;txt\n1;10;"multi\nline"\n2;20;b\n3;30;x;y\n4;40;d\n')
+    assert df["id"].tolist() == [1, 2, 3, 4]
+    assert df["txt"].tolist() == ["multi\nline", "b", "x;y", "d"]
+    assert df.attrs["lectura"]["lineas_recuperadas"] == 1
+
+def test_linea_en_blanco_antes_del_malo():
+    df = leer("id;monto;txt\n1;10;a\n2;20;b\n\n3;30;x;y\n4;40;d\n5;50;e\n")
+    assert df["id"].tolist() == [1, 2, 3, 4, 5]
+    assert df.loc[2, "txt"] == "x;y"
+
+def test_campo_de_mas_en_columna_numerica_se_informa():
+    df = leer("id;txt;Total\n5;a;50\n6;b;99999;extra\n7;c;70\n")
+    assert df["id"].tolist() == [5, 7]
+    assert not np.isnan(df["Total"].to_numpy(dtype=float)).any()
+    info = df.attrs["lectura"]
+    assert info["lineas_rechazadas"] == 1 and info["rechazadas"][0] == (3, "6;b;99999;extra")
+    assert "excluidos" in describe_read(df)
+
+def test_delimitadores_sobrantes_al_final():
+    df = leer("a;b;c\n1;2;3\n4;5;6;;\n7;8;9\n")
+    assert df["a"].tolist() == [1, 4, 7] and df["c"].tolist() == [3, 6, 9]
+    assert df.attrs["lectura"]["lineas_rechazadas"] == 0
+
+def test_varios_malos_seguidos_conservan_el_orden():
+    df = leer("id;txt\n1;a\n2;b;c\n3;d;e\n4;f\n")
+    assert df["id"].tolist() == [1, 2, 3, 4]
+    assert df["txt"].tolist() == ["a", "b;c", "d;e", "f"]
@@ -0,0 +1,25 @@
+"""Correlatividad: la serie por defecto es el emisor, nunca el cliente."""
+import numpy as np
+import pandas as pd
+from caat.engine import prueba_secuencias
+from caat.secuencias import analizar_secuencias
+
+def test_libro_de_ventas_contiguo_con_cliente_no_tiene_faltantes():
+    n = 1000
+    df = pd.DataFrame({"Número": [f"001-001-{i:09d}" for i in range(1, n + 1)],
+                       "Cliente": np.random.default_rng(0).choice([f"C{k}" for k in range(300)], n),
+                       "Total": 1.0})
+    r = prueba_secuencias(df, "ventas.csv", {})["res"]
+    assert r["faltantes"] == 0 and r["huecos"].empty and len(r["por_serie"]) == 1
+
+def test_serie_por_ruc_emisor():
+    df = pd.DataFrame({"Número": ["001-001-000000001", "001-001-000000003", "001-001-000000001"],
+                       "RUC": [1790012345001.0, 1790012345001.0, 992613092001.0]})
+    r = prueba_secuencias(df, "compras.csv", {})["res"]
+    assert r["faltantes"] == 1 and len(r["por_serie"]) == 2
+    assert not r["por_serie"]["Serie"].str.contains(r"\.0").any()
+
+def test_serie_faltante_no_rompe_el_analisis():
+    df = pd.DataFrame({"id": ["1", "2", "4"], "ruc": [5.0, np.nan, 5.0]})
+    r = analizar_secuencias(df, "id", col_serie="ruc")
+    assert r["validos"] == 3